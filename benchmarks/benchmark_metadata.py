@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Time and memory-profile the parsing, validation, writing and ENA conversion of synthetic metadata spreadsheets of
+increasing size. The network lookups of the validation and of the ENA conversion are stubbed.
+The results are written as JSON so that runs can be compared with --compare.
+"""
+
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from argparse import ArgumentParser
+from unittest.mock import patch
+
+import lxml.etree
+import openpyxl
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eva_submission import ROOT_DIR
+from eva_submission.ENA_submission.xlsx_to_ENA_xml import EnaXlsxConverter
+from eva_submission.xlsx.xlsx_parser import XlsxReader
+from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader, EvaXlsxWriter, release_eva_xlsx_reader
+from eva_submission.xlsx.xlsx_validation import EvaXlsxValidator
+
+from synthetic_metadata import generate_metadata_spreadsheet, REFERENCE, SCIENTIFIC_NAME
+
+CONF_FILE = os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')
+
+
+def read_with_xlsx_reader(metadata_file, work_dir):
+    reader = XlsxReader(metadata_file, CONF_FILE)
+    for worksheet in reader.valid_worksheets():
+        for _ in reader.iter_worksheet(worksheet):
+            pass
+
+
+def read_eva_xlsx_reader_properties(metadata_file, work_dir):
+    reader = EvaXlsxReader(metadata_file)
+    reader.project, reader.submitters, reader.analysis, reader.samples, reader.files
+    reader.samples_per_analysis, reader.files_per_analysis
+
+
+def validate(metadata_file, work_dir):
+    with patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+               return_value=[REFERENCE]), \
+            patch('eva_submission.xlsx.xlsx_validation.get_scientific_name_from_ensembl',
+                  return_value=SCIENTIFIC_NAME):
+        validator = EvaXlsxValidator(metadata_file)
+        validator.validate()
+    if validator.error_list:
+        raise ValueError('The synthetic spreadsheet is not valid: ' + validator.error_list[0])
+
+
+def write_sample_accessions(metadata_file, work_dir):
+    metadata_copy = os.path.join(work_dir, 'metadata_copy.xlsx')
+    shutil.copyfile(metadata_file, metadata_copy)
+    samples = EvaXlsxReader(metadata_copy).samples
+    for sample in samples:
+        sample['Sample Accession'] = 'SAMEA' + sample['Sample ID']
+    writer = EvaXlsxWriter(metadata_copy)
+    writer.set_samples(samples)
+    writer.save()
+
+
+def convert_to_ena_xml(metadata_file, work_dir):
+    with patch('eva_submission.ENA_submission.xlsx_to_ENA_xml.get_scientific_name_from_ensembl',
+               return_value=SCIENTIFIC_NAME):
+        EnaXlsxConverter(metadata_file, work_dir, 'BENCHMARK').create_submission_files()
+
+
+OPERATIONS = {
+    'xlsx_reader': read_with_xlsx_reader,
+    'eva_xlsx_reader': read_eva_xlsx_reader_properties,
+    'validator': validate,
+    'writer': write_sample_accessions,
+    'ena_converter': convert_to_ena_xml,
+}
+
+
+def run_operation(operation, metadata_file, work_dir, memory):
+    """
+    Run one operation on the spreadsheet without any reader shared with the previous operations
+    :return: the elapsed time in seconds and the peak of memory allocated in bytes if it was measured
+    """
+    release_eva_xlsx_reader(metadata_file)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        OPERATIONS[operation](metadata_file, work_dir)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if memory:
+            tracemalloc.stop()
+        release_eva_xlsx_reader(metadata_file)
+    return elapsed, peak
+
+
+def run_benchmarks(sizes, nb_analyses, operations, repeat, memory, work_dir):
+    results = []
+    for nb_samples in sizes:
+        metadata_file = os.path.join(work_dir, 'metadata_%s_samples.xlsx' % nb_samples)
+        start = time.perf_counter()
+        generate_metadata_spreadsheet(metadata_file, nb_samples, nb_analyses)
+        print('Generated %s with %s samples in %.1fs' % (metadata_file, nb_samples, time.perf_counter() - start),
+              file=sys.stderr)
+        for operation in operations:
+            # Time is measured without tracemalloc which slows down the allocations
+            timings = [run_operation(operation, metadata_file, work_dir, memory=False)[0] for _ in range(repeat)]
+            peak_memory = None
+            if memory:
+                peak_memory = run_operation(operation, metadata_file, work_dir, memory=True)[1]
+            result = {
+                'nb_samples': nb_samples,
+                'nb_analyses': nb_analyses,
+                'operation': operation,
+                'file_size': os.path.getsize(metadata_file),
+                'seconds': min(timings),
+                'timings': timings,
+                'peak_memory_bytes': peak_memory
+            }
+            print('%(operation)s\t%(nb_samples)s\t%(seconds).3f\t%(peak_memory_bytes)s' % result, file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def compare_runs(previous_results, results):
+    """Print the ratio of the time and the memory of each operation to the ones of a previous run"""
+    previous = dict(((result['operation'], result['nb_samples']), result) for result in previous_results)
+    print('\t'.join(['operation', 'nb_samples', 'seconds', 'previous_seconds', 'time_ratio', 'memory_ratio']))
+    for result in results:
+        key = (result['operation'], result['nb_samples'])
+        if key not in previous:
+            continue
+        memory_ratio = ''
+        if result['peak_memory_bytes'] and previous[key]['peak_memory_bytes']:
+            memory_ratio = '%.2f' % (result['peak_memory_bytes'] / previous[key]['peak_memory_bytes'])
+        print('\t'.join([
+            result['operation'], str(result['nb_samples']), '%.3f' % result['seconds'],
+            '%.3f' % previous[key]['seconds'], '%.2f' % (result['seconds'] / previous[key]['seconds']), memory_ratio
+        ]))
+
+
+def main():
+    argparse = ArgumentParser(description='Benchmark the parsing, validation, writing and ENA conversion of '
+                                          'synthetic metadata spreadsheets')
+    argparse.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                          help='Numbers of sample rows of the generated spreadsheets')
+    argparse.add_argument('--nb-analyses', type=int, default=3, help='Number of analyses in each spreadsheet')
+    argparse.add_argument('--operations', nargs='+', choices=list(OPERATIONS), default=list(OPERATIONS),
+                          help='Operations to benchmark')
+    argparse.add_argument('--repeat', type=int, default=1, help='Number of timed runs of each operation')
+    argparse.add_argument('--no-memory', action='store_true', default=False,
+                          help='Do not measure the peak memory, which requires an extra run of each operation')
+    argparse.add_argument('--work-dir', help='Directory where the spreadsheets are generated. Defaults to a '
+                                             'temporary directory that is deleted at the end')
+    argparse.add_argument('--output', default='benchmark_metadata.json', help='JSON file where results are written')
+    argparse.add_argument('--compare', help='JSON file of a previous run to compare the results with')
+    args = argparse.parse_args()
+    warnings.simplefilter('ignore')
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark_metadata_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = run_benchmarks(args.sizes, args.nb_analyses, args.operations, args.repeat, not args.no_memory,
+                                 work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    report = {
+        'date': datetime.datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'openpyxl': openpyxl.__version__,
+            'lxml': '.'.join(str(version) for version in lxml.etree.LXML_VERSION),
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as open_file:
+        json.dump(report, open_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as open_file:
+            compare_runs(json.load(open_file)['results'], results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the time taken by the XlsxReader backends to parse all the valid worksheets of metadata spreadsheets and
+check that they return the same rows.
+"""
+
+import os
+import sys
+import time
+import warnings
+from argparse import ArgumentParser
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eva_submission import ROOT_DIR
+from eva_submission.xlsx.xlsx_backends import BACKENDS
+from eva_submission.xlsx.xlsx_parser import XlsxReader
+
+
+def parse_with_backend(metadata_file, conf, backend):
+    start = time.perf_counter()
+    reader = XlsxReader(metadata_file, conf, backend=backend)
+    rows = dict((worksheet, list(reader.iter_worksheet(worksheet))) for worksheet in reader.valid_worksheets())
+    return time.perf_counter() - start, rows
+
+
+def main():
+    argparse = ArgumentParser(description='Benchmark the lxml and openpyxl backends of XlsxReader')
+    argparse.add_argument('metadata_files', nargs='+', help='Metadata spreadsheets to parse')
+    argparse.add_argument('--repeat', type=int, default=3, help='Number of times each spreadsheet is parsed')
+    argparse.add_argument('--conf', default=os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml'),
+                          help='Configuration describing the worksheets and headers to parse')
+    args = argparse.parse_args()
+    warnings.simplefilter('ignore')
+
+    print('\t'.join(['file', 'nb_rows'] + ['%s_seconds' % backend for backend in BACKENDS] + ['identical']))
+    for metadata_file in args.metadata_files:
+        best_times = {}
+        rows_per_backend = {}
+        for backend in BACKENDS:
+            timings = []
+            for _ in range(args.repeat):
+                elapsed, rows_per_backend[backend] = parse_with_backend(metadata_file, args.conf, backend)
+                timings.append(elapsed)
+            best_times[backend] = min(timings)
+        all_rows = list(rows_per_backend.values())
+        identical = all(rows == all_rows[0] for rows in all_rows)
+        nb_rows = sum(len(rows) for rows in all_rows[0].values())
+        print('\t'.join(
+            [metadata_file, str(nb_rows)] + ['%.3f' % best_times[backend] for backend in BACKENDS] + [str(identical)]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Generate synthetic EVA metadata spreadsheets following the worksheets and headers of eva_project_conf.yaml.
+The content is valid against eva_project_validation.yaml so that the whole validation runs on it.
+"""
+
+import datetime
+import hashlib
+import os
+import sys
+
+import yaml
+from openpyxl import Workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eva_submission import ROOT_DIR
+
+REFERENCE = 'GCA_000001405.15'
+TAX_ID = 9606
+SCIENTIFIC_NAME = 'Homo sapiens'
+
+
+def analysis_alias(analysis_index):
+    return 'Analysis%s' % (analysis_index + 1)
+
+
+def _submitter_row():
+    return {
+        'Last Name': 'Doe', 'First Name': 'John', 'Telephone Number': '+44 1223 000000',
+        'Email Address': 'john.doe@example.com', 'Laboratory': 'Variation lab', 'Center': 'EBI',
+        'Address': 'Wellcome Genome Campus, Hinxton'
+    }
+
+
+def _project_row():
+    return {
+        'Project Title': 'Synthetic project', 'Project Alias': 'SYNTH', 'Description': 'Synthetic project for benchmarks',
+        'Center': 'EBI', 'Tax ID': TAX_ID, 'Publication(s)': 'PubMed:123456', 'Hold Date': datetime.datetime(2030, 1, 1)
+    }
+
+
+def _analysis_row(index):
+    return {
+        'Analysis Title': 'Synthetic analysis %s' % (index + 1), 'Analysis Alias': analysis_alias(index),
+        'Description': 'Variants of synthetic analysis %s' % (index + 1), 'Project Title': 'Synthetic project',
+        'Experiment Type': 'Whole genome sequencing', 'Reference': REFERENCE, 'Platform': 'Illumina',
+        'Software': 'GATK', 'Date': datetime.datetime(2020, 1, 1)
+    }
+
+
+def _sample_row(index, nb_analyses):
+    return {
+        'Analysis Alias': analysis_alias(index % nb_analyses), 'Sample ID': 'sample%s' % (index + 1),
+        'Sample Name': 'sample%s' % (index + 1), 'Title': 'Synthetic sample %s' % (index + 1),
+        'Description': 'Blood sample of individual %s' % (index + 1), 'Unique Name': 'S%08d' % (index + 1),
+        'Tax Id': TAX_ID, 'Scientific Name': SCIENTIFIC_NAME, 'Common Name': 'human',
+        'sex': 'female' if index % 2 else 'male', 'population': 'POP%s' % (index % 26),
+        'collection_date': datetime.datetime(2019, 1, 1) + datetime.timedelta(days=index % 365),
+        'geographic location (country and/or sea)': 'United Kingdom'
+    }
+
+
+def _file_row(index):
+    file_name = '%s.vcf.gz' % analysis_alias(index)
+    return {
+        'Analysis Alias': analysis_alias(index), 'File Name': file_name, 'File Type': 'vcf',
+        'MD5': hashlib.md5(file_name.encode()).hexdigest()
+    }
+
+
+def synthetic_rows(nb_samples, nb_analyses):
+    """:return: dict of worksheet name to the list of synthetic rows"""
+    return {
+        'Submitter Details': [_submitter_row()],
+        'Project': [_project_row()],
+        'Analysis': [_analysis_row(index) for index in range(nb_analyses)],
+        'Sample': (_sample_row(index, nb_analyses) for index in range(nb_samples)),
+        'Files': [_file_row(index) for index in range(nb_analyses)],
+    }
+
+
+def generate_metadata_spreadsheet(metadata_file, nb_samples, nb_analyses=3,
+                                  conf_file=os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')):
+    """
+    Write a synthetic metadata spreadsheet with the configured headers placed on their configured row.
+    The workbook is written in write-only mode so large spreadsheets can be generated in bounded memory.
+    """
+    with open(conf_file) as open_file:
+        conf = yaml.full_load(open_file)
+    rows = synthetic_rows(nb_samples, nb_analyses)
+    workbook = Workbook(write_only=True)
+    for worksheet in conf['worksheets']:
+        sheet = workbook.create_sheet(worksheet)
+        headers = conf[worksheet].get('required', []) + conf[worksheet].get('optional', [])
+        for _ in range(conf[worksheet].get('header_row', 1) - 1):
+            sheet.append([])
+        sheet.append(headers)
+        for row in rows[worksheet]:
+            sheet.append([row.get(header) for header in headers])
+    workbook.save(metadata_file)
+    return metadata_file
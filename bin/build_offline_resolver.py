@@ -0,0 +1,41 @@
+import argparse
+import logging
+import os
+import sys
+
+from ebi_eva_common_pyutils.logger import logging_config as log_cfg
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from eva_submission.offline_resolver import build_resolver_database
+
+logger = log_cfg.get_logger(__name__)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Build the offline resolver database answering the taxonomy and assembly lookups from the NCBI '
+                    'taxonomy dump (https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdump.tar.gz) and the GenBank '
+                    'assembly summary (https://ftp.ncbi.nlm.nih.gov/genomes/ASSEMBLY_REPORTS/'
+                    'assembly_summary_genbank.txt). Set its path in "offline_resolver" > "path" of the submission '
+                    'configuration to use it.')
+    arg_parser.add_argument('--names_dmp', required=True, help='names.dmp from the NCBI taxonomy dump')
+    arg_parser.add_argument('--nodes_dmp', required=True, help='nodes.dmp from the NCBI taxonomy dump')
+    arg_parser.add_argument('--assembly_summary', required=True, help='assembly_summary_genbank.txt from NCBI')
+    arg_parser.add_argument('--output', required=True, help='Path of the SQLite database to create or replace')
+    arg_parser.add_argument('--debug', action='store_true', default=False,
+                            help='Set the script to output logging information at debug level')
+    args = arg_parser.parse_args()
+
+    log_cfg.add_stdout_handler()
+    if args.debug:
+        log_cfg.set_log_level(logging.DEBUG)
+
+    logger.info('Building the offline resolver database %s', args.output)
+    build_resolver_database(args.output, names_dmp=args.names_dmp, nodes_dmp=args.nodes_dmp,
+                            assembly_summary=args.assembly_summary)
+    logger.info('Offline resolver database %s created', args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import logging
+import os
+import sys
+
+import yaml
+from ebi_eva_common_pyutils.logger import logging_config as log_cfg
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from eva_submission import ROOT_DIR
+from eva_submission.xlsx.metadata_bundle import is_metadata_bundle, write_metadata_bundle, write_metadata_spreadsheet
+from eva_submission.xlsx.xlsx_parser_eva import EvaMetadataBundleReader, EvaXlsxReader
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Convert the metadata between the Excel spreadsheet and a metadata bundle, either a JSON document '
+                    'or a directory containing one TSV file per worksheet.')
+    arg_parser.add_argument('--input', required=True,
+                            help='EVA Submission Metadata Excel sheet or metadata bundle (.json file or TSV directory)')
+    arg_parser.add_argument('--output', required=True,
+                            help='Path of the converted metadata. A path ending with .xlsx creates a spreadsheet from '
+                                 'a bundle. Otherwise a spreadsheet is converted to a JSON document (.json) or to a '
+                                 'directory of TSV files.')
+    arg_parser.add_argument('--debug', action='store_true', default=False,
+                            help='Set the script to output logging information at debug level')
+    args = arg_parser.parse_args()
+
+    log_cfg.add_stdout_handler()
+    if args.debug:
+        log_cfg.set_log_level(logging.DEBUG)
+
+    with open(os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')) as open_file:
+        conf = yaml.full_load(open_file)
+
+    if is_metadata_bundle(args.input):
+        reader = EvaMetadataBundleReader(args.input)
+    else:
+        reader = EvaXlsxReader(args.input)
+
+    if args.output.endswith('.xlsx'):
+        write_metadata_spreadsheet(args.output, dict(reader.metadata), conf)
+    else:
+        write_metadata_bundle(args.output, dict(reader.metadata), conf)
+
+
+if __name__ == "__main__":
+    main()
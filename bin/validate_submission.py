@@ -38,6 +38,13 @@ def main():
                           help='Set the script to consider all validation tasks performed as valid in the final '
                                'evaluation. This does not affect the actual report but only change the final '
                                'evaluation')
+    argparse.add_argument('--incremental', action='store_true', default=False,
+                          help='Only run the validation tasks and check the VCF files whose inputs (files or tool '
+                               'versions) changed since the previous validation, reusing the previous results of the '
+                               'others')
+    argparse.add_argument('--concurrent', action='store_true', default=False,
+                          help='Run the validation workflow (vcf_check and assembly_check) in the background while '
+                               'the metadata and sample checks run')
     argparse.add_argument('--report', action='store_true', default=False,
                       help='Set the script to only report the results based on previously run validation.')
 
@@ -56,7 +63,7 @@ def main():
     eload = EloadValidation(args.eload)
     if not args.report:
 
-        eload.validate(args.validation_tasks, args.set_as_valid)
+        eload.validate(args.validation_tasks, args.set_as_valid, args.incremental, args.concurrent)
     eload.report()
 
 
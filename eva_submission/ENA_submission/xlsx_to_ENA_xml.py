@@ -8,7 +8,8 @@ from xml.etree.ElementTree import Element, ElementTree
 from ebi_eva_common_pyutils.logger import AppLogger
 from ebi_eva_common_pyutils.taxonomy.taxonomy import get_scientific_name_from_ensembl
 
-from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader
+from eva_submission.lookup_cache import cached_lookup, ENSEMBL
+from eva_submission.xlsx.xlsx_parser_eva import get_eva_xlsx_reader
 
 
 def today():
@@ -85,7 +86,7 @@ class EnaXlsxConverter(AppLogger):
         self.metadata_file = metadata_file
         self.output_folder = output_folder
         self.name = name
-        self.reader = EvaXlsxReader(self.metadata_file)
+        self.reader = get_eva_xlsx_reader(self.metadata_file)
 
         self.project_file = os.path.join(self.output_folder, self.name + '.Project.xml')
         self.analysis_file = os.path.join(self.output_folder, self.name + '.Analysis.xml')
@@ -134,7 +135,9 @@ class EnaXlsxConverter(AppLogger):
         if 'Tax ID' in project_row:
             org_elemt = add_element(sub_project_elemt, 'ORGANISM')
             add_element(org_elemt, 'TAXON_ID', element_text=str(project_row.get('Tax ID')).strip())
-            scientific_name = get_scientific_name_from_ensembl(str(project_row.get('Tax ID')).strip())
+            scientific_name = cached_lookup(
+                ENSEMBL, get_scientific_name_from_ensembl, str(project_row.get('Tax ID')).strip()
+            )
             add_element(org_elemt, 'SCIENTIFIC_NAME', element_text=scientific_name)
 
             add_element(org_elemt, 'STRAIN', element_text=project_row.get('Strain', ''), content_required=True)
@@ -0,0 +1,175 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parsing of the log and text report of vcf_assembly_checker. The files are memory mapped and searched at the byte level,
+without decoding each line, so that reports of millions of lines are summarised quickly: number of mismatches per
+contig, first examples and distribution of the match rate of the contigs.
+The report follows the order of the VCF file so the mismatches of a contig are in contiguous blocks of lines: the
+mismatches are counted per block rather than per line.
+"""
+
+import mmap
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+MISMATCH_MARKER = b'does not match the reference sequence'
+# Contig of the mismatch lines such as "Line 15: Chromosome Chr14, position 7387, reference allele 'T' does not ..."
+CONTIG_REGEX = re.compile(b'Chromosome ([^,\n]*),')
+ERROR_MARKER = b'[error]'
+NB_MATCHES_MARKER = b'[info] Number of matches: '
+
+# Number of lines kept as examples of the errors and mismatches
+DEFAULT_NB_EXAMPLES = 10
+# Number of contigs for which the mismatches are counted in the results, the ones with most mismatches first
+MAX_CONTIGS_REPORTED = 50
+MATCH_RATE_NB_BINS = 10
+# Size of the blocks of the report searched at once
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+@contextmanager
+def _mapped_file(file_path):
+    """Memory map the file in read only mode. Empty files, which cannot be mapped, are provided as empty bytes."""
+    with open(file_path, 'rb') as open_file:
+        if os.fstat(open_file.fileno()).st_size == 0:
+            yield b''
+            return
+        mapped_file = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped_file
+        finally:
+            mapped_file.close()
+
+
+def _line_end(data, pos):
+    line_end = data.find(b'\n', pos)
+    return len(data) if line_end == -1 else line_end
+
+
+def _lines_with(data, marker):
+    """:return: iterator over the lines of the data (without the new line) containing the marker"""
+    start = 0
+    while True:
+        marker_pos = data.find(marker, start)
+        if marker_pos == -1:
+            return
+        line_start = data.rfind(b'\n', 0, marker_pos) + 1
+        line_end = _line_end(data, marker_pos)
+        yield data[line_start:line_end]
+        start = line_end + 1
+
+
+def _count(data, marker, start, end, chunk_size=CHUNK_SIZE):
+    """:return: the number of occurrences of the marker between start and end, counted in chunks of bytes"""
+    count = 0
+    while start < end:
+        chunk_end = min(start + chunk_size, end)
+        # The chunk overlaps the next one so that a marker across their boundary is counted once
+        count += data[start:min(chunk_end + len(marker) - 1, end)].count(marker)
+        start = chunk_end
+    return count
+
+
+def _mismatches_per_contig(data):
+    """:return: Counter of the number of mismatches of each contig, counted in each block of lines of the contig"""
+    mismatches_per_contig = Counter()
+    contig_match = CONTIG_REGEX.search(data)
+    while contig_match:
+        contig = contig_match.group(1)
+        # The block ends at the first line of another contig
+        next_contig = re.compile(b'Chromosome (?!' + re.escape(contig) + b',)').search(data, contig_match.end())
+        block_end = next_contig.start() if next_contig else len(data)
+        nb_mismatch = _count(data, MISMATCH_MARKER, contig_match.start(), block_end)
+        if nb_mismatch:
+            mismatches_per_contig[_decode(contig)] += nb_mismatch
+        contig_match = CONTIG_REGEX.search(data, block_end) if next_contig else None
+    return mismatches_per_contig
+
+
+def _decode(line):
+    return line.decode(errors='replace').strip()
+
+
+def parse_assembly_check_log(assembly_check_log, nb_examples=DEFAULT_NB_EXAMPLES):
+    """
+    :return: the first errors, the number of errors and the number of matches and of variants checked, which are None
+    if the log does not report them
+    """
+    error_list = []
+    nb_error = 0
+    match = total = None
+    with _mapped_file(assembly_check_log) as data:
+        for line in _lines_with(data, ERROR_MARKER):
+            if not line.startswith(ERROR_MARKER):
+                continue
+            nb_error += 1
+            if nb_error <= nb_examples:
+                error_list.append(_decode(line)[len(ERROR_MARKER):])
+        nb_matches_pos = data.rfind(NB_MATCHES_MARKER)
+        if nb_matches_pos != -1:
+            nb_matches = _decode(data[nb_matches_pos + len(NB_MATCHES_MARKER):_line_end(data, nb_matches_pos)])
+            match, total = (int(value) for value in nb_matches.split('/'))
+    return error_list, nb_error, match, total
+
+
+def parse_assembly_check_report(assembly_check_report, variants_per_contig=None, nb_examples=DEFAULT_NB_EXAMPLES):
+    """
+    :param variants_per_contig: number of variants of each contig in the VCF file, used to compute the distribution of
+    the match rate of the contigs
+    :return: dict with the number of mismatches, the first mismatches, the number of contigs with mismatches, the
+    number of mismatches of the contigs with most mismatches and the match rate histogram if variants_per_contig is
+    provided
+    """
+    mismatch_list = []
+    with _mapped_file(assembly_check_report) as data:
+        for line in _lines_with(data, MISMATCH_MARKER):
+            if len(mismatch_list) == nb_examples:
+                break
+            mismatch_list.append(_decode(line))
+        nb_mismatch = _count(data, MISMATCH_MARKER, 0, len(data))
+        mismatches_per_contig = _mismatches_per_contig(data)
+    results = {
+        'nb_mismatch': nb_mismatch,
+        'mismatch_list': mismatch_list,
+        'nb_contig_with_mismatch': len(mismatches_per_contig),
+        'mismatches_per_contig': dict(
+            sorted(mismatches_per_contig.items(), key=lambda item: -item[1])[:MAX_CONTIGS_REPORTED]
+        )
+    }
+    if variants_per_contig:
+        results['match_rate_histogram'] = match_rate_histogram(mismatches_per_contig, variants_per_contig)
+    return results
+
+
+def match_rate_histogram(mismatches_per_contig, variants_per_contig, nb_bins=MATCH_RATE_NB_BINS):
+    """
+    Distribute the contigs of the VCF file by the proportion of their variants matching the reference sequence.
+    :param mismatches_per_contig: number of mismatches of each contig in the assembly check report
+    :param variants_per_contig: number of variants of each contig in the VCF file
+    :return: list of dict with the range of match rate and the number of contigs in that range
+    """
+    nb_contigs = [0] * nb_bins
+    for contig, nb_variant in variants_per_contig.items():
+        if not nb_variant:
+            continue
+        match_rate = max(nb_variant - mismatches_per_contig.get(contig, 0), 0) / nb_variant
+        nb_contigs[min(int(match_rate * nb_bins), nb_bins - 1)] += 1
+    bin_size = 100 // nb_bins
+    return [
+        {'match_rate': '%s-%s%%' % (index * bin_size, (index + 1) * bin_size), 'nb_contig': nb_contig}
+        for index, nb_contig in enumerate(nb_contigs)
+    ]
@@ -4,18 +4,26 @@ import requests
 from ebi_eva_common_pyutils.pg_utils import get_all_results_for_query
 from ebi_eva_common_pyutils.logger import logging_config as log_cfg
 
+from eva_submission.lookup_cache import cached_lookup, ENA
+from eva_submission.offline_resolver import offline_scientific_and_common_name
+
 
 logger = log_cfg.get_logger(__name__)
 
 
-def download_xml_from_ena(ena_url):
-    """Download and parse XML from ENA"""
+def download_text_from_ena(ena_url):
+    """Download the content of an ENA URL"""
     try:  # catches any kind of request error, including non-20X status code
         response = requests.get(ena_url)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         raise e
-    root = etree.XML(bytes(response.text, encoding='utf-8'))
+    return response.text
+
+
+def download_xml_from_ena(ena_url):
+    """Download and parse XML from ENA. The raw XML is kept in the lookup cache when it is configured."""
+    root = etree.XML(bytes(cached_lookup(ENA, download_text_from_ena, ena_url), encoding='utf-8'))
     return root
 
 
@@ -30,6 +38,9 @@ def get_assembly_name_and_taxonomy_id(assembly_accession):
 
 
 def get_scientific_name_and_common_name(taxonomy_id):
+    names = offline_scientific_and_common_name(taxonomy_id)
+    if names:
+        return names
     xml_root = download_xml_from_ena(f'https://www.ebi.ac.uk/ena/data/view/Taxon:{taxonomy_id}&display=xml')
     xml_taxon = xml_root.xpath('/TAXON_SET/taxon')
     if len(xml_taxon) == 0:
@@ -24,7 +24,7 @@ from ebi_eva_common_pyutils.config import cfg
 from ebi_eva_common_pyutils.logger import AppLogger
 from retry import retry
 
-from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader
+from eva_submission.xlsx.xlsx_parser_eva import get_eva_xlsx_reader
 
 _now = datetime.now().isoformat()
 
@@ -412,7 +412,7 @@ class SampleMetadataSubmitter(SampleSubmitter):
     def __init__(self, metadata_spreadsheet):
         super().__init__()
         self.metadata_spreadsheet = metadata_spreadsheet
-        self.reader = EvaXlsxReader(self.metadata_spreadsheet)
+        self.reader = get_eva_xlsx_reader(self.metadata_spreadsheet)
         self.sample_data = self.map_metadata_to_bsd_data()
 
     def map_metadata_to_bsd_data(self):
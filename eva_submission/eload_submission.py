@@ -12,14 +12,16 @@ from ebi_eva_common_pyutils.logger import AppLogger
 from ebi_eva_common_pyutils.taxonomy.taxonomy import get_scientific_name_from_ensembl
 
 from eva_submission.eload_utils import get_reference_fasta_and_report, resolve_accession_from_text
+from eva_submission.lookup_cache import cached_lookup, ENSEMBL
 from eva_submission.submission_config import EloadConfig
 from eva_submission.submission_in_ftp import FtpDepositBox
-from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader, EvaXlsxWriter
+from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader, EvaXlsxWriter, get_eva_xlsx_reader
 
 directory_structure = {
     'vcf': '10_submitted/vcf_files',
     'metadata': '10_submitted/metadata_file',
     'validation': '13_validation',
+    'metadata_check': '13_validation/metadata_check',
     'vcf_check': '13_validation/vcf_format',
     'assembly_check': '13_validation/assembly_check',
     'sample_check': '13_validation/sample_concordance',
@@ -58,7 +60,7 @@ class Eload(AppLogger):
 
     def update_metadata_from_config(self, input_spreadsheet, output_spreadsheet=None):
 
-        reader = EvaXlsxReader(input_spreadsheet)
+        reader = get_eva_xlsx_reader(input_spreadsheet)
         single_analysis_alias = None
         if len(reader.analysis) == 1:
             single_analysis_alias = reader.analysis[0].get('Analysis Alias')
@@ -73,7 +75,8 @@ class Eload(AppLogger):
                     'Sample Accession': self.eload_cfg['brokering']['Biosamples']['Samples'][sample_row.get('Sample Name')]
                 })
             else:
-                sample_rows.append(sample_row)
+                # The rows of the shared reader must not be modified by the writer
+                sample_rows.append(dict(sample_row))
 
         file_rows = []
         file_to_row = {}
@@ -189,7 +192,7 @@ class EloadPreparation(Eload):
         self.eload_cfg.set('submission','vcf_files', value=vcf_files)
 
     def detect_metadata_attributes(self):
-        eva_metadata = EvaXlsxReader(self.eload_cfg.query('submission', 'metadata_spreadsheet'))
+        eva_metadata = get_eva_xlsx_reader(self.eload_cfg.query('submission', 'metadata_spreadsheet'))
         reference_set = set()
         for analysis in eva_metadata.analysis:
             reference_txt = analysis.get('Reference')
@@ -211,7 +214,7 @@ class EloadPreparation(Eload):
         taxonomy_id = eva_metadata.project.get('Tax ID')
         if taxonomy_id and (isinstance(taxonomy_id, int) or taxonomy_id.isdigit()):
             self.eload_cfg.set('submission', 'taxonomy_id', value=int(taxonomy_id))
-            scientific_name = get_scientific_name_from_ensembl(taxonomy_id)
+            scientific_name = cached_lookup(ENSEMBL, get_scientific_name_from_ensembl, taxonomy_id)
             self.eload_cfg.set('submission', 'scientific_name', value=scientific_name)
         else:
             if taxonomy_id:
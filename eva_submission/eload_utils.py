@@ -10,6 +10,9 @@ import psycopg2
 from ebi_eva_common_pyutils.variation.assembly_utils import retrieve_genbank_assembly_accessions_from_ncbi
 from pymongo.uri_parser import split_hosts
 
+from eva_submission.lookup_cache import cached_lookup, NCBI
+from eva_submission.offline_resolver import offline_assembly_accessions
+
 logger = log_cfg.get_logger(__name__)
 
 
@@ -40,7 +43,8 @@ def resolve_accession_from_text(reference_text):
     if NCBIAssembly.is_assembly_accession_format(reference_text):
         return [reference_text]
     # Search for a reference genome that resolve this text
-    accession = retrieve_genbank_assembly_accessions_from_ncbi(reference_text)
+    accession = offline_assembly_accessions(reference_text) or \
+        cached_lookup(NCBI, retrieve_genbank_assembly_accessions_from_ncbi, reference_text)
     if accession:
         return accession
 
@@ -1,42 +1,84 @@
 #!/usr/bin/env python
+import copy
 import os
 import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 from ebi_eva_common_pyutils import command_utils
 from ebi_eva_common_pyutils.config import cfg
 
 from eva_submission import ROOT_DIR
+from eva_submission.assembly_check_report import parse_assembly_check_log, parse_assembly_check_report
 from eva_submission.eload_submission import Eload
 from eva_submission.eload_utils import resolve_single_file_path
+from eva_submission.input_fingerprint import file_fingerprint, same_inputs, tool_version
 from eva_submission.samples_checker import compare_spreadsheet_and_vcf
-from eva_submission.xlsx.xlsx_validation import EvaXlsxValidator
+from eva_submission.validation_cache import fingerprint_key, get_validation_cache
+from eva_submission.vcf_precheck import contig_names_from_assembly_report, precheck_vcf, DEFAULT_MAX_RECORDS
+from eva_submission.vcf_validator_report import read_vcf_validator_db_report
+from eva_submission.xlsx.validation_errors import format_error_summary, summarise_errors, write_error_records
+from eva_submission.xlsx.xlsx_validation import EvaXlsxValidator, VALIDATION_SCHEMA_FILE
+
+VALIDATION_WORKFLOW = os.path.join(ROOT_DIR, 'nextflow', 'validation.nf')
+# Error recorded when the validation workflow did not produce the outputs of a VCF file
+PROCESS_FAILED = 'Process failed'
 
 
 class EloadValidation(Eload):
 
     all_validation_tasks = ['metadata_check', 'assembly_check', 'vcf_check', 'sample_check']
 
-    def validate(self, validation_tasks=None, set_as_valid=False):
+    def __init__(self, eload_number: int):
+        super().__init__(eload_number)
+        # Fingerprints of the input files computed during this validation and the ones stored by the previous one
+        self._file_fingerprints = {}
+        self._previous_file_fingerprints = {}
+        self._incremental = False
+
+    def validate(self, validation_tasks=None, set_as_valid=False, incremental=False, concurrent=False):
+        """
+        Run the validation tasks and record their results with the fingerprint of their inputs.
+        :param incremental: only run the tasks and check the VCF files whose inputs changed since the previous
+        validation, reusing the previous results of the others.
+        :param concurrent: run the validation workflow in the background while the metadata and sample checks run.
+        The results are written to the config once all the tasks are finished.
+        """
         if not validation_tasks:
             validation_tasks = self.all_validation_tasks
 
+        self._incremental = incremental
+        previous_results = copy.deepcopy(self.eload_cfg.query('validation', ret_default={}))
+        self._store_previous_file_fingerprints(previous_results)
+
         # (Re-)Initialise the config file output
         self.eload_cfg.set('validation', 'validation_date', value=self.now)
         self.eload_cfg.set('validation', 'valid', value={})
         for validation_task in validation_tasks:
             self.eload_cfg.set('validation', validation_task, value={})
 
-        if 'metadata_check' in validation_tasks:
-            self._validate_metadata_format()
-        if 'sample_check' in validation_tasks:
-            self._validate_sample_names()
-
-        if 'vcf_check' in validation_tasks or 'assembly_check' in validation_tasks:
-            output_dir = self._run_validation_workflow()
-            self._collect_validation_worklflow_results(output_dir)
-            shutil.rmtree(output_dir)
+        run_python_tasks = 'metadata_check' in validation_tasks or 'sample_check' in validation_tasks
+        run_workflow = 'vcf_check' in validation_tasks or 'assembly_check' in validation_tasks
+        workflow_results = None
+        if concurrent and run_python_tasks and run_workflow:
+            # Only reads the config so that the results are all written from this thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                workflow_future = executor.submit(self._run_workflow_validation_tasks, previous_results, incremental)
+                python_results = self._run_python_validation_tasks(validation_tasks, previous_results, incremental)
+                workflow_results = workflow_future.result()
+        else:
+            python_results = self._run_python_validation_tasks(validation_tasks, previous_results, incremental)
+            if run_workflow:
+                workflow_results = self._run_workflow_validation_tasks(previous_results, incremental)
+
+        for validation_task, results in python_results.items():
+            self.eload_cfg.set('validation', validation_task, value=results)
+        if workflow_results:
+            vcf_files, output_dir, precheck_results = workflow_results
+            self._collect_validation_worklflow_results(output_dir, vcf_files, previous_results, precheck_results)
+            if output_dir:
+                shutil.rmtree(output_dir)
 
         if set_as_valid is True:
             for validation_task in validation_tasks:
@@ -50,55 +92,190 @@ class EloadValidation(Eload):
             self.eload_cfg.set('validation', 'valid', 'vcf_files', value=self.eload_cfg['submission']['vcf_files'])
             self.eload_cfg.set('validation', 'valid', 'metadata_spreadsheet', value=self.eload_cfg['submission']['metadata_spreadsheet'])
 
+    def _store_previous_file_fingerprints(self, previous_results):
+        """Keep the file fingerprints of the previous validation so that the md5 of unchanged files is not recomputed"""
+        fingerprints = []
+        for results in previous_results.values():
+            if not isinstance(results, dict):
+                continue
+            fingerprints.append(results.get('fingerprint'))
+            fingerprints.extend(file_results.get('fingerprint') for file_results in (results.get('files') or {}).values())
+        for fingerprint in fingerprints:
+            for file_path, previous_fingerprint in ((fingerprint or {}).get('files') or {}).items():
+                if previous_fingerprint:
+                    self._previous_file_fingerprints[file_path] = previous_fingerprint
+
+    def _file_fingerprint(self, file_path):
+        if file_path not in self._file_fingerprints:
+            self._file_fingerprints[file_path] = file_fingerprint(
+                file_path, self._previous_file_fingerprints.get(file_path)
+            )
+        return self._file_fingerprints[file_path]
+
+    def _fingerprint(self, file_paths, executables=()):
+        return {
+            'files': dict((file_path, self._file_fingerprint(file_path)) for file_path in file_paths),
+            'tools': dict((executable, tool_version(cfg.query('executable', executable, ret_default=executable)))
+                          for executable in executables)
+        }
+
+    def _task_fingerprint(self, validation_task, vcf_file=None):
+        """
+        :return: fingerprint of the inputs of a validation task, for one VCF file for vcf_check and assembly_check
+        """
+        metadata_spreadsheet = self.eload_cfg.query('submission', 'metadata_spreadsheet')
+        if validation_task == 'metadata_check':
+            return self._fingerprint([metadata_spreadsheet, VALIDATION_SCHEMA_FILE])
+        if validation_task == 'sample_check':
+            return self._fingerprint([metadata_spreadsheet] + self.eload_cfg.query('submission', 'vcf_files'))
+        if validation_task == 'vcf_check':
+            return self._fingerprint([vcf_file, VALIDATION_WORKFLOW], ['vcf_validator'])
+        if validation_task == 'assembly_check':
+            return self._fingerprint(
+                [vcf_file, self.eload_cfg.query('submission', 'assembly_fasta'),
+                 self.eload_cfg.query('submission', 'assembly_report'), VALIDATION_WORKFLOW],
+                ['vcf_assembly_checker']
+            )
+
+    def _recorded_task_fingerprint(self, validation_task, vcf_file=None):
+        """
+        :return: the fingerprint stored with the results of a validation task or None when neither the incremental
+        validation nor the validation cache can use it, so that the inputs are not read for nothing
+        """
+        if not self._incremental and get_validation_cache() is None:
+            return None
+        return self._task_fingerprint(validation_task, vcf_file)
+
+    def _vcf_files_with_changed_inputs(self, previous_results):
+        """
+        :return: the VCF files for which the inputs of vcf_check or assembly_check changed or which were not fully
+        checked the last time
+        """
+        changed_vcf_files = []
+        for vcf_file in self.eload_cfg.query('submission', 'vcf_files'):
+            vcf_name = os.path.basename(vcf_file)
+            for validation_task in ('vcf_check', 'assembly_check'):
+                previous_file_results = (previous_results.get(validation_task) or {}).get('files', {}).get(vcf_name)
+                # Results without fingerprint are the ones of a failed process or of a file not checked
+                if not previous_file_results or PROCESS_FAILED in (previous_file_results.get('error_list') or []) or \
+                        not same_inputs(previous_file_results.get('fingerprint'),
+                                        self._task_fingerprint(validation_task, vcf_file)):
+                    changed_vcf_files.append(vcf_file)
+                    break
+        return changed_vcf_files
+
+    def _run_python_validation_tasks(self, validation_tasks, previous_results, incremental):
+        """
+        Run the metadata and sample checks, reusing the previous results of the ones whose inputs have not changed in
+        incremental mode.
+        :return: dict of each validation task run to its results
+        """
+        task_results = {}
+        for validation_task, validation_function in (('metadata_check', self._validate_metadata_format),
+                                                     ('sample_check', self._validate_sample_names)):
+            if validation_task not in validation_tasks:
+                continue
+            fingerprint = self._recorded_task_fingerprint(validation_task)
+            previous_result = previous_results.get(validation_task) or {}
+            if incremental and same_inputs(previous_result.get('fingerprint'), fingerprint):
+                self.info('Inputs of %s have not changed: reuse the previous results', validation_task)
+                task_results[validation_task] = previous_result
+                continue
+            task_results[validation_task] = dict(validation_function(), fingerprint=fingerprint)
+        return task_results
+
+    def _run_workflow_validation_tasks(self, previous_results, incremental):
+        """
+        Pre-check the VCF files and run the validation workflow on the ones that passed.
+        :return: the VCF files checked, the output directory of the workflow or None if it was not run and the results
+        of the pre-check
+        """
+        vcf_files = self.eload_cfg.query('submission', 'vcf_files')
+        if incremental:
+            vcf_files = self._vcf_files_with_changed_inputs(previous_results)
+            self.info('%s VCF file(s) to check with the validation workflow', len(vcf_files))
+        # Files failing the pre-check are not sent to the validation workflow
+        precheck_results = self._precheck_vcf_files(vcf_files)
+        workflow_vcf_files = [
+            vcf_file for vcf_file in vcf_files if vcf_file not in precheck_results or precheck_results[vcf_file]['pass']
+        ]
+        output_dir = None
+        if workflow_vcf_files:
+            output_dir = self._run_validation_workflow(workflow_vcf_files)
+        return vcf_files, output_dir, precheck_results
+
     def _validate_metadata_format(self):
+        """:return: the results of the metadata check"""
         validator = EvaXlsxValidator(self.eload_cfg['submission']['metadata_spreadsheet'])
         validator.validate()
-        self.eload_cfg['validation']['metadata_check']['metadata_spreadsheet'] = self.eload_cfg['submission']['metadata_spreadsheet']
-        self.eload_cfg['validation']['metadata_check']['errors'] = validator.error_list
-        self.eload_cfg['validation']['metadata_check']['pass'] = len(validator.error_list) == 0
+        # Only the summary of the errors is kept in the config, the details are in the error file
+        error_file = os.path.join(self._get_dir('metadata_check'), 'metadata_errors.tsv')
+        write_error_records(validator.error_records, error_file)
+        return {
+            'metadata_spreadsheet': self.eload_cfg['submission']['metadata_spreadsheet'],
+            'nb_error': len(validator.error_records),
+            'error_summary': summarise_errors(validator.error_records),
+            'error_file': error_file,
+            'pass': len(validator.error_records) == 0
+        }
 
     def _validate_sample_names(self):
+        """:return: the results of the sample check"""
         overall_differences, results_per_analysis_alias = compare_spreadsheet_and_vcf(
             eva_files_sheet=self.eload_cfg['submission']['metadata_spreadsheet'],
             vcf_dir=self._get_dir('vcf'),
             expected_vcf_files=self.eload_cfg['submission']['vcf_files']
         )
+        results = {'analysis': {}, 'pass': not overall_differences}
         for analysis_alias in results_per_analysis_alias:
             has_difference, diff_submitted_file_submission, diff_submission_submitted_file = results_per_analysis_alias[analysis_alias]
 
-            self.eload_cfg.set('validation', 'sample_check', 'analysis', str(analysis_alias), value={
+            results['analysis'][str(analysis_alias)] = {
                 'difference_exists': has_difference,
                 'in_VCF_not_in_metadata': diff_submitted_file_submission,
                 'in_metadata_not_in_VCF': diff_submission_submitted_file
-            })
-        self.eload_cfg.set('validation', 'sample_check', 'pass', value=not overall_differences)
+            }
+        return results
+
+    def _precheck_vcf_files(self, vcf_files):
+        """
+        Check the compression, the header and the first records of each VCF file to find the errors that do not need
+        the validation workflow. The pre-check is not run when "vcf_precheck" > "skip" is set and reads the whole files
+        when "vcf_precheck" > "full_scan" is set in the submission configuration.
+        :return: dict of each VCF file pre-checked to its results
+        """
+        if cfg.query('vcf_precheck', 'skip', ret_default=False):
+            return {}
+        contig_names = None
+        assembly_report = self.eload_cfg.query('submission', 'assembly_report')
+        if assembly_report and os.path.isfile(assembly_report):
+            contig_names = contig_names_from_assembly_report(assembly_report)
+        fail_fast = cfg.query('vcf_precheck', 'fail_fast', ret_default=False)
+        max_records = None
+        if not cfg.query('vcf_precheck', 'full_scan', ret_default=False):
+            max_records = cfg.query('vcf_precheck', 'max_records', ret_default=DEFAULT_MAX_RECORDS)
+        return dict(
+            (vcf_file, precheck_vcf(vcf_file, contig_names, fail_fast=fail_fast, max_records=max_records))
+            for vcf_file in vcf_files
+        )
+
+    @staticmethod
+    def _precheck_summary(precheck):
+        """
+        :return: the results of the pre-check without the errors, which are stored in the error_list, and without the
+        variants per contig, which are only used to compute the match rate of the contigs
+        """
+        return dict(
+            (key, precheck[key])
+            for key in ('warnings', 'nb_warning', 'complete', 'compression', 'nb_sample', 'nb_variant', 'nb_contig')
+        )
 
     def parse_assembly_check_log(self, assembly_check_log):
-        error_list = []
-        nb_error, nb_mismatch = 0, 0
-        match = total = None
-        with open(assembly_check_log) as open_file:
-            for line in open_file:
-                if line.startswith('[error]'):
-                    nb_error += 1
-                    if nb_error < 11:
-                        error_list.append(line.strip()[len('[error]'):])
-                elif line.startswith('[info] Number of matches:'):
-                    match, total = line.strip()[len('[info] Number of matches: '):].split('/')
-                    match = int(match)
-                    total = int(total)
-        return error_list, nb_error, match, total
+        return parse_assembly_check_log(assembly_check_log)
 
     def parse_assembly_check_report(self, assembly_check_report):
-        mismatch_list = []
-        nb_mismatch = 0
-        with open(assembly_check_report) as open_file:
-            for line in open_file:
-               if 'does not match the reference sequence' in line:
-                    nb_mismatch += 1
-                    if nb_mismatch < 11:
-                        mismatch_list.append(line.strip())
-        return mismatch_list, nb_mismatch
+        results = parse_assembly_check_report(assembly_check_report)
+        return results['mismatch_list'], results['nb_mismatch']
 
     def parse_vcf_check_report(self, vcf_check_report):
         valid = True
@@ -106,8 +283,8 @@ class EloadValidation(Eload):
         warning_count = error_count = 0
         with open(vcf_check_report) as open_file:
             for line in open_file:
-                if 'warning' in line:
-                    warning_count = 1
+                if line.rstrip().endswith('(warning)'):
+                    warning_count += 1
                 elif line.startswith('According to the VCF specification'):
                     if 'not' in line:
                         valid = False
@@ -117,10 +294,74 @@ class EloadValidation(Eload):
                         error_list.append(line.strip())
         return valid, error_list, error_count, warning_count
 
-    def _run_validation_workflow(self):
+    def parse_vcf_check_db_report(self, vcf_check_db_report):
+        """
+        :return: same as parse_vcf_check_report followed by the errors and warnings per category, or None if the
+        database cannot be read
+        """
+        results = read_vcf_validator_db_report(vcf_check_db_report)
+        if results is None:
+            return None
+        return (results['nb_error'] == 0, results['error_list'], results['nb_error'], results['nb_warning'],
+                results['categories'])
+
+    def _workflow_outputs(self, output_dir, vcf_file):
+        """:return: the paths of the outputs of the validation workflow for one VCF file, per validation task"""
+        vcf_name = os.path.basename(vcf_file)
+        return {
+            'vcf_check': {
+                'log': os.path.join(output_dir, 'vcf_format', vcf_name + '.vcf_format.log'),
+                'text_report': os.path.join(output_dir, 'vcf_format', vcf_name + '.errors.cached.txt'),
+                'db_report': os.path.join(output_dir, 'vcf_format', vcf_name + '.errors.cached.db')
+            },
+            'assembly_check': {
+                'log': os.path.join(output_dir, 'assembly_check', vcf_name + '.assembly_check.log'),
+                'valid_vcf': os.path.join(output_dir, 'assembly_check', vcf_name + '.valid_assembly_report.txt'),
+                'text_report': os.path.join(output_dir, 'assembly_check', vcf_name + '.text_assembly_report.txt')
+            }
+        }
+
+    def _restore_from_validation_cache(self, vcf_file, output_dir):
+        """
+        Copy the cached outputs of vcf_check and assembly_check for this VCF file where the validation workflow would
+        write them.
+        :return: True if both were found in the validation cache
+        """
+        validation_cache = get_validation_cache()
+        if validation_cache is None:
+            return False
+        keys = dict(
+            (validation_task, fingerprint_key(validation_task, self._task_fingerprint(validation_task, vcf_file)))
+            for validation_task in ('vcf_check', 'assembly_check')
+        )
+        if not all(key and validation_cache.get(validation_task, key) for validation_task, key in keys.items()):
+            return False
+        workflow_outputs = self._workflow_outputs(output_dir, vcf_file)
+        for validation_task, key in keys.items():
+            validation_cache.restore(validation_task, key, workflow_outputs[validation_task])
+        self.info('Validation results of %s restored from the validation cache', vcf_file)
+        return True
+
+    def _store_in_validation_cache(self, validation_task, vcf_file, outputs):
+        validation_cache = get_validation_cache()
+        if validation_cache is None or not all(outputs.values()):
+            return
+        key = fingerprint_key(validation_task, self._task_fingerprint(validation_task, vcf_file))
+        if key:
+            validation_cache.put(validation_task, key, outputs)
+
+    def _run_validation_workflow(self, vcf_files=None):
+        """
+        Run the validation workflow on the VCF files that are not in the validation cache. The outputs of the others
+        are restored from the cache in the output directory.
+        """
         output_dir = self.create_nextflow_temp_output_directory()
+        vcf_files = vcf_files or self.eload_cfg.query('submission', 'vcf_files')
+        vcf_files = [vcf_file for vcf_file in vcf_files if not self._restore_from_validation_cache(vcf_file, output_dir)]
+        if not vcf_files:
+            return output_dir
         validation_config = {
-            'vcf_files': self.eload_cfg.query('submission', 'vcf_files'),
+            'vcf_files': vcf_files,
             'reference_fasta': self.eload_cfg.query('submission', 'assembly_fasta'),
             'reference_report': self.eload_cfg.query('submission', 'assembly_report'),
             'output_dir': output_dir,
@@ -130,7 +371,7 @@ class EloadValidation(Eload):
         validation_confg_file = os.path.join(self.eload_dir, 'validation_confg_file.yaml')
         with open(validation_confg_file, 'w') as open_file:
             yaml.safe_dump(validation_config, open_file)
-        validation_script = os.path.join(ROOT_DIR, 'nextflow', 'validation.nf')
+        validation_script = VALIDATION_WORKFLOW
         try:
             command_utils.run_command_with_output(
                 'Nextflow Validation process',
@@ -153,12 +394,40 @@ class EloadValidation(Eload):
         else:
             return None
 
-    def _collect_validation_worklflow_results(self, output_dir):
+    def _previous_file_results(self, previous_results, validation_task, vcf_file):
+        return ((previous_results or {}).get(validation_task) or {}).get('files', {}).get(os.path.basename(vcf_file))
+
+    def _collect_validation_worklflow_results(self, output_dir, vcf_files=None, previous_results=None,
+                                              precheck_results=None):
+        """
+        Collect the results of the validation workflow for the VCF files it checked. The other VCF files of the
+        submission keep their results from previous_results. The VCF files that failed the pre-check get the errors it
+        found.
+        """
+        precheck_results = precheck_results or {}
+        if vcf_files is None:
+            vcf_files = self.eload_cfg.query('submission', 'vcf_files')
         # Collect information from the output and summarise in the config
         total_error = 0
+        self.eload_cfg.set('validation', 'vcf_check', 'files', value={})
         # detect output files for vcf check
         for vcf_file in self.eload_cfg.query('submission', 'vcf_files'):
             vcf_name = os.path.basename(vcf_file)
+            if vcf_file not in vcf_files:
+                file_results = self._previous_file_results(previous_results, 'vcf_check', vcf_file)
+                total_error += file_results['nb_error']
+                self.eload_cfg.set('validation', 'vcf_check', 'files', vcf_name, value=file_results)
+                continue
+            precheck = precheck_results.get(vcf_file)
+            if precheck and not precheck['pass']:
+                # No fingerprint so that the file is checked again by the next incremental validation
+                total_error += precheck['nb_error']
+                self.eload_cfg.set('validation', 'vcf_check', 'files', vcf_name, value={
+                    'error_list': precheck['errors'], 'nb_error': precheck['nb_error'],
+                    'nb_warning': precheck['nb_warning'], 'vcf_check_log': None, 'vcf_check_text_report': None,
+                    'vcf_check_db_report': None, 'precheck': self._precheck_summary(precheck), 'fingerprint': None
+                })
+                continue
 
             tmp_vcf_check_log = resolve_single_file_path(
                 os.path.join(output_dir, 'vcf_format', vcf_name + '.vcf_format.log')
@@ -183,23 +452,56 @@ class EloadValidation(Eload):
                 tmp_vcf_check_db_report,
                 os.path.join(self._get_dir('vcf_check'), vcf_name + '.vcf_validator.db')
             )
+            error_categories = None
+            fingerprint = None
             if vcf_check_log and vcf_check_text_report and vcf_check_db_report:
-                valid, error_list, error_count, warning_count = self.parse_vcf_check_report(vcf_check_text_report)
+                db_report_results = self.parse_vcf_check_db_report(vcf_check_db_report)
+                if db_report_results:
+                    valid, error_list, error_count, warning_count, error_categories = db_report_results
+                else:
+                    # The text report is only read when the database cannot be
+                    valid, error_list, error_count, warning_count = self.parse_vcf_check_report(vcf_check_text_report)
+                self._store_in_validation_cache('vcf_check', vcf_file, {
+                    'log': vcf_check_log, 'text_report': vcf_check_text_report, 'db_report': vcf_check_db_report
+                })
+                fingerprint = self._recorded_task_fingerprint('vcf_check', vcf_file)
             else:
-                valid, error_list, error_count, warning_count = (False, ['Process failed'], 1, 0)
+                # No fingerprint so that the file is checked again by the next incremental validation
+                valid, error_list, error_count, warning_count = (False, [PROCESS_FAILED], 1, 0)
             total_error += error_count
 
-            self.eload_cfg.set('validation', 'vcf_check', 'files', vcf_name, value={
+            file_results = {
                 'error_list': error_list, 'nb_error': error_count, 'nb_warning': warning_count,
                 'vcf_check_log': vcf_check_log, 'vcf_check_text_report': vcf_check_text_report,
-                'vcf_check_db_report': vcf_check_db_report
-            })
+                'vcf_check_db_report': vcf_check_db_report,
+                'fingerprint': fingerprint
+            }
+            if error_categories is not None:
+                file_results['error_categories'] = error_categories
+            if precheck:
+                file_results['precheck'] = self._precheck_summary(precheck)
+            self.eload_cfg.set('validation', 'vcf_check', 'files', vcf_name, value=file_results)
         self.eload_cfg.set('validation', 'vcf_check', 'pass', value=total_error == 0)
 
         # detect output files for assembly check
         total_error = 0
+        self.eload_cfg.set('validation', 'assembly_check', 'files', value={})
         for vcf_file in self.eload_cfg.query('submission', 'vcf_files'):
             vcf_name = os.path.basename(vcf_file)
+            if vcf_file not in vcf_files:
+                file_results = self._previous_file_results(previous_results, 'assembly_check', vcf_file)
+                total_error += file_results['nb_error'] + file_results['nb_mismatch']
+                self.eload_cfg.set('validation', 'assembly_check', 'files', vcf_name, value=file_results)
+                continue
+            if vcf_file in precheck_results and not precheck_results[vcf_file]['pass']:
+                # No fingerprint so that the file is checked again by the next incremental validation
+                total_error += 1
+                self.eload_cfg.set('validation', 'assembly_check', 'files', vcf_name, value={
+                    'error_list': ['Not checked: the VCF file failed the pre-check'], 'mismatch_list': [],
+                    'nb_mismatch': 0, 'nb_error': 1, 'ref_match': 0, 'nb_variant': 0, 'assembly_check_log': None,
+                    'assembly_check_valid_vcf': None, 'assembly_check_text_report': None, 'fingerprint': None
+                })
+                continue
 
             tmp_assembly_check_log = resolve_single_file_path(
                 os.path.join(output_dir, 'assembly_check',  vcf_name + '.assembly_check.log')
@@ -224,35 +526,63 @@ class EloadValidation(Eload):
                 tmp_assembly_check_text_report,
                 os.path.join(self._get_dir('assembly_check'), vcf_name + '.text_assembly_report.txt')
             )
+            fingerprint = None
             if assembly_check_log and assembly_check_valid_vcf and assembly_check_text_report:
                 error_list, nb_error, match, total = self.parse_assembly_check_log(assembly_check_log)
-                mismatch_list, nb_mismatch = self.parse_assembly_check_report(assembly_check_text_report)
+                # The variants per contig counted by the pre-check give the match rate of each contig when it read
+                # the whole file
+                variants_per_contig = None
+                if (precheck_results.get(vcf_file) or {}).get('complete'):
+                    variants_per_contig = precheck_results[vcf_file]['nb_variant_per_contig']
+                mismatch_statistics = parse_assembly_check_report(assembly_check_text_report, variants_per_contig)
+                mismatch_list = mismatch_statistics.pop('mismatch_list')
+                nb_mismatch = mismatch_statistics.pop('nb_mismatch')
+                self._store_in_validation_cache('assembly_check', vcf_file, {
+                    'log': assembly_check_log, 'valid_vcf': assembly_check_valid_vcf,
+                    'text_report': assembly_check_text_report
+                })
+                fingerprint = self._recorded_task_fingerprint('assembly_check', vcf_file)
             else:
-                error_list, mismatch_list, nb_mismatch, nb_error, match, total = (['Process failed'], [], 0, 1, 0, 0)
+                error_list, mismatch_list, nb_mismatch, nb_error, match, total = ([PROCESS_FAILED], [], 0, 1, 0, 0)
+                mismatch_statistics = {}
             total_error += nb_error + nb_mismatch
-            self.eload_cfg.set('validation', 'assembly_check', 'files', vcf_name, value={
+            file_results = {
                 'error_list': error_list, 'mismatch_list': mismatch_list, 'nb_mismatch': nb_mismatch,
                 'nb_error': nb_error, 'ref_match': match,
                 'nb_variant': total, 'assembly_check_log': assembly_check_log,
                 'assembly_check_valid_vcf': assembly_check_valid_vcf,
-                'assembly_check_text_report': assembly_check_text_report
-            })
+                'assembly_check_text_report': assembly_check_text_report,
+                'fingerprint': fingerprint
+            }
+            # Number of contigs with mismatches, mismatches of the most affected contigs and match rate histogram
+            file_results.update(mismatch_statistics)
+            self.eload_cfg.set('validation', 'assembly_check', 'files', vcf_name, value=file_results)
         self.eload_cfg.set('validation', 'assembly_check', 'pass', value=total_error == 0)
 
     def _metadata_check_report(self):
         reports = []
 
         results = self.eload_cfg.query('validation', 'metadata_check', ret_default={})
+        if 'error_summary' in results:
+            error_list = [format_error_summary(summary) for summary in results['error_summary']]
+            nb_error = results.get('nb_error')
+        else:
+            # Configs written before the errors were summarised store all the error messages
+            error_list = results.get('errors', [])
+            nb_error = len(error_list)
         report_data = {
             'metadata_spreadsheet': results.get('metadata_spreadsheet'),
             'pass': 'PASS' if results.get('pass') else 'FAIL',
-            'nb_error': len(results.get('errors', [])),
-            'error_list': '\n'.join(results.get('errors', []))
+            'nb_error': nb_error,
+            'error_list': '\n'.join(error_list)
         }
-        reports.append("""  * {metadata_spreadsheet}: {pass}
+        report = """  * {metadata_spreadsheet}: {pass}
     - number of error: {nb_error}
     - error messages: {error_list}
-""".format(**report_data))
+""".format(**report_data)
+        if results.get('error_file'):
+            report += '    - see report for detail: {}\n'.format(results['error_file'])
+        reports.append(report)
         return '\n'.join(reports)
 
     def _vcf_check_report(self):
@@ -265,12 +595,17 @@ class EloadValidation(Eload):
                 '10_error_list': '\n'.join(results['error_list'])
             }
             report_data.update(results)
-            reports.append("""  * {vcf_file}: {pass}
+            report = """  * {vcf_file}: {pass}
     - number of error: {nb_error}
     - number of warning: {nb_warning}
     - first 10 errors: {10_error_list}
     - see report for detail: {vcf_check_text_report}
-""".format(**report_data))
+""".format(**report_data)
+            if results.get('error_categories'):
+                report += '    - errors per category: {}\n'.format(', '.join(
+                    '{category} ({severity}): {count}'.format(**category) for category in results['error_categories']
+                ))
+            reports.append(report)
         return '\n'.join(reports)
 
     def _assembly_check_report(self):
@@ -285,13 +620,20 @@ class EloadValidation(Eload):
                 'perc': results.get('ref_match') / (results.get('nb_variant') or 1)
             }
             report_data.update(results)
-            reports.append("""  * {vcf_file}: {pass}
+            report = """  * {vcf_file}: {pass}
     - number of error: {nb_error}
     - match results: {ref_match}/{nb_variant} ({perc:.1%})
     - first 10 errors: {10_error_list}
     - first 10 mismatches: {10_mismatch_list}
     - see report for detail: {assembly_check_text_report}
-""".format(**report_data))
+""".format(**report_data)
+            if results.get('mismatches_per_contig'):
+                report += '    - contigs with mismatches: {} (most affected: {})\n'.format(
+                    results['nb_contig_with_mismatch'],
+                    ', '.join('{}: {}'.format(contig, nb_mismatch) for contig, nb_mismatch in sorted(
+                        results['mismatches_per_contig'].items(), key=lambda item: -item[1])[:5])
+                )
+            reports.append(report)
         return '\n'.join(reports)
 
     def _sample_check_report(self):
@@ -0,0 +1,94 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fingerprints of the inputs of a validation task: the size, modification time and md5 of each input file and the
+version of each tool. They are stored with the results of the task so that it is only run again when its inputs change.
+"""
+
+import hashlib
+import os
+import subprocess
+import threading
+
+from ebi_eva_common_pyutils.logger import logging_config as log_cfg
+
+logger = log_cfg.get_logger(__name__)
+
+
+def md5_of_file(file_path):
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as open_file:
+        for chunk in iter(lambda: open_file.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def file_fingerprint(file_path, previous=None):
+    """
+    :param file_path: path of the input file
+    :param previous: previous fingerprint of the same file. Its md5 is reused if the size and modification time have
+    not changed.
+    :return: dict with the size, modification time in nanoseconds and md5 of the file or None if it does not exist
+    """
+    if not file_path or not os.path.isfile(file_path):
+        return None
+    st = os.stat(file_path)
+    if previous and previous.get('size') == st.st_size and previous.get('mtime') == st.st_mtime_ns:
+        md5 = previous['md5']
+    else:
+        md5 = md5_of_file(file_path)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns, 'md5': md5}
+
+
+# Versions of the tools, keyed by executable, computed once per process
+_tool_versions = {}
+_tool_versions_lock = threading.Lock()
+
+
+def tool_version(executable):
+    """:return: the first line printed by the executable called with --version or None if it cannot be run"""
+    with _tool_versions_lock:
+        if executable not in _tool_versions:
+            version = None
+            try:
+                process = subprocess.run(
+                    [executable, '--version'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60
+                )
+                lines = process.stdout.decode(errors='replace').strip().splitlines()
+                if lines:
+                    version = lines[0]
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.warning('Could not get the version of %s: %s', executable, e)
+            _tool_versions[executable] = version
+        return _tool_versions[executable]
+
+
+def same_inputs(previous_fingerprint, fingerprint):
+    """
+    Compare two fingerprints on the content of the files and on the versions of the tools, ignoring the modification
+    times so that a file touched without being changed is not considered different.
+    """
+    if not previous_fingerprint:
+        return False
+    if previous_fingerprint.get('tools') != fingerprint.get('tools'):
+        return False
+    previous_files = previous_fingerprint.get('files') or {}
+    files = fingerprint.get('files') or {}
+    if set(previous_files) != set(files):
+        return False
+    return all(
+        (previous_files[name] or {}).get('md5') == (files[name] or {}).get('md5') and files[name] is not None
+        for name in files
+    )
@@ -0,0 +1,180 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module stores the results of the remote lookups (NCBI, Ensembl, ENA) in a SQLite database shared by all the
+processes using the same configuration, so that the same lookup is not sent again before it expires.
+Lookups that found nothing (empty result or client error) are also stored but expire sooner.
+The cache is only active when "lookup_cache" > "path" is set in the submission configuration. The time to live of the
+entries can be set in days, per source in "lookup_cache" > "ttl_days" and for the lookups that found nothing in
+"lookup_cache" > "negative_ttl_days".
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from ebi_eva_common_pyutils.config import cfg
+from ebi_eva_common_pyutils.logger import AppLogger
+from requests import HTTPError
+
+NCBI = 'ncbi'
+ENSEMBL = 'ensembl'
+ENA = 'ena'
+
+# Time to live in days of the results and of the lookups that found nothing
+DEFAULT_TTL_DAYS = {NCBI: 30, ENSEMBL: 90, ENA: 7}
+DEFAULT_NEGATIVE_TTL_DAYS = 1
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+class LookupCache(AppLogger):
+    """
+    SQLite cache of the lookups sent to remote services, keyed by source and by the arguments of the lookup.
+    It keeps, for the current process, the number of hits and misses of each source.
+    """
+
+    def __init__(self, db_path, ttl_days=None, negative_ttl_days=None):
+        self.db_path = db_path
+        self.ttl_days = dict(DEFAULT_TTL_DAYS, **(ttl_days or {}))
+        self.negative_ttl_days = negative_ttl_days or DEFAULT_NEGATIVE_TTL_DAYS
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._counter_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS lookup ('
+                'source TEXT NOT NULL, lookup_key TEXT NOT NULL, found INTEGER NOT NULL, result TEXT, '
+                'created REAL NOT NULL, PRIMARY KEY (source, lookup_key))'
+            )
+
+    @contextmanager
+    def _connect(self):
+        # One connection per operation so the cache can be used from several threads
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _lookup_key(args):
+        return '|'.join(str(arg) for arg in args)
+
+    def _count(self, counter, source):
+        with self._counter_lock:
+            counter[source] += 1
+
+    def _ttl_seconds(self, source, found):
+        if found:
+            return self.ttl_days.get(source, self.negative_ttl_days) * SECONDS_PER_DAY
+        return self.negative_ttl_days * SECONDS_PER_DAY
+
+    def get(self, source, lookup_key):
+        """
+        :return: tuple of whether a valid entry was found, whether the lookup found something and the stored result
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT found, result, created FROM lookup WHERE source=? AND lookup_key=?', (source, lookup_key)
+                ).fetchone()
+        except sqlite3.Error as e:
+            self.warning('Could not read the lookup cache %s: %s', self.db_path, e)
+            return False, None, None
+        if row is None:
+            return False, None, None
+        found, result, created = row
+        if time.time() - created > self._ttl_seconds(source, found):
+            return False, None, None
+        return True, bool(found), json.loads(result)
+
+    def set(self, source, lookup_key, found, result):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO lookup (source, lookup_key, found, result, created) VALUES (?, ?, ?, ?, ?)',
+                    (source, lookup_key, int(found), json.dumps(result), time.time())
+                )
+        except sqlite3.Error as e:
+            self.warning('Could not write in the lookup cache %s: %s', self.db_path, e)
+
+    def lookup(self, source, lookup_function, *args):
+        """
+        Return the cached result of lookup_function(*args) or call it and store its result.
+        Empty results and client errors (HTTP 4xx other than 429) are stored as negative entries. A cached client
+        error is raised again as an HTTPError.
+        """
+        lookup_key = self._lookup_key(args)
+        cached, found, result = self.get(source, lookup_key)
+        if cached:
+            self._count(self.hits, source)
+            self.debug('Lookup cache hit for %s %s', source, lookup_key)
+            if not found and isinstance(result, dict) and 'error' in result:
+                raise HTTPError(result['error'])
+            return result
+
+        self._count(self.misses, source)
+        self.debug('Lookup cache miss for %s %s', source, lookup_key)
+        try:
+            result = lookup_function(*args)
+        except HTTPError as e:
+            status_code = getattr(e.response, 'status_code', None)
+            if status_code and 400 <= status_code < 500 and status_code != 429:
+                self.set(source, lookup_key, False, {'error': str(e)})
+            raise
+        self.set(source, lookup_key, bool(result), result)
+        return result
+
+    def stats(self):
+        """:return: dict of source to the number of hits and misses in this process"""
+        return dict(
+            (source, {'hits': self.hits[source], 'misses': self.misses[source]})
+            for source in sorted(set(self.hits) | set(self.misses))
+        )
+
+
+# LookupCaches shared within the process, keyed by the path of the database
+_lookup_caches = {}
+_lookup_caches_lock = threading.Lock()
+
+
+def get_lookup_cache():
+    """
+    :return: the LookupCache stored in the database set in "lookup_cache" > "path" or None if it is not configured
+    """
+    db_path = cfg.query('lookup_cache', 'path')
+    if not db_path:
+        return None
+    with _lookup_caches_lock:
+        if db_path not in _lookup_caches:
+            _lookup_caches[db_path] = LookupCache(
+                db_path,
+                ttl_days=cfg.query('lookup_cache', 'ttl_days'),
+                negative_ttl_days=cfg.query('lookup_cache', 'negative_ttl_days')
+            )
+        return _lookup_caches[db_path]
+
+
+def cached_lookup(source, lookup_function, *args):
+    """Call lookup_function(*args) through the lookup cache when it is configured"""
+    lookup_cache = get_lookup_cache()
+    if lookup_cache is None:
+        return lookup_function(*args)
+    return lookup_cache.lookup(source, lookup_function, *args)
@@ -0,0 +1,220 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module answers the taxonomy and assembly lookups from an indexed SQLite database built from the NCBI taxonomy dump
+(names.dmp and nodes.dmp) and from the NCBI assembly_summary_genbank.txt file, instead of sending them to NCBI,
+Ensembl or ENA.
+The resolver is only active when "offline_resolver" > "path" is set in the submission configuration. Lookups it cannot
+answer return None so that the callers fall back to the remote services.
+"""
+
+import os
+import sqlite3
+import threading
+
+from ebi_eva_common_pyutils.config import cfg
+from ebi_eva_common_pyutils.logger import AppLogger
+from ebi_eva_common_pyutils.logger import logging_config as log_cfg
+
+logger = log_cfg.get_logger(__name__)
+
+SCIENTIFIC_NAME = 'scientific name'
+GENBANK_COMMON_NAME = 'genbank common name'
+COMMON_NAME = 'common name'
+NAME_CLASSES = (SCIENTIFIC_NAME, GENBANK_COMMON_NAME, COMMON_NAME)
+
+# Columns of assembly_summary_genbank.txt used when the file has no header
+ASSEMBLY_ACCESSION_COLUMN = 'assembly_accession'
+ASSEMBLY_COLUMNS = {ASSEMBLY_ACCESSION_COLUMN: 0, 'taxid': 5, 'asm_name': 15, 'gbrs_paired_asm': 17}
+
+SCHEMA = [
+    'CREATE TABLE taxonomy_node (taxid INTEGER PRIMARY KEY, parent_taxid INTEGER, rank TEXT)',
+    'CREATE TABLE taxonomy_name (taxid INTEGER NOT NULL, name_class TEXT NOT NULL, name TEXT NOT NULL)',
+    'CREATE TABLE assembly (accession TEXT PRIMARY KEY, assembly_name TEXT NOT NULL COLLATE NOCASE, taxid INTEGER, '
+    'refseq_accession TEXT)',
+]
+INDEXES = [
+    'CREATE INDEX taxonomy_name_taxid ON taxonomy_name (taxid, name_class)',
+    'CREATE INDEX assembly_name ON assembly (assembly_name COLLATE NOCASE)',
+    'CREATE INDEX assembly_refseq_accession ON assembly (refseq_accession)',
+]
+
+
+def _dmp_rows(dmp_file):
+    """Iterate over the fields of each line of a NCBI taxonomy dump file, which are separated by tab, pipe, tab"""
+    with open(dmp_file, encoding='utf-8') as open_file:
+        for line in open_file:
+            yield line.rstrip('\n').rstrip('|').rstrip('\t').split('\t|\t')
+
+
+def _taxonomy_nodes(nodes_dmp):
+    for fields in _dmp_rows(nodes_dmp):
+        yield int(fields[0]), int(fields[1]), fields[2]
+
+
+def _taxonomy_names(names_dmp):
+    for fields in _dmp_rows(names_dmp):
+        if fields[3] in NAME_CLASSES:
+            yield int(fields[0]), fields[3], fields[1]
+
+
+def _assemblies(assembly_summary):
+    columns = ASSEMBLY_COLUMNS
+    with open(assembly_summary, encoding='utf-8') as open_file:
+        for line in open_file:
+            if line.startswith('#'):
+                header = line.lstrip('#').strip().split('\t')
+                if ASSEMBLY_ACCESSION_COLUMN in header:
+                    columns = dict((column, header.index(column)) for column in ASSEMBLY_COLUMNS)
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) <= max(columns.values()):
+                continue
+            accession = fields[columns[ASSEMBLY_ACCESSION_COLUMN]]
+            # The RefSeq accession of the equivalent assembly is "na" when there is none
+            refseq_accession = fields[columns['gbrs_paired_asm']]
+            if refseq_accession in ('na', ''):
+                refseq_accession = None
+            yield accession, fields[columns['asm_name']], int(fields[columns['taxid']]), refseq_accession
+
+
+def build_resolver_database(db_path, names_dmp=None, nodes_dmp=None, assembly_summary=None):
+    """
+    Create the resolver database from the NCBI files provided. The database is written next to db_path and moved in
+    place once complete so that processes using the previous version are not disrupted.
+    :param db_path: path of the SQLite database to create
+    :param names_dmp: names.dmp from the NCBI taxonomy dump
+    :param nodes_dmp: nodes.dmp from the NCBI taxonomy dump
+    :param assembly_summary: assembly_summary_genbank.txt from the NCBI genomes FTP
+    """
+    tmp_db_path = db_path + '.tmp'
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+    conn = sqlite3.connect(tmp_db_path)
+    try:
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            if nodes_dmp:
+                conn.executemany('INSERT INTO taxonomy_node VALUES (?, ?, ?)', _taxonomy_nodes(nodes_dmp))
+            if names_dmp:
+                conn.executemany('INSERT INTO taxonomy_name VALUES (?, ?, ?)', _taxonomy_names(names_dmp))
+            if assembly_summary:
+                conn.executemany('INSERT OR REPLACE INTO assembly VALUES (?, ?, ?, ?)', _assemblies(assembly_summary))
+            for statement in INDEXES:
+                conn.execute(statement)
+    finally:
+        conn.close()
+    os.replace(tmp_db_path, db_path)
+
+
+class OfflineResolver(AppLogger):
+    """
+    Read-only access to a database created with build_resolver_database. Each method returns None when the database
+    cannot answer so the caller can use the remote service instead.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # A single connection shared by the threads of the semantic validation
+        self._conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _query(self, query, parameters):
+        try:
+            with self._lock:
+                return self._conn.execute(query, parameters).fetchall()
+        except sqlite3.Error as e:
+            self.warning('Could not query the offline resolver %s: %s', self.db_path, e)
+            return []
+
+    def scientific_and_common_name(self, taxid):
+        """:return: tuple of the scientific name and the common name (which can be None) of the taxonomy or None"""
+        names = {}
+        for name_class, name in self._query(
+                'SELECT name_class, name FROM taxonomy_name WHERE taxid=? ORDER BY rowid', (int(taxid),)):
+            # Keep the first name of each class, in the order of names.dmp
+            names.setdefault(name_class, name)
+        if SCIENTIFIC_NAME not in names:
+            return None
+        return names[SCIENTIFIC_NAME], names.get(GENBANK_COMMON_NAME, names.get(COMMON_NAME))
+
+    def scientific_name(self, taxid):
+        """:return: the scientific name of the taxonomy or None"""
+        names = self.scientific_and_common_name(taxid)
+        if names:
+            return names[0]
+        return None
+
+    def assembly_accessions(self, assembly):
+        """
+        Find the assemblies from their name, their GenBank accession or the RefSeq accession of their equivalent.
+        :return: sorted list of the GenBank accessions of the assemblies found or None if there are none
+        """
+        accessions = self._query(
+            'SELECT accession FROM assembly WHERE assembly_name=? OR accession=? OR refseq_accession=?',
+            (assembly, assembly, assembly)
+        )
+        if not accessions:
+            return None
+        return sorted(accession for accession, in accessions)
+
+    def close(self):
+        self._conn.close()
+
+
+# OfflineResolvers shared within the process, keyed by the path of the database
+_offline_resolvers = {}
+_offline_resolvers_lock = threading.Lock()
+
+
+def get_offline_resolver():
+    """
+    :return: the OfflineResolver of the database set in "offline_resolver" > "path" or None if it is not configured
+    """
+    db_path = cfg.query('offline_resolver', 'path')
+    if not db_path:
+        return None
+    with _offline_resolvers_lock:
+        if db_path not in _offline_resolvers:
+            if not os.path.isfile(db_path):
+                logger.warning('The offline resolver database %s does not exist', db_path)
+                return None
+            _offline_resolvers[db_path] = OfflineResolver(db_path)
+        return _offline_resolvers[db_path]
+
+
+def offline_scientific_name(taxid):
+    """:return: the scientific name of the taxonomy found in the offline resolver or None"""
+    resolver = get_offline_resolver()
+    if resolver is None:
+        return None
+    return resolver.scientific_name(taxid)
+
+
+def offline_scientific_and_common_name(taxid):
+    """:return: the scientific and common names of the taxonomy found in the offline resolver or None"""
+    resolver = get_offline_resolver()
+    if resolver is None:
+        return None
+    return resolver.scientific_and_common_name(taxid)
+
+
+def offline_assembly_accessions(assembly):
+    """:return: the GenBank accessions of the assemblies with that name or accession in the offline resolver or None"""
+    resolver = get_offline_resolver()
+    if resolver is None:
+        return None
+    return resolver.assembly_accessions(assembly)
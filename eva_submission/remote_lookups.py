@@ -0,0 +1,71 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lookups of the assemblies in NCBI and of the taxonomies in Ensembl used by the semantic validation. They follow the ones
+of ebi_eva_common_pyutils, including their retries, but set a timeout on each request, so that a service that does not
+answer cannot hold the validation, or the threads running the lookups, indefinitely.
+"""
+
+import requests
+from ebi_eva_common_pyutils.logger import logging_config as log_cfg
+from retry import retry
+
+logger = log_cfg.get_logger(__name__)
+
+NCBI_ESEARCH_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'
+NCBI_ESUMMARY_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi'
+ENSEMBL_TAXONOMY_URL = 'https://rest.ensembl.org/taxonomy/id/{0}?content-type=application/json'
+
+# Time in seconds to wait for the connection to the service and for each read of its response
+DEFAULT_REQUEST_TIMEOUT = 30
+
+
+@retry(exceptions=(ConnectionError, requests.RequestException), logger=logger,
+       tries=4, delay=2, backoff=1.2, jitter=(1, 3))
+def _json_request(url, params=None, timeout=DEFAULT_REQUEST_TIMEOUT):
+    response = requests.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def retrieve_genbank_assembly_accessions_from_ncbi(assembly_txt, timeout=DEFAULT_REQUEST_TIMEOUT):
+    """
+    Find the GenBank accessions of the assemblies matching a free text search in NCBI.
+    :return: list of the accessions found
+    """
+    assembly_accessions = set()
+    payload = {'db': 'Assembly', 'term': '"{}"'.format(assembly_txt), 'retmode': 'JSON'}
+    data = _json_request(NCBI_ESEARCH_URL, payload, timeout)
+    if data and data.get('esearchresult', {}).get('idlist'):
+        assembly_id_list = data.get('esearchresult').get('idlist')
+        payload = {'db': 'Assembly', 'id': ','.join(assembly_id_list), 'retmode': 'JSON'}
+        summary_list = _json_request(NCBI_ESUMMARY_URL, payload, timeout)
+        for assembly_id in summary_list.get('result', {}).get('uids', []):
+            assembly_info = summary_list.get('result').get(assembly_id)
+            if 'genbank' in assembly_info['synonym']:
+                assembly_accessions.add(assembly_info['synonym']['genbank'])
+    if len(assembly_accessions) != 1:
+        logger.warning('%s Genbank synonyms found for assembly %s ', len(assembly_accessions), assembly_txt)
+    return list(assembly_accessions)
+
+
+def get_scientific_name_from_ensembl(taxonomy_id, timeout=DEFAULT_REQUEST_TIMEOUT):
+    """:return: the scientific name of the taxonomy in Ensembl"""
+    url = ENSEMBL_TAXONOMY_URL.format(taxonomy_id)
+    response = _json_request(url, timeout=timeout)
+    if 'scientific_name' not in response:
+        raise ValueError('Scientific name could not be found for taxonomy {0} using the Ensembl API URL: {1}'.format(
+            taxonomy_id, url))
+    return response['scientific_name']
@@ -1,22 +1,69 @@
+import hashlib
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import pysam
+from ebi_eva_common_pyutils.config import cfg
 from ebi_eva_common_pyutils.logger import logging_config as log_cfg
 
 from eva_submission.eload_utils import cast_list
-from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxWriter, EvaXlsxReader
+from eva_submission.vcf_utils import get_samples_from_header, read_chrom_line, read_vcf_header
+from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxWriter, get_eva_xlsx_reader
 
 logger = log_cfg.get_logger(__name__)
 
+# Number of VCF headers read at the same time
+DEFAULT_NB_HEADER_READERS = 8
+
 
 def get_samples_from_vcf(vcf_file):
     """
-    Get the list of samples present in a single VCF file
+    Get the list of samples present in a single VCF file. Only the header is read.
+    """
+    return get_samples_from_header(read_vcf_header(vcf_file))
+
+
+def _timed_get_sample_line_md5(vcf_file):
+    start = time.perf_counter()
+    chrom_line = read_chrom_line(vcf_file)
+    if chrom_line is None:
+        raise ValueError('No #CHROM line found in the header of %s' % vcf_file)
+    logger.debug('Read the #CHROM line of %s in %.3fs', vcf_file, time.perf_counter() - start)
+    return hashlib.md5(chrom_line).hexdigest(), chrom_line
+
+
+def _read_headers(read_function, vcf_files, nb_readers=None):
+    """
+    Apply the read function to each VCF file, concurrently in a bounded number of threads set in "sample_check" >
+    "nb_header_readers" in the submission configuration.
+    :return: list of the results in the order of vcf_files
+    """
+    if nb_readers is None:
+        nb_readers = cfg.query('sample_check', 'nb_header_readers', ret_default=DEFAULT_NB_HEADER_READERS)
+    start = time.perf_counter()
+    if nb_readers > 1 and len(vcf_files) > 1:
+        with ThreadPoolExecutor(max_workers=min(nb_readers, len(vcf_files))) as executor:
+            results = list(executor.map(read_function, vcf_files))
+    else:
+        results = [read_function(vcf_file) for vcf_file in vcf_files]
+    logger.info('Read the header of %s VCF file(s) in %.3fs', len(vcf_files), time.perf_counter() - start)
+    return results
+
+
+def group_vcf_files_by_samples(vcf_files, nb_readers=None):
+    """
+    Group the VCF files sharing the same #CHROM line, such as the files of a VCF split per chromosome. Only the #CHROM
+    line of each file is read and the samples are only extracted once per distinct line.
+    :return: list of tuples with the samples and the files sharing them, in the order the files are first found
     """
-    with pysam.VariantFile(vcf_file, 'r') as vcf_in:
-        samples = list(vcf_in.header.samples)
-    return samples
+    groups = {}
+    for vcf_file, (sample_line_md5, chrom_line) in zip(
+            vcf_files, _read_headers(_timed_get_sample_line_md5, vcf_files, nb_readers)):
+        if sample_line_md5 not in groups:
+            groups[sample_line_md5] = (get_samples_from_header([chrom_line.decode(errors='replace')]), [])
+        groups[sample_line_md5][1].append(vcf_file)
+    return list(groups.values())
 
 
 def get_sample_names(sample_rows):
@@ -42,10 +89,15 @@ def compare_names_in_files_and_samples(files, sample_rows, analysis_alias):
     """
     has_difference = False
     sample_names_in_vcf = set()
-    for file_path in files:
-        # remove trailing spaces coming from the spreadsheet
-        file_path = file_path.strip()
-        sample_names_in_vcf.update(get_samples_from_vcf(file_path))
+    # remove trailing spaces coming from the spreadsheet
+    samples_and_files = group_vcf_files_by_samples([file_path.strip() for file_path in files])
+    for samples, _ in samples_and_files:
+        sample_names_in_vcf.update(samples)
+    if len(samples_and_files) > 1:
+        logger.warning('For analysis %s the VCF files have %s different sets of samples:', analysis_alias,
+                       len(samples_and_files))
+        for samples, vcf_files in samples_and_files:
+            logger.warning('%s sample(s) in %s', len(samples), ', '.join(os.path.basename(f) for f in vcf_files))
 
     sample_name_in_spreadsheet = get_sample_names(sample_rows)
     diff_submission_submitted_file = list(set(sample_name_in_spreadsheet) -
@@ -83,7 +135,7 @@ def compare_spreadsheet_and_vcf(eva_files_sheet, vcf_dir, expected_vcf_files=Non
     """
     Take a spreadsheet following EVA standard and compare the samples in it to the ones found in the VCF files
     """
-    eva_xls_reader = EvaXlsxReader(eva_files_sheet)
+    eva_xls_reader = get_eva_xlsx_reader(eva_files_sheet)
     vcf_files = [row['File Name'] for row in eva_xls_reader.files]
     if expected_vcf_files:
         expected_vcf_files = [os.path.basename(vcf_file) for vcf_file in expected_vcf_files]
@@ -103,7 +155,7 @@ def compare_spreadsheet_and_vcf(eva_files_sheet, vcf_dir, expected_vcf_files=Non
                 } for vcf_file in expected_vcf_files
             ])
             eva_xls_writer.save()
-            eva_xls_reader = EvaXlsxReader(eva_files_sheet)
+            eva_xls_reader = get_eva_xlsx_reader(eva_files_sheet)
 
     samples_per_analysis = eva_xls_reader.samples_per_analysis
     files_per_analysis = eva_xls_reader.files_per_analysis
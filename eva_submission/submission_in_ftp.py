@@ -111,14 +111,14 @@ class FtpDepositBox(AppLogger):
             ]) or 'NA'
         }
         try:
-            reader = EvaXlsxReader(metadata_file)
-            report_params['project_title'] = reader.project_title
-            report_params['number_analysis'] = len(reader.analysis)
-            if reader.references:
-                report_params['reference genome'] = ', '.join(reader.references)
+            summary = EvaXlsxReader(metadata_file).peek()
+            report_params['project_title'] = summary['project_title']
+            report_params['number_analysis'] = summary['row_counts']['Analysis']
+            if summary['references']:
+                report_params['reference genome'] = ', '.join(summary['references'])
             else:
                 report_params['reference genome'] = 'None'
-            report_params['number_samples'] = len(reader.samples)
+            report_params['number_samples'] = summary['row_counts']['Sample']
         except Exception:
             self.error(traceback.format_exc())
             report_params['project_title'] = 'NA'
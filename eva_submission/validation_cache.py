@@ -0,0 +1,112 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module stores the outputs of vcf_validator and vcf_assembly_checker in a directory shared by all the ELOADs.
+Each entry is addressed by the content of the inputs of the check (md5 of the VCF, of the reference FASTA and of the
+assembly report) and by the version of the tools, so that a file already checked in another ELOAD is not checked again.
+The cache is only active when "validation_cache_dir" is set in the submission configuration.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from ebi_eva_common_pyutils.config import cfg
+from ebi_eva_common_pyutils.logger import AppLogger
+
+# Outputs stored for each validation task
+VALIDATION_OUTPUTS = {
+    'vcf_check': ['log', 'text_report', 'db_report'],
+    'assembly_check': ['log', 'valid_vcf', 'text_report'],
+}
+
+
+def fingerprint_key(validation_task, fingerprint):
+    """
+    Compute the address of the results of a validation task from the fingerprint of its inputs (see input_fingerprint)
+    :return: the key or None if one of the files or tool versions is unknown
+    """
+    files = list((fingerprint.get('files') or {}).values())
+    tools = sorted((fingerprint.get('tools') or {}).items())
+    if any(file_fingerprint is None for file_fingerprint in files) or any(version is None for _, version in tools):
+        return None
+    # The paths are left out of the key since the same file can be submitted in different ELOADs
+    content = json.dumps([validation_task, [file_fingerprint['md5'] for file_fingerprint in files], tools])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ValidationCache(AppLogger):
+    """Directory of the outputs of the validation tasks, with one sub-directory per task and key"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _entry_dir(self, validation_task, key):
+        return os.path.join(self.cache_dir, validation_task, key[:2], key)
+
+    def get(self, validation_task, key):
+        """:return: dict of the name of each output to its path in the cache or None if the entry is not complete"""
+        entry_dir = self._entry_dir(validation_task, key)
+        outputs = dict((name, os.path.join(entry_dir, name)) for name in VALIDATION_OUTPUTS[validation_task])
+        if not all(os.path.isfile(path) for path in outputs.values()):
+            return None
+        return outputs
+
+    def put(self, validation_task, key, outputs):
+        """
+        Copy the outputs of a validation task in the cache. The entry is written in a temporary directory and renamed
+        so that it is never read while incomplete.
+        :param outputs: dict of the name of each output to the path of the file to store
+        """
+        entry_dir = self._entry_dir(validation_task, key)
+        if os.path.isdir(entry_dir):
+            return
+        tmp_dir = None
+        try:
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+            for name in VALIDATION_OUTPUTS[validation_task]:
+                shutil.copyfile(outputs[name], os.path.join(tmp_dir, name))
+            os.rename(tmp_dir, entry_dir)
+        except OSError as e:
+            # Another process stored the same entry or the cache cannot be written
+            self.warning('Could not store the %s results in the validation cache %s: %s', validation_task,
+                         self.cache_dir, e)
+            if tmp_dir and os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def restore(self, validation_task, key, destinations):
+        """
+        Copy the outputs of a validation task from the cache to their destinations.
+        :param destinations: dict of the name of each output to the path where it should be copied
+        :return: True if the entry was found and copied
+        """
+        outputs = self.get(validation_task, key)
+        if outputs is None:
+            return False
+        for name, path in outputs.items():
+            os.makedirs(os.path.dirname(destinations[name]), exist_ok=True)
+            shutil.copyfile(path, destinations[name])
+        return True
+
+
+def get_validation_cache():
+    """:return: the ValidationCache in "validation_cache_dir" or None if it is not configured"""
+    cache_dir = cfg.query('validation_cache_dir')
+    if cache_dir:
+        return ValidationCache(cache_dir)
+    return None
@@ -0,0 +1,230 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fast pre-check of the VCF files run before the validation workflow. The compression, the header and the first records
+of each file are checked, so that broken files are reported without starting Nextflow, vcf_validator and
+vcf_assembly_checker. The sort order and the contigs missing from the assembly report are only reported as warnings
+since the validators check them as well.
+"""
+
+import gzip
+import os
+import zlib
+
+from ebi_eva_common_pyutils.logger import AppLogger
+
+from eva_submission.vcf_utils import compression_type
+# Empty BGZF block written at the end of every complete BGZF file
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+MANDATORY_COLUMNS = ['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO']
+# Number of errors and warnings reported in the results, the others are only counted
+DEFAULT_MAX_ERRORS = 10
+# Number of data lines checked after the header
+DEFAULT_MAX_RECORDS = 1000
+
+# Columns of the NCBI assembly report holding the names a contig can be referred to by:
+# Sequence-Name, Assigned-Molecule, GenBank-Accn, RefSeq-Accn and UCSC-style-name
+ASSEMBLY_REPORT_NAME_COLUMNS = (0, 2, 4, 6, 9)
+
+
+def has_bgzf_eof(vcf_file):
+    """:return: True if the file ends with the BGZF end of file marker"""
+    with open(vcf_file, 'rb') as open_file:
+        open_file.seek(0, os.SEEK_END)
+        if open_file.tell() < len(BGZF_EOF):
+            return False
+        open_file.seek(-len(BGZF_EOF), os.SEEK_END)
+        return open_file.read() == BGZF_EOF
+
+
+def contig_names_from_assembly_report(assembly_report):
+    """:return: set of all the names of the contigs in the assembly report"""
+    contig_names = set()
+    with open(assembly_report) as open_file:
+        for line in open_file:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            for index in ASSEMBLY_REPORT_NAME_COLUMNS:
+                if index < len(fields) and fields[index] and fields[index] != 'na':
+                    contig_names.add(fields[index])
+    return contig_names
+
+
+class VcfPrecheck(AppLogger):
+    """
+    Single pass over the header and the first records of a VCF file, plain or compressed, recording its errors,
+    warnings and basic counts. In fail fast mode, the file is not read further after the first error.
+    """
+
+    def __init__(self, vcf_file, contig_names=None, fail_fast=False, max_errors=DEFAULT_MAX_ERRORS,
+                 max_records=DEFAULT_MAX_RECORDS):
+        self.vcf_file = vcf_file
+        self.contig_names = contig_names
+        self.fail_fast = fail_fast
+        self.max_errors = max_errors
+        self.max_records = max_records
+        self.errors = []
+        self.nb_error = 0
+        self.warnings = []
+        self.nb_warning = 0
+        self.complete = False
+        self.compression = None
+        self.nb_sample = None
+        self.nb_variant = 0
+        self.nb_contig = 0
+        self.nb_variant_per_contig = {}
+
+    @property
+    def stop(self):
+        return self.fail_fast and self.nb_error > 0
+
+    def _error(self, message):
+        self.nb_error += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(message)
+
+    def _warning(self, message):
+        self.nb_warning += 1
+        if len(self.warnings) < self.max_errors:
+            self.warnings.append(message)
+
+    def _open(self):
+        self.compression = compression_type(self.vcf_file)
+        if self.compression is None:
+            if self.vcf_file.endswith('.gz'):
+                self._error('The file has a .gz extension but is not compressed')
+            return open(self.vcf_file, 'rb')
+        if self.compression == 'gzip':
+            self._warning('The file is compressed with gzip instead of bgzip')
+        elif not has_bgzf_eof(self.vcf_file):
+            self._warning('The BGZF end of file marker is missing: the file might be truncated')
+        return gzip.open(self.vcf_file, 'rb')
+
+    def _check_header(self, lines):
+        """
+        Read the header lines up to the #CHROM line.
+        :return: the number of columns expected in the data lines and the number of the last line read
+        """
+        line_num = 0
+        for line in lines:
+            line_num += 1
+            line = line.rstrip(b'\r\n')
+            if line_num == 1 and not line.startswith(b'##fileformat=VCF'):
+                self._error('Line 1: the file does not start with ##fileformat=VCF')
+                if self.stop:
+                    return None, line_num
+            if line.startswith(b'##'):
+                continue
+            if line.startswith(b'#'):
+                columns = line.decode(errors='replace').split('\t')
+                if columns[:len(MANDATORY_COLUMNS)] != MANDATORY_COLUMNS or \
+                        (len(columns) > len(MANDATORY_COLUMNS) and columns[len(MANDATORY_COLUMNS)] != 'FORMAT'):
+                    self._error('Line %s: the header line should start with %s followed by FORMAT and the samples' % (
+                        line_num, '\t'.join(MANDATORY_COLUMNS)))
+                self.nb_sample = max(len(columns) - len(MANDATORY_COLUMNS) - 1, 0)
+                return len(columns), line_num
+            self._error('Line %s: the header line starting with #CHROM is missing' % line_num)
+            return None, line_num
+        self._error('The header line starting with #CHROM is missing')
+        return None, line_num
+
+    def _check_records(self, lines, nb_column, line_num):
+        seen_contigs = set()
+        contig = contig_name = previous_position = None
+        for line in lines:
+            if self.max_records is not None and self.nb_variant >= self.max_records:
+                return
+            line_num += 1
+            line = line.rstrip(b'\r\n')
+            if not line:
+                continue
+            self.nb_variant += 1
+            if line.count(b'\t') != nb_column - 1:
+                self._error('Line %s: %s columns expected but %s found' % (line_num, nb_column, line.count(b'\t') + 1))
+                if self.stop:
+                    return
+                continue
+            chrom, pos, _ = line.split(b'\t', 2)
+            if chrom != contig:
+                contig_name = chrom.decode(errors='replace')
+                if chrom in seen_contigs:
+                    self._warning('Line %s: the file is not sorted, contig %s is found in more than one block' % (
+                        line_num, contig_name))
+                else:
+                    seen_contigs.add(chrom)
+                    self.nb_contig += 1
+                    if self.contig_names and contig_name not in self.contig_names:
+                        self._warning("Line %s: contig '%s' not found in assembly report" % (line_num, contig_name))
+                contig = chrom
+                previous_position = None
+            self.nb_variant_per_contig[contig_name] = self.nb_variant_per_contig.get(contig_name, 0) + 1
+            try:
+                position = int(pos)
+            except ValueError:
+                self._error("Line %s: position '%s' is not an integer" % (line_num, pos.decode(errors='replace')))
+                position = None
+            else:
+                if previous_position is not None and position < previous_position:
+                    self._warning('Line %s: the file is not sorted, position %s is after position %s' % (
+                        line_num, position, previous_position))
+                previous_position = position
+            if self.stop:
+                return
+        self.complete = True
+
+    def run(self):
+        """
+        :return: dict with whether the file passed the pre-check, the first errors and warnings and their numbers,
+        whether the whole file was read and the compression, number of samples, variants, contigs and variants per
+        contig found in the part of the file read
+        """
+        try:
+            with self._open() as open_file:
+                if not self.stop:
+                    nb_column, line_num = self._check_header(open_file)
+                    if nb_column and not self.stop:
+                        self._check_records(open_file, nb_column, line_num)
+        except EOFError:
+            self._error('The compressed file is truncated')
+        except (OSError, zlib.error) as e:
+            self._error('The file cannot be read: %s' % e)
+        if self.nb_error:
+            self.error('%s failed the pre-check with %s error(s)', self.vcf_file, self.nb_error)
+        return {
+            'pass': self.nb_error == 0,
+            'errors': self.errors,
+            'nb_error': self.nb_error,
+            'warnings': self.warnings,
+            'nb_warning': self.nb_warning,
+            'complete': self.complete,
+            'compression': self.compression,
+            'nb_sample': self.nb_sample,
+            'nb_variant': self.nb_variant,
+            'nb_contig': self.nb_contig,
+            'nb_variant_per_contig': self.nb_variant_per_contig
+        }
+
+
+def precheck_vcf(vcf_file, contig_names=None, fail_fast=False, max_errors=DEFAULT_MAX_ERRORS,
+                 max_records=DEFAULT_MAX_RECORDS):
+    """
+    Check the compression and the header of the VCF file and the sort order and contigs of its first records.
+    :param contig_names: names of the contigs in the assembly report. The contigs are not checked if not provided.
+    :param fail_fast: stop reading the file at the first error
+    :param max_records: number of records checked or None to check the whole file
+    :return: the results of the pre-check, see VcfPrecheck.run
+    """
+    return VcfPrecheck(vcf_file, contig_names, fail_fast, max_errors, max_records).run()
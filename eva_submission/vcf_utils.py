@@ -0,0 +1,78 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Light weight access to VCF files, plain or compressed with gzip or bgzip. The compression is detected from the first
+bytes of the file and compressed files are decompressed as they are read, so reading the header only costs the few
+blocks that contain it.
+"""
+
+import gzip
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def compression_type(vcf_file):
+    """:return: 'bgzip' or 'gzip' depending on the compression of the file or None if it is not compressed"""
+    with open(vcf_file, 'rb') as open_file:
+        header = open_file.read(16)
+    if not header.startswith(GZIP_MAGIC):
+        return None
+    # BGZF blocks are gzip members with the FEXTRA flag and a 'BC' extra subfield
+    if len(header) == 16 and header[3] & 4 and header[12:14] == b'BC':
+        return 'bgzip'
+    return 'gzip'
+
+
+def open_vcf(vcf_file):
+    """:return: binary file object reading the uncompressed content of the VCF file"""
+    if compression_type(vcf_file):
+        return gzip.open(vcf_file, 'rb')
+    return open(vcf_file, 'rb')
+
+
+def read_chrom_line(vcf_file):
+    """:return: the #CHROM line of the header as bytes without new line or None if the header does not have one"""
+    with open_vcf(vcf_file) as open_file:
+        for line in open_file:
+            if line.startswith(b'#CHROM'):
+                return line.rstrip(b'\r\n')
+            if not line.startswith(b'#'):
+                break
+    return None
+
+
+def read_vcf_header(vcf_file):
+    """
+    Read the header of the VCF file, stopping at the #CHROM line.
+    :return: list of the header lines without new line, the #CHROM line last if it was found
+    """
+    header_lines = []
+    with open_vcf(vcf_file) as open_file:
+        for line in open_file:
+            if not line.startswith(b'#'):
+                break
+            # Invalid UTF-8 bytes, such as latin-1 characters in descriptions, are replaced instead of failing the read
+            header_lines.append(line.rstrip(b'\r\n').decode(errors='replace'))
+            if line.startswith(b'#CHROM'):
+                break
+    return header_lines
+
+
+def get_samples_from_header(header_lines):
+    """:return: list of the samples in the #CHROM line of the header"""
+    if not header_lines or not header_lines[-1].startswith('#CHROM'):
+        raise ValueError('No #CHROM line found in the VCF header')
+    # The samples follow the 8 mandatory columns and the FORMAT column
+    return header_lines[-1].split('\t')[9:]
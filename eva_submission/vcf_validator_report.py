@@ -0,0 +1,128 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reader of the SQLite report written by vcf_validator ("-r database"). The errors and warnings are counted per category
+and a few examples of each are fetched with SQL queries, instead of reading the text report which can reach gigabytes
+for large invalid files.
+The table and columns holding the errors are discovered from the database rather than hard coded, so that the reader
+copes with the layout of the different versions of vcf_validator.
+"""
+
+import sqlite3
+
+from ebi_eva_common_pyutils.logger import logging_config as log_cfg
+
+logger = log_cfg.get_logger(__name__)
+
+# Number of examples reported for each category and number of errors in the error list
+DEFAULT_NB_EXAMPLES = 10
+# vcf_validator stores the severity as the value of its ErrorSeverity enum, in which WARNING comes first
+WARNING_SEVERITIES = (0, '0', 'WARNING', 'warning')
+# Category of the errors when the report does not record their type
+DEFAULT_CATEGORY = 'Error'
+
+
+def _quote(identifier):
+    return '"%s"' % identifier.replace('"', '""')
+
+
+def _table_columns(conn, table):
+    """:return: dict of the lower case name of each column of the table to its name"""
+    return dict((row[1].lower(), row[1]) for row in conn.execute('PRAGMA table_info(%s)' % _quote(table)))
+
+
+def find_error_table(conn):
+    """
+    Find the table storing the errors: a table with a line and a message column, preferably named Error.
+    :return: the name of the table and its columns or None, None if there is no such table
+    """
+    candidates = []
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"):
+        columns = _table_columns(conn, table)
+        if 'line' in columns and 'message' in columns:
+            candidates.append((table.lower() != 'error', table, columns))
+    if not candidates:
+        return None, None
+    _, table, columns = min(candidates)
+    return table, columns
+
+
+def _category(error_type):
+    """:return: the name of the class of the error without its namespace, e.g. BodySectionError"""
+    if not error_type:
+        return DEFAULT_CATEGORY
+    return str(error_type).split('::')[-1]
+
+
+def _is_warning(severity):
+    return severity in WARNING_SEVERITIES
+
+
+def _format_error(line, message):
+    return 'Line %s: %s' % (line, message)
+
+
+def read_vcf_validator_db_report(db_report, nb_examples=DEFAULT_NB_EXAMPLES):
+    """
+    Count the errors and warnings of the report per category and fetch the first examples of each.
+    :return: dict with the number of errors and warnings, the first errors formatted as in the text report and the list
+    of categories with their severity, count and examples, or None if the database cannot be read
+    """
+    try:
+        conn = sqlite3.connect(f'file:{db_report}?mode=ro', uri=True)
+    except sqlite3.Error as e:
+        logger.warning('Cannot open the vcf_validator report %s: %s', db_report, e)
+        return None
+    try:
+        table, columns = find_error_table(conn)
+        if table is None:
+            logger.warning('No table of errors found in the vcf_validator report %s', db_report)
+            return None
+        # The type of error is the discriminator of the polymorphic error table
+        category_column = _quote(columns['typeid']) if 'typeid' in columns else 'NULL'
+        severity_column = _quote(columns['severity']) if 'severity' in columns else 'NULL'
+        line_column, message_column = _quote(columns['line']), _quote(columns['message'])
+
+        results = {'nb_error': 0, 'nb_warning': 0, 'error_list': [], 'categories': []}
+        groups = conn.execute('SELECT %s, %s, COUNT(*) FROM %s GROUP BY 1, 2 ORDER BY MIN(rowid)' % (
+            category_column, severity_column, _quote(table)
+        )).fetchall()
+        for error_type, severity, count in groups:
+            severity_name = 'warning' if _is_warning(severity) else 'error'
+            results['nb_' + severity_name] += count
+            # Rows are scanned in insertion order so the query stops as soon as enough examples are found
+            examples = conn.execute('SELECT %s, %s FROM %s WHERE %s IS ? AND %s IS ? ORDER BY rowid LIMIT ?' % (
+                line_column, message_column, _quote(table), category_column, severity_column
+            ), (error_type, severity, nb_examples)).fetchall()
+            results['categories'].append({
+                'category': _category(error_type), 'severity': severity_name, 'count': count,
+                'examples': [_format_error(line, message) for line, message in examples]
+            })
+
+        if results['nb_error']:
+            cursor = conn.execute('SELECT %s, %s, %s FROM %s ORDER BY rowid' % (
+                line_column, message_column, severity_column, _quote(table)
+            ))
+            for line, message, severity in cursor:
+                if not _is_warning(severity):
+                    results['error_list'].append(_format_error(line, message))
+                    if len(results['error_list']) == nb_examples:
+                        break
+        return results
+    except sqlite3.Error as e:
+        logger.warning('Cannot read the vcf_validator report %s: %s', db_report, e)
+        return None
+    finally:
+        conn.close()
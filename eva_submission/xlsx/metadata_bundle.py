@@ -0,0 +1,160 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module reads and writes metadata bundles: an alternative to the metadata spreadsheet that is much faster to parse.
+A bundle follows the worksheets and headers defined in eva_project_conf.yaml and is either:
+- a JSON document (".json") containing an object that maps each worksheet name to the list of its rows. Each row is an
+  object keyed by header and can provide its position in the original spreadsheet in "row_num".
+- a directory containing one TSV file per worksheet, named after the worksheet (e.g. "Submitter Details.tsv"), whose
+  first line contains the headers.
+Dates are stored as ISO 8601 strings. Values from the bundle are converted to the types expected by the validation
+(eva_project_validation.yaml) when they are provided as strings.
+"""
+
+import csv
+import datetime
+import json
+import os
+
+from openpyxl import Workbook
+from openpyxl.utils.datetime import from_ISO8601
+
+JSON_EXTENSION = '.json'
+TSV_EXTENSION = '.tsv'
+
+
+def is_metadata_bundle(metadata_file):
+    """:return: True if the path is a JSON metadata bundle or a directory of TSV files"""
+    return metadata_file.endswith(JSON_EXTENSION) or os.path.isdir(metadata_file)
+
+
+def metadata_files(metadata_file):
+    """:return: the list of files holding the metadata: the TSV files of a bundle directory or the file itself"""
+    if os.path.isdir(metadata_file):
+        return sorted(
+            os.path.join(metadata_file, file_name) for file_name in os.listdir(metadata_file)
+            if file_name.endswith(TSV_EXTENSION)
+        )
+    return [metadata_file]
+
+
+def field_types(validation_conf):
+    """
+    Extract the types of the fields from the cerberus validation schema
+    :return: dict of worksheet name to dict of field name to cerberus type
+    :rtype: dict
+    """
+    types = {}
+    for worksheet, worksheet_schema in validation_conf.items():
+        row_schema = worksheet_schema.get('schema', {}).get('schema', {})
+        types[worksheet] = dict(
+            (field, field_schema['type']) for field, field_schema in row_schema.items() if 'type' in field_schema
+        )
+    return types
+
+
+def convert_value(value, value_type):
+    """Convert a string from the bundle to an integer or a date. The value is returned as is if it cannot be converted."""
+    if not isinstance(value, str):
+        return value
+    try:
+        if value_type == 'integer':
+            return int(value)
+        if value_type in ('date', 'datetime'):
+            return from_ISO8601(value)
+    except ValueError:
+        pass
+    return value
+
+
+def _serialise_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def read_metadata_bundle(bundle_path):
+    """
+    Read the rows of each worksheet of a bundle without any conversion.
+    :return: dict of worksheet name to list of rows, each row being a dict of header to value
+    :rtype: dict
+    """
+    if os.path.isdir(bundle_path):
+        worksheets = {}
+        for tsv_file in metadata_files(bundle_path):
+            worksheet = os.path.basename(tsv_file)[:-len(TSV_EXTENSION)]
+            with open(tsv_file, newline='') as open_file:
+                worksheets[worksheet] = [
+                    dict((header.strip(), value if value != '' else None) for header, value in row.items() if header)
+                    for row in csv.DictReader(open_file, delimiter='\t')
+                ]
+        return worksheets
+
+    with open(bundle_path) as open_file:
+        worksheets = json.load(open_file)
+    if not isinstance(worksheets, dict) or not all(isinstance(rows, list) for rows in worksheets.values()):
+        raise ValueError('Metadata bundle ' + bundle_path + ' must map each worksheet to a list of rows')
+    return worksheets
+
+
+def write_metadata_bundle(bundle_path, worksheets, conf):
+    """
+    Write the rows of each worksheet in a bundle. A directory of TSV files is created unless the path ends with ".json".
+    :param worksheets: dict of worksheet name to list of rows
+    :param conf: content of eva_project_conf.yaml, used to order the headers of the TSV files
+    """
+    if bundle_path.endswith(JSON_EXTENSION):
+        with open(bundle_path, 'w') as open_file:
+            json.dump(
+                dict(
+                    (worksheet, [dict((key, _serialise_value(value)) for key, value in row.items()) for row in rows])
+                    for worksheet, rows in worksheets.items()
+                ),
+                open_file, indent=2
+            )
+        return
+
+    os.makedirs(bundle_path, exist_ok=True)
+    for worksheet, rows in worksheets.items():
+        headers = conf[worksheet].get('required', []) + conf[worksheet].get('optional', [])
+        with open(os.path.join(bundle_path, worksheet + TSV_EXTENSION), 'w', newline='') as open_file:
+            writer = csv.writer(open_file, delimiter='\t')
+            writer.writerow(headers)
+            for row in rows:
+                writer.writerow([
+                    '' if row.get(header) is None else _serialise_value(row.get(header)) for header in headers
+                ])
+
+
+def write_metadata_spreadsheet(metadata_file, worksheets, conf):
+    """
+    Write the rows of each worksheet in a new spreadsheet, placing the headers on the row configured for the worksheet.
+    :param worksheets: dict of worksheet name to list of rows
+    :param conf: content of eva_project_conf.yaml
+    """
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for worksheet in conf['worksheets']:
+        if worksheet not in worksheets:
+            continue
+        sheet = workbook.create_sheet(worksheet)
+        headers = conf[worksheet].get('required', []) + conf[worksheet].get('optional', [])
+        header_row = conf[worksheet].get('header_row', 1)
+        for column, header in enumerate(headers, start=1):
+            sheet.cell(row=header_row, column=column, value=header)
+        for row_num, row in enumerate(worksheets[worksheet], start=header_row + 1):
+            for column, header in enumerate(headers, start=1):
+                sheet.cell(row=row_num, column=column, value=row.get(header))
+    workbook.save(metadata_file)
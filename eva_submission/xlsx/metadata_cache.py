@@ -0,0 +1,121 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module stores the worksheets parsed from a metadata spreadsheet on disk so that the same spreadsheet does not have
+to be parsed again by each process that needs it.
+Each entry is keyed by the fingerprint of the spreadsheet (path, size, modification time and md5 of the content) so
+any change to the file makes the entry stale.
+The cache is only active when "metadata_cache_dir" is set in the submission configuration.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from ebi_eva_common_pyutils.config import cfg
+from ebi_eva_common_pyutils.logger import AppLogger
+
+
+def spreadsheet_fingerprint(metadata_file):
+    """
+    Compute the fingerprint of a spreadsheet
+    :return: tuple of absolute path, size, modification time in nanoseconds and md5 of the content
+    :rtype: tuple
+    """
+    path = os.path.abspath(metadata_file)
+    st = os.stat(path)
+    md5 = hashlib.md5()
+    with open(path, 'rb') as open_file:
+        for chunk in iter(lambda: open_file.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return path, st.st_size, st.st_mtime_ns, md5.hexdigest()
+
+
+class MetadataCache(AppLogger):
+    """
+    Cache of the valid worksheet names and of the parsed rows of each worksheet. The worksheet names are stored in one
+    pickle file per spreadsheet and the rows in one pickle file per worksheet, so that storing a worksheet does not
+    rewrite the ones already stored.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path_hash(self, metadata_file):
+        return hashlib.sha1(os.path.abspath(metadata_file).encode()).hexdigest()
+
+    def _entry_path(self, metadata_file, worksheet=None):
+        if worksheet is None:
+            return os.path.join(self.cache_dir, self._path_hash(metadata_file) + '.pickle')
+        worksheet_hash = hashlib.sha1(worksheet.encode()).hexdigest()
+        return os.path.join(self.cache_dir, self._path_hash(metadata_file) + '.' + worksheet_hash + '.pickle')
+
+    def load(self, metadata_file, fingerprint, worksheet=None):
+        """
+        Retrieve the cached content of a spreadsheet or of one of its worksheets.
+        :return: dict with the "worksheets" list, or with the "rows" of the worksheet when one is provided, or None if
+                 there is no valid entry
+        :rtype: dict
+        """
+        entry_path = self._entry_path(metadata_file, worksheet)
+        if not os.path.isfile(entry_path):
+            return None
+        try:
+            with open(entry_path, 'rb') as open_file:
+                entry = pickle.load(open_file)
+        except Exception:
+            self.warning('Could not read cache entry %s for %s', entry_path, metadata_file)
+            return None
+        if entry.get('fingerprint') != fingerprint:
+            self.debug('Cache entry for %s is stale', metadata_file)
+            return None
+        return entry
+
+    def save(self, metadata_file, entry, worksheet=None):
+        """
+        Store the content of a spreadsheet or of one of its worksheets. The entry must contain the fingerprint of the
+        spreadsheet it was read from.
+        The file is written in a temporary file first so that concurrent readers never see a partial entry.
+        """
+        entry_path = self._entry_path(metadata_file, worksheet)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as open_file:
+                pickle.dump(entry, open_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except Exception:
+            self.warning('Could not write cache entry %s for %s', entry_path, metadata_file)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def invalidate(self, metadata_file):
+        path_hash = self._path_hash(metadata_file)
+        for entry_name in os.listdir(self.cache_dir):
+            # The entry of the spreadsheet and the ones of its worksheets
+            if entry_name.startswith(path_hash + '.') and entry_name.endswith('.pickle'):
+                self.debug('Remove cache entry %s for %s', entry_name, metadata_file)
+                os.remove(os.path.join(self.cache_dir, entry_name))
+
+
+def get_metadata_cache():
+    """
+    :return: the MetadataCache located in the directory set in "metadata_cache_dir" or None if it is not configured
+    """
+    cache_dir = cfg.query('metadata_cache_dir')
+    if cache_dir:
+        return MetadataCache(cache_dir)
+    return None
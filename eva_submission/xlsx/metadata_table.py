@@ -0,0 +1,89 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Columnar view of the rows of a worksheet. Each column is extracted once as a list and the checks applied to whole
+columns (required groups of fields, sets of values, grouping by value) run in map/zip loops instead of per row dict
+lookups.
+"""
+
+from itertools import compress
+from operator import itemgetter, not_
+
+
+class MetadataTable:
+    """
+    Columns of the rows of a worksheet as returned by EvaXlsxReader, including the row_num column.
+    Columns are extracted from the rows the first time they are used, so the rows should not be modified while the
+    table is in use.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, header):
+        """:return: list of the values of the header in each row, None where the row does not have the header"""
+        if header not in self._columns:
+            try:
+                self._columns[header] = list(map(itemgetter(header), self.rows))
+            except KeyError:
+                self._columns[header] = [row.get(header) for row in self.rows]
+        return self._columns[header]
+
+    @property
+    def row_nums(self):
+        return self.column('row_num')
+
+    def distinct(self, header):
+        """:return: set of the values of the header"""
+        return set(self.column(header))
+
+    def all_filled(self, headers):
+        """:return: list of booleans stating for each row whether all the headers have a value"""
+        if not headers:
+            return [True] * len(self)
+        return list(map(all, zip(*[self.column(header) for header in headers])))
+
+    def rows_missing_groups(self, *groups):
+        """
+        :param groups: lists of headers
+        :return: indexes of the rows where none of the groups of headers have all their values filled
+        """
+        if not groups:
+            return []
+        filled = map(any, zip(*[self.all_filled(group) for group in groups]))
+        return list(compress(range(len(self)), map(not_, filled)))
+
+    @staticmethod
+    def _group(values, items):
+        groups = {}
+        for value, item in zip(values, items):
+            group = groups.get(value)
+            if group is None:
+                groups[value] = [item]
+            else:
+                group.append(item)
+        return groups
+
+    def group_by(self, header):
+        """:return: dict of each value of the header to the indexes of the rows with that value, in the rows order"""
+        return self._group(self.column(header), range(len(self)))
+
+    def group_rows_by(self, header):
+        """:return: dict of each value of the header to the rows with that value, in the rows order"""
+        return self._group(self.column(header), self.rows)
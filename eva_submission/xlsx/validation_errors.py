@@ -0,0 +1,101 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Structured records of the errors found by the metadata validation. The records are summarised per sheet, field and rule
+so that only the summary needs to be stored in the ELOAD config, while the records are written to a TSV file.
+"""
+
+import csv
+from collections import namedtuple
+
+# Number of rows given as example in the summary of each type of error
+DEFAULT_NB_EXAMPLE_ROWS = 5
+
+ValidationErrorRecord = namedtuple('ValidationErrorRecord', ['sheet', 'row', 'field', 'rule', 'message'])
+ValidationErrorRecord.__new__.__defaults__ = (None,) * len(ValidationErrorRecord._fields)
+
+ERROR_RECORD_HEADERS = list(ValidationErrorRecord._fields)
+
+
+def row_ranges(rows):
+    """
+    :param rows: sorted row numbers
+    :return: the rows as a string of comma separated ranges such as '4-8,10'
+    """
+    ranges = []
+    for row in rows:
+        if ranges and row <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(row, ranges[-1][1])
+        else:
+            ranges.append([row, row])
+    return ','.join(str(start) if start == end else '%s-%s' % (start, end) for start, end in ranges)
+
+
+def _summary_key(record):
+    # Errors attached to rows are grouped per field and rule while the others are only grouped with identical errors
+    if record.row is None:
+        return record.sheet, record.field, record.rule, record.message
+    return record.sheet, record.field, record.rule, None
+
+
+def summarise_errors(records, nb_example_rows=DEFAULT_NB_EXAMPLE_ROWS):
+    """
+    Aggregate the records per sheet, field and rule, in the order they were first found.
+    :return: list of dict with the sheet, field, rule, the first message, the number of errors, the ranges of rows
+    affected and the first rows as examples
+    """
+    summaries = {}
+    rows_per_key = {}
+    for record in records:
+        key = _summary_key(record)
+        if key not in summaries:
+            summaries[key] = {
+                'sheet': record.sheet, 'field': record.field, 'rule': record.rule, 'message': record.message,
+                'nb_error': 0
+            }
+            rows_per_key[key] = []
+        summaries[key]['nb_error'] += 1
+        if record.row is not None:
+            rows_per_key[key].append(record.row)
+    for key, summary in summaries.items():
+        if rows_per_key[key]:
+            rows = sorted(set(rows_per_key[key]))
+            summary['rows'] = row_ranges(rows)
+            summary['example_rows'] = rows[:nb_example_rows]
+    return list(summaries.values())
+
+
+def format_error_summary(summary):
+    """:return: one line describing an error summary created by summarise_errors"""
+    if 'rows' not in summary:
+        description = summary['message']
+    elif summary['field']:
+        description = 'In Sheet %s, field %s: %s' % (summary['sheet'], summary['field'], summary['message'])
+    else:
+        description = 'In Sheet %s: %s' % (summary['sheet'], summary['message'])
+    if summary['nb_error'] > 1 or 'rows' in summary:
+        description += ' (%s error(s)%s)' % (
+            summary['nb_error'], ', rows ' + summary['rows'] if 'rows' in summary else ''
+        )
+    return description
+
+
+def write_error_records(records, output_file):
+    """Write all the records in a TSV file with one record per line"""
+    with open(output_file, 'w', newline='') as open_file:
+        writer = csv.writer(open_file, delimiter='\t')
+        writer.writerow(ERROR_RECORD_HEADERS)
+        for record in records:
+            writer.writerow(['' if value is None else value for value in record])
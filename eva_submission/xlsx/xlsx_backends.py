@@ -0,0 +1,390 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module provides the backends used by XlsxBaseParser to read the content of an Excel file.
+- OpenpyxlBackend relies on openpyxl and is required to modify a workbook.
+- LxmlBackend streams the worksheet XML straight from the xlsx archive with lxml and only converts the cells of the
+  columns that are requested. It mirrors the conversions openpyxl performs in read-only mode so both backends return
+  the same values.
+"""
+
+import posixpath
+import zipfile
+import zlib
+from contextlib import contextmanager
+from warnings import warn
+
+from cached_property import cached_property
+from lxml import etree
+from openpyxl import load_workbook
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, MAC_EPOCH, WINDOWS_EPOCH
+from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+
+SHEET_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+DOC_RELS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+ROW_TAG = '{%s}row' % SHEET_MAIN_NS
+CELL_TAG = '{%s}c' % SHEET_MAIN_NS
+VALUE_TAG = '{%s}v' % SHEET_MAIN_NS
+FORMULA_TAG = '{%s}f' % SHEET_MAIN_NS
+INLINE_STRING_TAG = '{%s}is' % SHEET_MAIN_NS
+TEXT_TAG = '{%s}t' % SHEET_MAIN_NS
+RICH_TEXT_TAG = '{%s}r' % SHEET_MAIN_NS
+STRING_ITEM_TAG = '{%s}si' % SHEET_MAIN_NS
+DIMENSION_TAG = '{%s}dimension' % SHEET_MAIN_NS
+SHEET_DATA_TAG = '{%s}sheetData' % SHEET_MAIN_NS
+
+# Errors raised by the lxml backend when the content of the archive cannot be read or parsed
+LXML_BACKEND_ERRORS = (etree.LxmlError, zipfile.BadZipFile, zlib.error, EOFError, KeyError, ValueError)
+
+
+class OpenpyxlBackend:
+    """Backend reading (and writing) the Excel file with openpyxl"""
+
+    def __init__(self, xls_filename, read_only=True):
+        self.workbook = load_workbook(xls_filename, read_only=read_only)
+
+    @property
+    def sheetnames(self):
+        return self.workbook.sheetnames
+
+    def max_row(self, title):
+        return self.workbook[title].max_row
+
+    def row_values(self, title, row_num):
+        return [cell.value for cell in self.workbook[title][row_num]]
+
+    def iter_rows(self, title, min_row, columns=None):
+        """
+        Iterate over the values of each row of a worksheet starting from min_row. Rows missing from the worksheet are
+        returned empty so the n-th tuple is always the row min_row + n.
+        Openpyxl builds all the cells so the columns argument is ignored.
+        """
+        return self.workbook[title].iter_rows(min_row=min_row, values_only=True)
+
+    def close(self):
+        # In read-only mode, openpyxl keeps the file open until the workbook is closed
+        self.workbook.close()
+
+
+def _text_content(element):
+    """Concatenate the plain and the formatted text of a shared or inline string, ignoring phonetic runs"""
+    snippets = []
+    for child in element:
+        if child.tag == TEXT_TAG:
+            snippets.append(child.text or '')
+        elif child.tag == RICH_TEXT_TAG:
+            for text_element in child.iterchildren(TEXT_TAG):
+                snippets.append(text_element.text or '')
+    return ''.join(snippets)
+
+
+def _cast_number(value):
+    """Convert numbers as string to an int or float"""
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class LxmlBackend:
+    """
+    Read-only backend that streams the worksheets from the xlsx archive using lxml iterparse and only converts the
+    cells of the requested columns. The archive is only open while one of its parts is read.
+    """
+
+    def __init__(self, xls_filename, read_only=True):
+        if not read_only:
+            raise ValueError('The lxml backend can only read Excel files')
+        self.xls_filename = xls_filename
+        with zipfile.ZipFile(xls_filename) as archive:
+            self._part_names = set(archive.namelist())
+        self.epoch = WINDOWS_EPOCH
+        self._sheet_paths = {}
+        self._dimensions = {}
+        self._column_indices = {}
+        workbook_path = self._find_workbook_path()
+        self._workbook_rels = self._read_relationships(workbook_path)
+        self._read_workbook(workbook_path, self._workbook_rels)
+
+    @contextmanager
+    def _open_part(self, part_path):
+        with zipfile.ZipFile(self.xls_filename) as archive, archive.open(part_path) as part:
+            yield part
+
+    def _read_part(self, part_path):
+        with self._open_part(part_path) as part:
+            return part.read()
+
+    def _find_workbook_path(self):
+        for relationship in etree.fromstring(self._read_part('_rels/.rels')):
+            if relationship.get('Type', '').endswith('/officeDocument'):
+                return relationship.get('Target').lstrip('/')
+        raise ValueError('No workbook found in the archive')
+
+    def _read_relationships(self, part_path):
+        """
+        Read the relationships of a part of the archive
+        :return: dict of relationship id to relationship type and normalised target path
+        """
+        folder, part_name = posixpath.split(part_path)
+        rels_path = posixpath.join(folder, '_rels', part_name + '.rels')
+        relationships = {}
+        for relationship in etree.fromstring(self._read_part(rels_path)):
+            if relationship.get('TargetMode') == 'External':
+                continue
+            target = relationship.get('Target')
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            relationships[relationship.get('Id')] = (relationship.get('Type', ''), target)
+        return relationships
+
+    def _read_workbook(self, workbook_path, workbook_rels):
+        workbook = etree.fromstring(self._read_part(workbook_path))
+        workbook_properties = workbook.find('{%s}workbookPr' % SHEET_MAIN_NS)
+        if workbook_properties is not None and workbook_properties.get('date1904') in ('1', 'true'):
+            self.epoch = MAC_EPOCH
+        for sheet in workbook.iter('{%s}sheet' % SHEET_MAIN_NS):
+            relationship = workbook_rels.get(sheet.get('{%s}id' % DOC_RELS_NS))
+            if relationship and relationship[0].endswith('/worksheet'):
+                self._sheet_paths[sheet.get('name')] = relationship[1]
+
+    def _find_part(self, workbook_rels, rel_type):
+        for part_type, target in workbook_rels.values():
+            if part_type.endswith(rel_type) and target in self._part_names:
+                return target
+        return None
+
+    @cached_property
+    def shared_strings(self):
+        shared_strings = []
+        shared_strings_path = self._find_part(self._workbook_rels, '/sharedStrings')
+        if shared_strings_path:
+            with self._open_part(shared_strings_path) as source:
+                for _, element in etree.iterparse(source, tag=STRING_ITEM_TAG):
+                    shared_strings.append(_text_content(element).replace('x005F_', ''))
+                    element.clear()
+        return shared_strings
+
+    @cached_property
+    def date_formats(self):
+        """Set of the indices of the cell styles that format numbers as dates"""
+        return self._date_styles[0]
+
+    @cached_property
+    def timedelta_formats(self):
+        """Set of the indices of the cell styles that format numbers as durations"""
+        return self._date_styles[1]
+
+    @cached_property
+    def _date_styles(self):
+        """
+        Find the cell styles that format numbers as dates or durations.
+        :return: tuple of set of style indices for dates and set of style indices for durations
+        """
+        date_formats = set()
+        timedelta_formats = set()
+        styles_path = self._find_part(self._workbook_rels, '/styles')
+        if not styles_path:
+            return date_formats, timedelta_formats
+        styles = etree.fromstring(self._read_part(styles_path))
+        custom_formats = {}
+        for number_format in styles.iter('{%s}numFmt' % SHEET_MAIN_NS):
+            custom_formats[int(number_format.get('numFmtId'))] = number_format.get('formatCode')
+        cell_formats = styles.find('{%s}cellXfs' % SHEET_MAIN_NS)
+        if cell_formats is not None:
+            for style_index, cell_format in enumerate(cell_formats.iterchildren('{%s}xf' % SHEET_MAIN_NS)):
+                number_format_id = int(cell_format.get('numFmtId', 0))
+                number_format = custom_formats.get(number_format_id, BUILTIN_FORMATS.get(number_format_id))
+                if is_date_format(number_format):
+                    date_formats.add(style_index)
+                if is_timedelta_format(number_format):
+                    timedelta_formats.add(style_index)
+        return date_formats, timedelta_formats
+
+    @property
+    def sheetnames(self):
+        return list(self._sheet_paths)
+
+    def sheet_path(self, title):
+        """Path of the XML part of a worksheet within the xlsx archive"""
+        return self._sheet_paths[title]
+
+    def close(self):
+        # Nothing to release: the archive is closed after each read
+        pass
+
+    def _column_index(self, coordinate):
+        """Return the 1-based column index of a cell coordinate like 'AB12'"""
+        letters = coordinate.rstrip('0123456789')
+        if letters not in self._column_indices:
+            self._column_indices[letters] = column_index_from_string(letters)
+        return self._column_indices[letters]
+
+    def _dimension(self, title):
+        """Read the dimension declared at the top of the worksheet without parsing its content"""
+        if title not in self._dimensions:
+            dimension = None
+            with self._open_part(self._sheet_paths[title]) as source:
+                for _, element in etree.iterparse(source, events=('start',), tag=(DIMENSION_TAG, SHEET_DATA_TAG)):
+                    if element.tag == DIMENSION_TAG:
+                        dimension = element.get('ref')
+                    break
+            self._dimensions[title] = dimension
+        return self._dimensions[title]
+
+    def max_row(self, title):
+        dimension = self._dimension(title)
+        if dimension:
+            return range_boundaries(dimension)[3]
+        # Without dimension, find the last row of the worksheet. An empty worksheet has no row.
+        max_row = 0
+        for max_row, _ in self._parse_rows(title, columns=set()):
+            pass
+        return max_row
+
+    def max_column(self, title):
+        dimension = self._dimension(title)
+        if dimension:
+            return range_boundaries(dimension)[2]
+        return None
+
+    def _cell_value(self, element, coordinate, shared_formulae):
+        value = formula = inline_string = None
+        for child in element:
+            if child.tag == VALUE_TAG:
+                value = child.text or None
+            elif child.tag == FORMULA_TAG:
+                formula = child
+            elif child.tag == INLINE_STRING_TAG:
+                inline_string = child
+        if formula is not None:
+            return self._formula_value(formula, coordinate, shared_formulae)
+
+        data_type = element.get('t', 'n')
+        if data_type == 'inlineStr':
+            if inline_string is not None:
+                return _text_content(inline_string)
+            return None
+        if value is None:
+            return None
+        if data_type == 'n':
+            value = _cast_number(value)
+            style_id = int(element.get('s', 0))
+            if style_id in self.date_formats:
+                try:
+                    value = from_excel(value, self.epoch, timedelta=style_id in self.timedelta_formats)
+                except (OverflowError, ValueError):
+                    warn(f'Cell {coordinate} is marked as a date but the serial value {value} is outside the limits '
+                         f'for dates. The cell will be treated as an error.')
+                    value = '#VALUE!'
+        elif data_type == 's':
+            value = self.shared_strings[int(value)]
+        elif data_type == 'b':
+            value = bool(int(value))
+        elif data_type == 'd':
+            value = from_ISO8601(value)
+        return value
+
+    @staticmethod
+    def _formula_value(formula, coordinate, shared_formulae):
+        formula_type = formula.get('t')
+        value = '='
+        if formula.text is not None:
+            value += formula.text
+        if formula_type == 'array':
+            value = ArrayFormula(ref=formula.get('ref'), text=value)
+        elif formula_type == 'shared':
+            index = formula.get('si')
+            if index in shared_formulae:
+                value = shared_formulae[index].translate_formula(coordinate)
+            elif value != '=':
+                shared_formulae[index] = Translator(value, coordinate)
+        elif formula_type == 'dataTable':
+            value = DataTableFormula(**formula.attrib)
+        return value
+
+    def _parse_rows(self, title, columns=None):
+        """
+        Stream the rows present in the worksheet.
+        :param title: name of the worksheet
+        :param columns: set of 0-based column indices to convert. All columns are converted when None
+        :return: generator of tuples of the row index and a dict of column index to value
+        """
+        shared_formulae = {}
+        row_counter = 0
+        with self._open_part(self._sheet_paths[title]) as source:
+            for _, row_element in etree.iterparse(source, tag=ROW_TAG):
+                row_index = row_element.get('r')
+                row_counter = int(row_index) if row_index else row_counter + 1
+                values = {}
+                column = -1
+                for cell_element in row_element.iterchildren(CELL_TAG):
+                    coordinate = cell_element.get('r')
+                    column = self._column_index(coordinate) - 1 if coordinate else column + 1
+                    if columns is None or column in columns:
+                        values[column] = self._cell_value(cell_element, coordinate, shared_formulae)
+                    elif len(cell_element) and cell_element[0].tag == FORMULA_TAG \
+                            and cell_element[0].get('t') == 'shared':
+                        # Shared formulae are defined once and reused by other cells, possibly in requested columns
+                        self._formula_value(cell_element[0], coordinate, shared_formulae)
+                yield row_counter, values
+                # Free the memory used by the rows already processed
+                row_element.clear()
+                while row_element.getprevious() is not None:
+                    del row_element.getparent()[0]
+
+    def row_values(self, title, row_num):
+        for row_values in self.iter_rows(title, row_num):
+            return list(row_values)
+        return []
+
+    def iter_rows(self, title, min_row, columns=None):
+        """
+        Iterate over the values of each row of a worksheet starting from min_row, the same way openpyxl does in
+        read-only mode: rows missing from the worksheet are returned empty and rows after the declared dimension are
+        ignored.
+        :param columns: set of 0-based column indices to convert. Other columns are returned as None.
+        """
+        max_row = self.max_row(title)
+        max_column = self.max_column(title)
+        empty_row = ()
+        if max_column is not None:
+            empty_row = (None,) * max_column
+        row_counter = min_row
+        for row_index, values in self._parse_rows(title, columns):
+            if max_row is not None and row_index > max_row:
+                break
+            while row_counter < row_index:
+                row_counter += 1
+                yield empty_row
+            if row_counter == row_index:
+                row_counter += 1
+                width = max_column or (max(values) + 1 if values else 0)
+                yield tuple(values.get(column) for column in range(width))
+        if max_row is not None:
+            while row_counter <= max_row:
+                row_counter += 1
+                yield empty_row
+
+
+BACKENDS = {
+    'openpyxl': OpenpyxlBackend,
+    'lxml': LxmlBackend
+}
@@ -20,19 +20,30 @@ This module reads an Excel file and allows the user to get all the valid workshe
 get the 1st line in a worksheet and iterate over the rest of the worksheet row by row
 (next_row). The returned row is a hash which contains only the keys that are defined in
 a configuration file.
-This module depends on openpyxl and pyyaml.
+This module depends on openpyxl, lxml and pyyaml.
 """
 
+import os
+import shutil
+
 import yaml
 from ebi_eva_common_pyutils.logger import AppLogger
 from openpyxl import load_workbook
 
+from eva_submission.xlsx.xlsx_backends import BACKENDS, LXML_BACKEND_ERRORS, OpenpyxlBackend
+from eva_submission.xlsx.xlsx_patcher import patch_worksheets, XlsxPatchError
+
 WORKSHEETS_KEY_NAME = 'worksheets'
 REQUIRED_HEADERS_KEY_NAME = 'required'
 OPTIONAL_HEADERS_KEY_NAME = 'optional'
 HEADERS_KEY_ROW = 'header_row'
 CAST_KEY_NAME = 'cast'
 
+# Functions used to cast the values of the columns listed in the "cast" section of the configuration
+CAST_FUNCTIONS = {
+    'string': str
+}
+
 
 class XlsxBaseParser(AppLogger):
     """
@@ -40,27 +51,80 @@ class XlsxBaseParser(AppLogger):
     It implements the base functioanlity allowing to open and validate the spreadsheet
     """
 
-    def __init__(self, xls_filename, conf_filename, read_only=True):
+    def __init__(self, xls_filename, conf_filename, read_only=True, backend='openpyxl'):
         """
         Constructor
         :param xls_filename: Excel file path
         :type xls_filename: basestring
         :param conf_filename: configuration file path
         :type conf_filename: basestring
+        :param backend: name of the backend used to read the Excel file, either openpyxl or lxml
+        :type backend: basestring
         """
         with open(conf_filename, 'r') as conf_file:
             self.xls_conf = yaml.full_load(conf_file)
-        try:
-            self.workbook = load_workbook(xls_filename, read_only=read_only)
-        except Exception as e:
-            self.error('Error loading %s', xls_filename)
-            raise e
+        self.xls_filename = xls_filename
+        self.read_only = read_only
+        self.backend = self._open_backend(xls_filename, read_only, backend)
+        # openpyxl workbook, only available with the openpyxl backend
+        self.workbook = getattr(self.backend, 'workbook', None)
         self.worksheets = None
         self._active_worksheet = None
         self.row_offset = {}
         self.headers = {}
+        self.column_plans = {}
         self.valid = None
 
+    def _open_backend(self, xls_filename, read_only, backend):
+        if backend != 'openpyxl':
+            try:
+                return BACKENDS[backend](xls_filename, read_only=read_only)
+            except Exception:
+                self.warning('Could not open %s with the %s backend, using openpyxl instead', xls_filename, backend)
+        try:
+            return OpenpyxlBackend(xls_filename, read_only=read_only)
+        except Exception as e:
+            self.error('Error loading %s', xls_filename)
+            raise e
+
+    def _fall_back_to_openpyxl(self, error):
+        """
+        Replace the backend with openpyxl after the current backend failed to parse the Excel file.
+        :return: True if the backend was replaced, False if openpyxl was already used
+        """
+        if isinstance(self.backend, OpenpyxlBackend):
+            return False
+        self.warning('Could not parse %s (%s), using openpyxl instead', self.xls_filename, error)
+        self.backend.close()
+        self.backend = self._open_backend(self.xls_filename, self.read_only, 'openpyxl')
+        self.workbook = self.backend.workbook
+        return True
+
+    def _iter_rows(self, worksheet, min_row, columns=None):
+        """
+        Iterate over the values of each row of a worksheet starting from min_row. If the backend fails to parse the
+        worksheet, the rows not returned yet are read with openpyxl.
+        """
+        nb_rows = 0
+        try:
+            for values in self.backend.iter_rows(worksheet, min_row, columns):
+                yield values
+                nb_rows += 1
+        except LXML_BACKEND_ERRORS as e:
+            if not self._fall_back_to_openpyxl(e):
+                raise
+            yield from self.backend.iter_rows(worksheet, min_row + nb_rows, columns)
+
+    def close(self):
+        """Release the Excel file held by the backend"""
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     @property
     def active_worksheet(self):
         return self._active_worksheet
@@ -83,8 +147,17 @@ class XlsxBaseParser(AppLogger):
         if self.worksheets is not None:
             return self.worksheets
 
-        self.worksheets = []
-        sheet_titles = self.workbook.sheetnames
+        try:
+            self.worksheets = self._find_valid_worksheets()
+        except LXML_BACKEND_ERRORS as e:
+            if not self._fall_back_to_openpyxl(e):
+                raise
+            self.worksheets = self._find_valid_worksheets()
+        return self.worksheets
+
+    def _find_valid_worksheets(self):
+        worksheets = []
+        sheet_titles = self.backend.sheetnames
 
         for title in self.xls_conf[WORKSHEETS_KEY_NAME]:
             # Check worksheet exists
@@ -92,21 +165,41 @@ class XlsxBaseParser(AppLogger):
                 continue
 
             # Check number of rows
-            worksheet = self.workbook[title]
             header_row = self.xls_conf[title].get(HEADERS_KEY_ROW, 1)
-            if worksheet.max_row < header_row + 1:
+            if self.backend.max_row(title) < header_row + 1:
                 continue
             # Check required headers are present
-            self.headers[title] = [cell.value if cell.value is None else cell.value.strip()
-                                   for cell in worksheet[header_row]]
+            self.headers[title] = [value if value is None else value.strip()
+                                   for value in self.backend.row_values(title, header_row)]
             required_headers = self.xls_conf[title].get(REQUIRED_HEADERS_KEY_NAME, [])
             if set(required_headers) <= set(self.headers[title]):  # issubset
-                self.worksheets.append(title)
+                worksheets.append(title)
+                self.column_plans[title] = self._compile_column_plan(title)
             else:
                 self.warning('Worksheet '+title+' does not have all the required headers!')
                 self.valid = False
 
-        return self.worksheets
+        return worksheets
+
+    def _compile_column_plan(self, worksheet):
+        """
+        Resolve, once per worksheet, where each configured header is found and how its value should be cast.
+        :param worksheet: name of a worksheet whose header row has been read
+        :return: list of (column index, header, cast function) tuples in the configured header order.
+                The column index is None when the header is absent from the worksheet and the cast function is None
+                when the value should not be cast.
+        :rtype: list
+        """
+        required_headers = self.xls_conf[worksheet].get(REQUIRED_HEADERS_KEY_NAME, [])
+        optional_headers = self.xls_conf[worksheet].get(OPTIONAL_HEADERS_KEY_NAME, [])
+        cast_conf = self.xls_conf[worksheet].get(CAST_KEY_NAME, {})
+        column_plan = []
+        for header in required_headers + optional_headers:
+            column_index = None
+            if header in self.headers[worksheet]:
+                column_index = self.headers[worksheet].index(header)
+            column_plan.append((column_index, header, CAST_FUNCTIONS.get(cast_conf.get(header))))
+        return column_plan
 
     def get_valid_conf_keys(self):
         """
@@ -130,9 +223,8 @@ class XlsxBaseParser(AppLogger):
     @staticmethod
     def cast_value(value, type_name):
         # Do not cast None values
-        if type_name and value is not None:
-            if type_name == 'string':
-                return str(value)
+        if type_name and value is not None and type_name in CAST_FUNCTIONS:
+            return CAST_FUNCTIONS[type_name](value)
         return value
 
 
@@ -141,19 +233,26 @@ class XlsxReader(XlsxBaseParser):
     Reader for Excel file for the fields from worksheets defined in a configuration file
     """
 
-    def __init__(self, xls_filename, conf_filename):
+    def __init__(self, xls_filename, conf_filename, backend='lxml'):
         """
         Constructor
         :param xls_filename: Excel file path
         :type xls_filename: basestring
         :param conf_filename: configuration file path
         :type conf_filename: basestring
+        :param backend: name of the backend used to read the Excel file, either lxml (default) or openpyxl
+        :type backend: basestring
         """
-        super().__init__(xls_filename, conf_filename, read_only=True)
+        super().__init__(xls_filename, conf_filename, read_only=True, backend=backend)
+        # One open row cursor per worksheet so that successive calls to next() do not re-read the worksheet
+        self._row_iterators = {}
 
     def __iter__(self):
         return self
 
+    def __next__(self):
+        return self.next()
+
     def base_row_offset(self, worksheet):
         return self.xls_conf[worksheet].get(HEADERS_KEY_ROW, 1)
 
@@ -169,46 +268,70 @@ class XlsxReader(XlsxBaseParser):
             self.warning('No worksheet is specified!')
             raise StopIteration
 
-        if worksheet not in self.row_offset:
-            self.row_offset[worksheet] = self.base_row_offset(worksheet)
-        self.row_offset[worksheet] += 1
+        if worksheet not in self._row_iterators:
+            self._row_iterators[worksheet] = self.iter_worksheet(worksheet)
+        return next(self._row_iterators[worksheet])
 
-        required_headers = self.xls_conf[worksheet].get(REQUIRED_HEADERS_KEY_NAME, [])
-        optional_headers = self.xls_conf[worksheet].get(OPTIONAL_HEADERS_KEY_NAME, [])
+    def count_rows(self, worksheet):
+        """
+        Count the data rows of a worksheet without building them
+        :param worksheet: name of the worksheet to read
+        :return: number of rows with a value in at least one of the configured columns
+        :rtype: int
+        """
+        if worksheet not in self.valid_worksheets():
+            raise ValueError('Worksheet ' + worksheet + ' is not valid!')
+
+        column_indices = [column_index for column_index, _, _ in self.column_plans[worksheet] if column_index is not None]
+        nb_rows = 0
+        for values in self._iter_rows(worksheet, self.base_row_offset(worksheet) + 1, set(column_indices)):
+            num_cells = len(values)
+            if any(values[column_index] is not None for column_index in column_indices if column_index < num_cells):
+                nb_rows += 1
+        return nb_rows
+
+    def iter_worksheet(self, worksheet):
+        """
+        Iterate over all the data rows of a worksheet in a single pass
+        :param worksheet: name of the worksheet to read
+        :return: generator of hashes containing all the REQUIRED and OPTIONAL fields as keys
+                and the corresponding data as values
+        :rtype: generator
+        """
+        if worksheet not in self.valid_worksheets():
+            raise ValueError('Worksheet ' + worksheet + ' is not valid!')
 
-        for row in self.workbook[worksheet].iter_rows(min_row=self.row_offset[worksheet]):
-            num_cells = 0
-            for cell in row:
-                num_cells += 1
+        column_plan = self.column_plans[worksheet]
+        columns = set(column_index for column_index, _, _ in column_plan if column_index is not None)
+        row_num = self.base_row_offset(worksheet)
+        for values in self._iter_rows(worksheet, row_num + 1, columns):
+            row_num += 1
+            self.row_offset[worksheet] = row_num
+            num_cells = len(values)
 
             data = {}
             has_notnull = False
-            for header in required_headers+optional_headers:
-                header_index = num_cells
-                if header in self.headers[worksheet]:
-                    header_index = self.headers[worksheet].index(header)
-                if header_index >= num_cells:
+            for column_index, header, cast in column_plan:
+                if column_index is None or column_index >= num_cells:
                     data[header] = None
                     continue
-
-                cell = row[header_index]
-                if cell.value is not None:
+                value = values[column_index]
+                if value is not None:
                     has_notnull = True
-                data[header] = self.cast_value(cell.value, self.xls_conf[worksheet].get(CAST_KEY_NAME, {}).get(header))
+                    if cast:
+                        value = cast(value)
+                data[header] = value
 
+            # rows without any data are skipped
             if has_notnull:
-                data['row_num'] = self.row_offset[worksheet]
-                return data
-
-            # no data on this row, continue to next
-            self.row_offset[worksheet] += 1
-
-        raise StopIteration
+                data['row_num'] = row_num
+                yield data
 
 
 class XlsxWriter(XlsxBaseParser):
     """
-    Writer for Excel file for the fields from worksheets defined in a configuration file
+    Writer for Excel file for the fields from worksheets defined in a configuration file.
+    The values are buffered per cell and only written when the file is saved.
     """
 
     def __init__(self, xls_filename, conf_filename):
@@ -219,47 +342,154 @@ class XlsxWriter(XlsxBaseParser):
         :param conf_filename: configuration file path
         :type conf_filename: basestring
         """
-        super().__init__(xls_filename, conf_filename, read_only=False)
+        # The headers are read with the lxml backend. The workbook is only loaded with openpyxl if the changes cannot
+        # be written by patching the worksheets.
+        super().__init__(xls_filename, conf_filename, read_only=True, backend='lxml')
+        # Values to write in each worksheet, keyed by (row, column) with 1-based indices
+        self.pending_cells = {}
+        self.column_maps = {}
+
+    def column_map(self, worksheet):
+        """
+        :return: dict of the configured headers found in the worksheet to their 1-based column index
+        :rtype: dict
+        """
+        if worksheet not in self.column_maps:
+            if worksheet not in self.valid_worksheets():
+                raise ValueError('Worksheet ' + worksheet + ' is not valid!')
+            self.column_maps[worksheet] = dict(
+                (header, column_index + 1)
+                for column_index, header, _ in self.column_plans[worksheet] if column_index is not None
+            )
+        return self.column_maps[worksheet]
 
     def edit_row(self, row_data: dict, remove_when_missing_values=True):
+        self.edit_rows([row_data], remove_when_missing_values)
+
+    def edit_rows(self, rows, remove_when_missing_values=True):
+        """
+        Write a set of rows in the active worksheet. Each row must contain the row number in "row_num".
+        """
         worksheet = self.active_worksheet
         if worksheet is None:
             raise ValueError('No worksheet is specified!')
 
-        if 'row_num' not in row_data:
-            raise KeyError('No row specified in dict ' + str(row_data))
-        row_num = row_data['row_num']
-
+        column_map = self.column_map(worksheet)
         required_headers = self.xls_conf[worksheet].get(REQUIRED_HEADERS_KEY_NAME, [])
-        optional_headers = self.xls_conf[worksheet].get(OPTIONAL_HEADERS_KEY_NAME, [])
-
-        for header in required_headers:
-            header_index = self.headers[worksheet].index(header)
-            if header not in row_data:
-                raise ValueError('Header {0} is required but is not provided in row {1}'.format(header, row_num))
-            self.workbook[worksheet].cell(column=header_index+1, row=row_num, value=row_data[header])
-
-        for header in optional_headers:
-            if header in self.headers[worksheet]:
-                header_index = self.headers[worksheet].index(header)
-                if header not in row_data and remove_when_missing_values:
+        optional_headers = [
+            header for header in self.xls_conf[worksheet].get(OPTIONAL_HEADERS_KEY_NAME, []) if header in column_map
+        ]
+        cells = self.pending_cells.setdefault(worksheet, {})
+
+        def set_cell(row_num, header, value):
+            # Like openpyxl, a None value leaves the cell unchanged
+            if value is not None:
+                cells[(row_num, column_map[header])] = value
+
+        for row_data in rows:
+            if 'row_num' not in row_data:
+                raise KeyError('No row specified in dict ' + str(row_data))
+            row_num = row_data['row_num']
+
+            for header in required_headers:
+                if header not in row_data:
+                    raise ValueError('Header {0} is required but is not provided in row {1}'.format(header, row_num))
+                set_cell(row_num, header, row_data[header])
+
+            for header in optional_headers:
+                if header in row_data:
+                    set_cell(row_num, header, row_data[header])
+                elif remove_when_missing_values:
                     # When data is missing remove the value from the cell
-                    self.workbook[worksheet].cell(column=header_index+1, row=row_num, value='')
-                elif header in row_data:
-                    self.workbook[worksheet].cell(column=header_index+1, row=row_num, value=row_data[header])
+                    set_cell(row_num, header, '')
 
     def set_rows(self, rows):
         """
-        Write a set of rows from the top of the spreadsheet.
+        Write a set of rows from the top of the spreadsheet. The rows provided are not modified.
         """
         worksheet = self.active_worksheet
         if worksheet is None:
             raise ValueError('No worksheet is specified!')
 
         first_row = self.xls_conf[worksheet].get(HEADERS_KEY_ROW, 1) + 1
-        for i, row in enumerate(rows):
-            row['row_num'] = first_row + i
-            self.edit_row(row)
+        self.edit_rows([dict(row, row_num=first_row + i) for i, row in enumerate(rows)])
 
-    def save(self, filename):
-        self.workbook.save(filename)
+    def _original_values(self, worksheet, cells):
+        """
+        Read the values in the file of the cells to write. The worksheet is streamed up to the last row to write and
+        only the values of these cells are kept.
+        :return: dict of (row, column) to the value in the file of the cells that are not empty
+        """
+        # Values are cast like the reader does so rows that were read and written back compare equal
+        casts = dict(
+            (column_index + 1, cast) for column_index, _, cast in self.column_plans[worksheet] if column_index is not None
+        )
+        columns_per_row = {}
+        for row_num, column in cells:
+            columns_per_row.setdefault(row_num, []).append(column)
+        columns = set(column - 1 for _, column in cells)
+        last_row = max(columns_per_row)
+        values = {}
+        for row_num, row_values in enumerate(self._iter_rows(worksheet, 1, columns), start=1):
+            if row_num > last_row:
+                break
+            for column in columns_per_row.get(row_num, ()):
+                if column <= len(row_values) and row_values[column - 1] is not None:
+                    value = row_values[column - 1]
+                    cast = casts.get(column)
+                    values[(row_num, column)] = cast(value) if cast else value
+        return values
+
+    @staticmethod
+    def _same_value(original_value, value):
+        # Empty cells are read as None and cleared by writing an empty string
+        if original_value in (None, '') and value in (None, ''):
+            return True
+        return type(original_value) is type(value) and original_value == value
+
+    def modified_cells(self):
+        """
+        :return: the values set so far that differ from the ones in the file, per worksheet and keyed by (row, column)
+        :rtype: dict
+        """
+        modified_cells = {}
+        for worksheet, cells in self.pending_cells.items():
+            if not cells:
+                continue
+            original_values = self._original_values(worksheet, cells)
+            changed = dict(
+                (cell, value) for cell, value in cells.items() if not self._same_value(original_values.get(cell), value)
+            )
+            if changed:
+                modified_cells[worksheet] = changed
+        return modified_cells
+
+    def save(self, filename, patch=True):
+        """
+        Write the Excel file with all the values set so far. Only the cells whose value changed are written and the
+        file is left untouched when nothing changed.
+        :param filename: path of the Excel file to write. It can be the file being modified.
+        :param patch: rewrite only the modified worksheets and copy the rest of the file unchanged. The whole workbook
+                      is saved with openpyxl when this is not possible.
+        :return: True if the file was written, False if saving was skipped
+        :rtype: bool
+        """
+        modified_cells = self.modified_cells()
+        if not modified_cells:
+            if os.path.exists(filename) and os.path.samefile(self.xls_filename, filename):
+                self.debug('No value changed in %s: skip saving', filename)
+                return False
+            shutil.copyfile(self.xls_filename, filename)
+            return True
+        if patch:
+            try:
+                patch_worksheets(self.xls_filename, filename, modified_cells)
+                return True
+            except XlsxPatchError as e:
+                self.info('Cannot patch the worksheets of %s (%s): saving the whole workbook', self.xls_filename, e)
+        workbook = load_workbook(self.xls_filename)
+        for worksheet, cells in modified_cells.items():
+            for (row_num, column), value in cells.items():
+                workbook[worksheet].cell(column=column, row=row_num, value=value)
+        workbook.save(filename)
+        return True
@@ -13,42 +13,118 @@
 # limitations under the License.
 
 import os
+import threading
 from collections import defaultdict
+from collections.abc import Mapping
 
+import yaml
 from cached_property import cached_property
 from ebi_eva_common_pyutils.logger import AppLogger
 
 from eva_submission import ROOT_DIR
+from eva_submission.xlsx.metadata_bundle import convert_value, field_types, is_metadata_bundle, metadata_files, \
+    read_metadata_bundle
+from eva_submission.xlsx.metadata_cache import get_metadata_cache, spreadsheet_fingerprint
+from eva_submission.xlsx.metadata_table import MetadataTable
 from eva_submission.xlsx.xlsx_parser import XlsxReader, XlsxWriter
 
 
 class EvaXlsxReader(AppLogger):
+    cacheable = True
 
     def __init__(self, metadata_file):
+        self.metadata_file = metadata_file
+        # Parsed worksheets are reused from the on-disk cache when the spreadsheet has not changed
+        self.cache = get_metadata_cache() if self.cacheable else None
+        self._fingerprint = None
+        self._cache_entry = None
+        # Rows of each worksheet, parsed the first time the worksheet is accessed
+        self._worksheet_rows = {}
+        if self.cache:
+            self._fingerprint = spreadsheet_fingerprint(metadata_file)
+            self._cache_entry = self.cache.load(metadata_file, self._fingerprint)
+
+    @cached_property
+    def reader(self):
         conf = os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')
-        self.reader = XlsxReader(metadata_file, conf)
-        self.metadata_file=metadata_file
+        return XlsxReader(self.metadata_file, conf)
 
-    def _get_all_rows(self, active_sheet):
-        self.reader.active_worksheet = active_sheet
-        rows = []
-        try:
-            r = self.reader.next()
-            while r:
-                rows.append(r)
-                r = self.reader.next()
-            rows.append(r)
-        except StopIteration:
-            pass
+    def _store_in_cache(self, worksheet, rows):
+        if not self.cache:
+            return
+        if self._cache_entry is None:
+            self._cache_entry = {
+                'fingerprint': self._fingerprint,
+                'worksheets': self.reader.valid_worksheets()
+            }
+            self.cache.save(self.metadata_file, self._cache_entry)
+        self.cache.save(self.metadata_file, {'fingerprint': self._fingerprint, 'rows': rows}, worksheet)
+
+    def _load_from_cache(self, worksheet):
+        """:return: the rows of the worksheet stored in the cache or None if they are not cached"""
+        if not self._cache_entry:
+            return None
+        worksheet_entry = self.cache.load(self.metadata_file, self._fingerprint, worksheet)
+        if worksheet_entry:
+            return worksheet_entry['rows']
+        return None
+
+    def valid_worksheets(self):
+        if self._cache_entry:
+            return list(self._cache_entry['worksheets'])
+        return self.reader.valid_worksheets()
+
+    def _read_worksheet(self, worksheet):
+        if self._cache_entry and worksheet not in self._cache_entry['worksheets']:
+            raise ValueError('Worksheet ' + worksheet + ' is not valid!')
+        rows = self._load_from_cache(worksheet)
+        if rows is not None:
+            return rows
+        self.reader.active_worksheet = worksheet
+        rows = list(self.reader.iter_worksheet(worksheet))
+        self._store_in_cache(worksheet, rows)
         return rows
 
+    def _get_all_rows(self, active_sheet):
+        if active_sheet not in self._worksheet_rows:
+            self._worksheet_rows[active_sheet] = self._read_worksheet(active_sheet)
+            if 'reader' in self.__dict__ and set(self.valid_worksheets()) <= set(self._worksheet_rows):
+                # All the worksheets have been parsed so the file does not need to stay open
+                self.reader.close()
+        return self._worksheet_rows[active_sheet]
+
+    @cached_property
+    def metadata(self):
+        """Mapping of the valid worksheet names to their rows. Each worksheet is only parsed when first accessed."""
+        return LazyWorksheets(self)
+
+    def count_rows(self, worksheet):
+        if worksheet in self._worksheet_rows:
+            return len(self._worksheet_rows[worksheet])
+        rows = self._load_from_cache(worksheet)
+        if rows is not None:
+            self._worksheet_rows[worksheet] = rows
+            return len(rows)
+        return self.reader.count_rows(worksheet)
+
+    def peek(self):
+        """
+        Summarise the spreadsheet without building the rows of the Sample and Files worksheets
+        :return: A hash containing the project title, the references and the number of rows in each valid worksheet
+        :rtype: dict
+        """
+        return {
+            'project_title': self.project_title,
+            'references': self.references,
+            'row_counts': dict((worksheet, self.count_rows(worksheet)) for worksheet in self.valid_worksheets())
+        }
+
     @cached_property
     def project(self):
-        self.reader.active_worksheet = 'Project'
-        try:
-            return self.reader.next()
-        except StopIteration:
-            self.error('No project was found in the spreadsheet %s', self.metadata_file)
+        projects = self._get_all_rows('Project')
+        if projects:
+            return projects[0]
+        self.error('No project was found in the spreadsheet %s', self.metadata_file)
 
     @cached_property
     def submitters(self):
@@ -79,24 +155,134 @@ class EvaXlsxReader(AppLogger):
     def references(self):
         return list(set([a.get('Reference') for a in self.analysis if a.get('Reference')]))
 
+    def table(self, worksheet):
+        """:return: MetadataTable of the rows of the worksheet"""
+        return MetadataTable(self._get_all_rows(worksheet))
+
     @property
     def samples_per_analysis(self):
-        samples_per_analysis = defaultdict(list)
-        for row in self.samples:
-            samples_per_analysis[row.get('Analysis Alias')].append(row)
-        return samples_per_analysis
+        return defaultdict(list, MetadataTable(self.samples).group_rows_by('Analysis Alias'))
 
     @property
     def files_per_analysis(self):
-        files_per_analysis = defaultdict(list)
-        for row in self.files:
-            files_per_analysis[row.get('Analysis Alias')].append(row)
-        return files_per_analysis
+        return defaultdict(list, MetadataTable(self.files).group_rows_by('Analysis Alias'))
+
+
+class EvaMetadataBundleReader(EvaXlsxReader):
+    """
+    Reader for the metadata provided as a JSON document or as a directory of TSV files (see metadata_bundle).
+    It returns the same rows as EvaXlsxReader would for the equivalent spreadsheet.
+    """
+    # Bundles are fast enough to parse that they are not stored in the metadata cache
+    cacheable = False
+
+    def __init__(self, metadata_file):
+        super().__init__(metadata_file)
+        with open(os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')) as open_file:
+            self.xls_conf = yaml.full_load(open_file)
+        with open(os.path.join(ROOT_DIR, 'etc', 'eva_project_validation.yaml')) as open_file:
+            self.field_types = field_types(yaml.safe_load(open_file))
+
+    @cached_property
+    def bundle(self):
+        return read_metadata_bundle(self.metadata_file)
+
+    def valid_worksheets(self):
+        worksheets = []
+        for worksheet in self.xls_conf['worksheets']:
+            if worksheet not in self.bundle:
+                continue
+            rows = self.bundle[worksheet]
+            required_headers = self.xls_conf[worksheet].get('required', [])
+            if rows and not set(required_headers) <= set().union(*rows):
+                self.warning('Worksheet ' + worksheet + ' does not have all the required headers!')
+                continue
+            worksheets.append(worksheet)
+        return worksheets
+
+    def _read_worksheet(self, worksheet):
+        if worksheet not in self.valid_worksheets():
+            raise ValueError('Worksheet ' + worksheet + ' is not valid!')
+        worksheet_conf = self.xls_conf[worksheet]
+        headers = worksheet_conf.get('required', []) + worksheet_conf.get('optional', [])
+        casts = worksheet_conf.get('cast', {})
+        types = self.field_types.get(worksheet, {})
+        rows = []
+        for position, bundle_row in enumerate(self.bundle[worksheet]):
+            row = {}
+            for header in headers:
+                value = convert_value(bundle_row.get(header), types.get(header))
+                row[header] = XlsxReader.cast_value(value, casts.get(header))
+            # rows without any data are skipped
+            if all(value is None for value in row.values()):
+                continue
+            row['row_num'] = bundle_row.get('row_num') or worksheet_conf.get('header_row', 1) + position + 1
+            rows.append(row)
+        return rows
+
+    def count_rows(self, worksheet):
+        return len(self._get_all_rows(worksheet))
+
+
+class LazyWorksheets(Mapping):
+    """Read-only mapping of the valid worksheet names of an EvaXlsxReader to the rows of each worksheet"""
+
+    def __init__(self, eva_reader):
+        self.eva_reader = eva_reader
+
+    def __getitem__(self, worksheet):
+        if worksheet not in self.eva_reader.valid_worksheets():
+            raise KeyError(worksheet)
+        return self.eva_reader._get_all_rows(worksheet)
+
+    def __iter__(self):
+        return iter(self.eva_reader.valid_worksheets())
+
+    def __len__(self):
+        return len(self.eva_reader.valid_worksheets())
+
+
+# EvaXlsxReaders shared within the process, keyed by the absolute path of the spreadsheet
+_shared_readers = {}
+_shared_readers_lock = threading.Lock()
+
+
+def get_eva_xlsx_reader(metadata_file):
+    """
+    Return an EvaXlsxReader that is shared by all the callers of this function within the process so that the
+    spreadsheet is only parsed once. The rows it returns should be treated as read-only.
+    A new reader is created when the file has been modified since the shared reader was created.
+    Metadata bundles (JSON document or directory of TSV files) are read with an EvaMetadataBundleReader.
+    """
+    path = os.path.abspath(metadata_file)
+    file_state = tuple((st.st_size, st.st_mtime_ns) for st in map(os.stat, metadata_files(path)))
+    with _shared_readers_lock:
+        if path in _shared_readers and _shared_readers[path][0] == file_state:
+            return _shared_readers[path][1]
+        if is_metadata_bundle(metadata_file):
+            reader = EvaMetadataBundleReader(metadata_file)
+        else:
+            reader = EvaXlsxReader(metadata_file)
+        _shared_readers[path] = (file_state, reader)
+        return reader
+
+
+def release_eva_xlsx_reader(metadata_file):
+    """Remove the shared EvaXlsxReader of this spreadsheet so the next call to get_eva_xlsx_reader parses it again"""
+    with _shared_readers_lock:
+        _shared_readers.pop(os.path.abspath(metadata_file), None)
 
 
 class EvaXlsxWriter(AppLogger):
 
     def __init__(self, metadata_source, metadata_dest=None):
+        # Only the spreadsheets can be written back, the bundles are not modified during the submission
+        for metadata_file in (metadata_source, metadata_dest):
+            if metadata_file and is_metadata_bundle(metadata_file):
+                raise ValueError(
+                    'Metadata bundle %s cannot be modified: convert it to a spreadsheet with convert_metadata.py '
+                    'and use the spreadsheet for the submission' % metadata_file
+                )
         conf = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'etc', 'eva_project_conf.yaml')
         self.writer = XlsxWriter(metadata_source, conf)
         self.metadata_source = metadata_source
@@ -110,7 +296,13 @@ class EvaXlsxWriter(AppLogger):
         self.writer.set_rows(rows)
 
     def save(self):
-        self.writer.save(self.metadata_dest)
+        """Write the modified values in the destination spreadsheet. Nothing is written when no value changed."""
+        if not self.writer.save(self.metadata_dest):
+            return
+        release_eva_xlsx_reader(self.metadata_dest)
+        cache = get_metadata_cache()
+        if cache:
+            cache.invalidate(self.metadata_dest)
 
     def set_files(self, file_dicts):
         self._set_all_rows('Files', file_dicts)
@@ -124,6 +316,3 @@ class EvaXlsxWriter(AppLogger):
     def set_samples(self, sample_dicts):
         self._set_all_rows('Sample', sample_dicts)
 
-    def set_files(self, file_dicts):
-        self._set_all_rows('Files', file_dicts)
-
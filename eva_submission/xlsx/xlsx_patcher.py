@@ -0,0 +1,282 @@
+# Copyright 2020 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module writes cell values in an Excel file by rewriting only the XML of the modified worksheets, streamed row by
+row from the original archive to the new one. All the other parts of the xlsx archive (shared strings, styles, other
+worksheets, ...) are copied unchanged.
+Strings are written as inline strings so the shared strings table does not need to be rewritten. The style of
+existing cells is kept.
+Changes that cannot be written safely this way raise a XlsxPatchError and should be saved with openpyxl instead.
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import defaultdict
+
+from lxml import etree
+from openpyxl.utils import column_index_from_string, get_column_letter, range_boundaries
+
+from eva_submission.xlsx.xlsx_backends import LxmlBackend, LXML_BACKEND_ERRORS, ROW_TAG, CELL_TAG, VALUE_TAG, \
+    FORMULA_TAG, INLINE_STRING_TAG, TEXT_TAG, DIMENSION_TAG, SHEET_DATA_TAG
+
+XML_SPACE_ATTRIBUTE = '{http://www.w3.org/XML/1998/namespace}space'
+
+
+class XlsxPatchError(Exception):
+    """Raised when a change cannot be written by patching the worksheet XML"""
+
+
+def _is_empty(value):
+    return value is None or value == ''
+
+
+def _set_cell_value(cell_element, value):
+    """Replace the value of a cell element, keeping its coordinate and its style"""
+    for child in list(cell_element):
+        if child.tag in (VALUE_TAG, INLINE_STRING_TAG):
+            cell_element.remove(child)
+    cell_element.attrib.pop('t', None)
+    if _is_empty(value):
+        return
+    if isinstance(value, bool):
+        cell_element.set('t', 'b')
+        etree.SubElement(cell_element, VALUE_TAG).text = '1' if value else '0'
+    elif isinstance(value, (int, float)):
+        if value != value or value in (float('inf'), float('-inf')):
+            raise XlsxPatchError('Cannot write the number {0}'.format(value))
+        etree.SubElement(cell_element, VALUE_TAG).text = repr(value)
+    elif isinstance(value, str):
+        if value.startswith('='):
+            # openpyxl stores these strings as formulae
+            raise XlsxPatchError('Cannot write the formula {0}'.format(value))
+        cell_element.set('t', 'inlineStr')
+        text_element = etree.SubElement(etree.SubElement(cell_element, INLINE_STRING_TAG), TEXT_TAG)
+        try:
+            text_element.text = value
+        except ValueError as e:
+            raise XlsxPatchError(str(e))
+        if value != value.strip():
+            text_element.set(XML_SPACE_ATTRIBUTE, 'preserve')
+    else:
+        raise XlsxPatchError('Cannot write values of type {0}'.format(type(value).__name__))
+
+
+def _cell_column(cell_element):
+    coordinate = cell_element.get('r')
+    if not coordinate:
+        raise XlsxPatchError('Cell without coordinate')
+    return column_index_from_string(coordinate.rstrip('0123456789'))
+
+
+def _patch_row(row_element, row_index, cells):
+    """
+    Write the values in a row element, adding the missing cells in column order.
+    :param cells: dict of 1-based column index to value
+    """
+    cell_elements = {}
+    other_elements = []
+    for child in row_element:
+        if child.tag == CELL_TAG:
+            cell_elements[_cell_column(child)] = child
+        else:
+            other_elements.append(child)
+
+    cells_added = False
+    for column, value in cells.items():
+        cell_element = cell_elements.get(column)
+        if cell_element is None:
+            if _is_empty(value):
+                continue
+            cell_element = etree.Element(CELL_TAG, r=get_column_letter(column) + str(row_index))
+            cell_elements[column] = cell_element
+            cells_added = True
+        elif cell_element.find(FORMULA_TAG) is not None:
+            raise XlsxPatchError('Cannot overwrite the formula in cell {0}'.format(cell_element.get('r')))
+        _set_cell_value(cell_element, value)
+
+    if cells_added:
+        row_element[:] = [cell_elements[column] for column in sorted(cell_elements)] + other_elements
+        # The span of the row is an optional hint that is not valid anymore
+        row_element.attrib.pop('spans', None)
+
+
+def _end_tag(element):
+    local_name = etree.QName(element).localname
+    return '</{0}>'.format(element.prefix + ':' + local_name if element.prefix else local_name).encode()
+
+
+def _namespace_declarations(nsmap):
+    return [
+        ' xmlns{0}="{1}"'.format(':' + prefix if prefix else '', uri).encode() for prefix, uri in nsmap.items()
+    ]
+
+
+def _serialise(element, namespace_declarations):
+    """
+    Serialise an element of the worksheet without the namespace declarations that lxml repeats on each element
+    serialised on its own and that are already declared by the root element of the worksheet.
+    """
+    content = etree.tostring(element, with_tail=False)
+    start_tag_end = content.index(b'>')
+    start_tag = content[:start_tag_end]
+    for declaration in namespace_declarations:
+        start_tag = start_tag.replace(declaration, b'', 1)
+    return start_tag + content[start_tag_end:]
+
+
+def _start_tag(element, namespace_declarations=()):
+    """:return: the start tag of the element with its attributes"""
+    empty_element = etree.Element(element.tag, dict(element.attrib), nsmap=element.nsmap)
+    # An empty element is serialised as <tag .../>
+    return _serialise(empty_element, namespace_declarations)[:-2] + b'>'
+
+
+def _patch_dimension(dimension, max_row, max_column):
+    if not dimension.get('ref'):
+        return
+    min_col, min_row, max_col, max_row_declared = range_boundaries(dimension.get('ref'))
+    max_col = max(max_col or 1, max_column)
+    max_row_declared = max(max_row_declared or 1, max_row)
+    dimension.set('ref', '{0}{1}:{2}{3}'.format(
+        get_column_letter(min_col or 1), min_row or 1, get_column_letter(max_col), max_row_declared
+    ))
+
+
+def patch_worksheet(sheet_file, output_file, cells):
+    """
+    Write values in the XML of a worksheet. The worksheet is streamed: each row is written to the output as soon as it
+    is parsed and patched, so that only one row is held in memory.
+    :param sheet_file: file object reading the worksheet part
+    :param output_file: file object where the modified worksheet part is written
+    :param cells: dict of (1-based row index, 1-based column index) to value
+    """
+    cells_per_row = defaultdict(dict)
+    for (row_index, column), value in cells.items():
+        cells_per_row[row_index][column] = value
+    # Rows that only clear cells are not added to the worksheet
+    rows_to_patch = sorted(
+        row_index for row_index, row_cells in cells_per_row.items()
+        if not all(_is_empty(value) for value in row_cells.values())
+    )
+    max_row = max(rows_to_patch, default=0)
+    max_column = max([column for (_, column), value in cells.items() if not _is_empty(value)], default=0)
+    # Rows of the worksheet to patch are consumed in order, the ones left before an existing row are added before it
+    next_row_position = 0
+
+    def write_new_rows(before_row_index=None):
+        nonlocal next_row_position
+        while next_row_position < len(rows_to_patch) and \
+                (before_row_index is None or rows_to_patch[next_row_position] < before_row_index):
+            row_index = rows_to_patch[next_row_position]
+            row_element = etree.Element(ROW_TAG, r=str(row_index), nsmap=root.nsmap)
+            _patch_row(row_element, row_index, cells_per_row[row_index])
+            output_file.write(_serialise(row_element, namespace_declarations))
+            next_row_position += 1
+
+    root = None
+    namespace_declarations = []
+    has_sheet_data = False
+    previous_row_index = 0
+    depth = 0
+    output_file.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+    for event, element in etree.iterparse(sheet_file, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = element
+                namespace_declarations = _namespace_declarations(root.nsmap)
+                output_file.write(_start_tag(element))
+            elif depth == 2 and element.tag == SHEET_DATA_TAG:
+                has_sheet_data = True
+                output_file.write(_start_tag(element, namespace_declarations))
+            continue
+
+        depth -= 1
+        if depth == 0:
+            output_file.write(_end_tag(element))
+        elif depth == 1 and element.tag == SHEET_DATA_TAG:
+            write_new_rows()
+            output_file.write(_end_tag(element))
+            element.clear()
+        elif depth == 1:
+            if element.tag == DIMENSION_TAG:
+                _patch_dimension(element, max_row, max_column)
+            output_file.write(_serialise(element, namespace_declarations))
+            element.clear()
+        elif depth == 2 and element.tag == ROW_TAG and element.getparent().tag == SHEET_DATA_TAG:
+            if not element.get('r'):
+                raise XlsxPatchError('Row without index')
+            row_index = int(element.get('r'))
+            if row_index <= previous_row_index:
+                raise XlsxPatchError('Rows are not sorted')
+            previous_row_index = row_index
+            write_new_rows(row_index)
+            if next_row_position < len(rows_to_patch) and rows_to_patch[next_row_position] == row_index:
+                next_row_position += 1
+            if row_index in cells_per_row:
+                _patch_row(element, row_index, cells_per_row[row_index])
+            output_file.write(_serialise(element, namespace_declarations))
+            element.clear()
+        else:
+            continue
+        # Drop the elements already written so that the memory used does not grow with the worksheet
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    if not has_sheet_data:
+        raise XlsxPatchError('Worksheet without data')
+
+
+def patch_worksheets(xls_filename, output_filename, cells_per_worksheet):
+    """
+    Write values in the worksheets of an Excel file, rewriting only the XML of the modified worksheets.
+    The output is written to a temporary file first so output_filename can be the input Excel file.
+    :param xls_filename: Excel file to modify
+    :param output_filename: path of the modified Excel file
+    :param cells_per_worksheet: dict of worksheet title to dict of (1-based row index, 1-based column index) to value
+    """
+    try:
+        source = LxmlBackend(xls_filename)
+    except LXML_BACKEND_ERRORS as e:
+        raise XlsxPatchError('Cannot read the workbook: {0}'.format(e))
+    patched_parts = dict(
+        (source.sheet_path(title), cells) for title, cells in cells_per_worksheet.items() if cells
+    )
+
+    output_dir = os.path.dirname(os.path.abspath(output_filename))
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix='.xlsx')
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(xls_filename) as source_archive, zipfile.ZipFile(tmp_path, 'w') as output_archive:
+            for info in source_archive.infolist():
+                output_info = zipfile.ZipInfo(info.filename, info.date_time)
+                output_info.compress_type = info.compress_type
+                output_info.external_attr = info.external_attr
+                if info.filename in patched_parts:
+                    output_info.compress_type = zipfile.ZIP_DEFLATED
+                with source_archive.open(info) as part, output_archive.open(output_info, 'w') as output_part:
+                    if info.filename in patched_parts:
+                        patch_worksheet(part, output_part, patched_parts[info.filename])
+                    else:
+                        shutil.copyfileobj(part, output_part)
+        shutil.copymode(xls_filename, tmp_path)
+        os.replace(tmp_path, output_filename)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if isinstance(e, etree.LxmlError):
+            raise XlsxPatchError('Cannot parse the worksheet: {0}'.format(e))
+        raise
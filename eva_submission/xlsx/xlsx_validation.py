@@ -1,115 +1,254 @@
 import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 
 import yaml
 from cerberus import Validator
+from ebi_eva_common_pyutils.config import cfg
 from ebi_eva_common_pyutils.logger import AppLogger
-from ebi_eva_common_pyutils.taxonomy.taxonomy import get_scientific_name_from_ensembl
-from ebi_eva_common_pyutils.variation.assembly_utils import retrieve_genbank_assembly_accessions_from_ncbi
-from requests import HTTPError
+from requests import HTTPError, Timeout
 
 from eva_submission import ROOT_DIR
 from eva_submission.eload_utils import cast_list
-from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader
+from eva_submission.lookup_cache import cached_lookup, ENSEMBL, NCBI
+from eva_submission.offline_resolver import offline_assembly_accessions, offline_scientific_name
+from eva_submission.remote_lookups import get_scientific_name_from_ensembl, \
+    retrieve_genbank_assembly_accessions_from_ncbi
+from eva_submission.xlsx.metadata_table import MetadataTable
+from eva_submission.xlsx.validation_errors import ValidationErrorRecord
+from eva_submission.xlsx.xlsx_parser_eva import get_eva_xlsx_reader
+
+# Number of concurrent network lookups and time in seconds to wait for all of them during the semantic validation.
+# The timeout is also set on each request sent to NCBI and Ensembl.
+DEFAULT_NB_WORKERS = 8
+DEFAULT_LOOKUP_TIMEOUT = 60
+
+VALIDATION_SCHEMA_FILE = os.path.join(ROOT_DIR, 'etc', 'eva_project_validation.yaml')
+
+# Validation schema loaded once per process and row validators compiled once per thread since they hold the state of
+# the last validation
+_validation_schema = None
+_validation_schema_lock = threading.Lock()
+_row_validators = threading.local()
+
+
+def get_validation_schema():
+    """:return: the Cerberus schema of the metadata, loaded once per process"""
+    global _validation_schema
+    with _validation_schema_lock:
+        if _validation_schema is None:
+            with open(VALIDATION_SCHEMA_FILE) as open_file:
+                _validation_schema = yaml.safe_load(open_file)
+        return _validation_schema
+
+
+def get_row_validator(sheet):
+    """
+    :return: the Cerberus Validator of the rows of a worksheet or None if the worksheet is not in the schema
+    """
+    validators = getattr(_row_validators, 'validators', None)
+    if validators is None:
+        validators = _row_validators.validators = {}
+    if sheet not in validators:
+        sheet_schema = get_validation_schema().get(sheet)
+        validators[sheet] = None
+        if sheet_schema:
+            validators[sheet] = Validator(sheet_schema['schema']['schema'], allow_unknown=True)
+    return validators[sheet]
 
 
 class EvaXlsxValidator(AppLogger):
 
     def __init__(self, metadata_file):
         self.metadata_file = metadata_file
-        self.reader = EvaXlsxReader(metadata_file)
-        self.metadata = {}
-        for worksheet in self.reader.reader.valid_worksheets():
-            self.metadata[worksheet] = self.reader._get_all_rows(worksheet)
-
+        self.reader = get_eva_xlsx_reader(metadata_file)
+        # Worksheets are only parsed when a validation step first needs them
+        self.metadata = self.reader.metadata
         self.error_list = []
+        # Structured description of each error in error_list, see validation_errors
+        self.error_records = []
 
     def validate(self):
         self.cerberus_validation()
         self.complex_validation()
         self.semantic_validation()
 
-    def cerberus_validation(self):
+    def cerberus_validation(self, max_errors_per_field=None):
         """
         Leverage cerberus validation to check the format of the metadata.
+        Each worksheet is validated one row at a time against the schema of its rows so that only the errors are kept.
         This function adds error statements to the errors attribute
+        :param max_errors_per_field: maximum number of errors reported for each field of a worksheet in error_list.
+        All the errors are still added to error_records. Defaults to "metadata_validation" > "max_errors_per_field" in
+        the configuration or to no limit.
         """
-        config_file = os.path.join(ROOT_DIR, 'etc', 'eva_project_validation.yaml')
-        with open(config_file) as open_file:
-            validation_schema = yaml.safe_load(open_file)
-        validator = Validator(validation_schema)
-        validator.allow_unknown = True
-        validator.validate(self.metadata)
-        for sheet in validator.errors:
-            for error1 in validator.errors[sheet]:
-                for data_pos in error1:
-                    # data_pos is 0 based position in the data that was provided to cerberus
-                    # Convert this position to the excel row number
-                    row_num = data_pos + self.reader.reader.base_row_offset(sheet) + 1
-                    for error2 in error1[data_pos]:
-                        for field_name in error2:
-                            for error3 in error2[field_name]:
-                                self.error_list.append(
-                                    f'In Sheet {sheet}, Row {row_num}, field {field_name}: {error3}'
-                                )
+        if max_errors_per_field is None:
+            max_errors_per_field = cfg.query('metadata_validation', 'max_errors_per_field')
+        for sheet in self.metadata:
+            validator = get_row_validator(sheet)
+            if validator is None:
+                continue
+            nb_errors_per_field = defaultdict(int)
+            for row in self.metadata[sheet]:
+                # The schema has no normalisation rule so the copy of the row made by the normalisation is skipped
+                if validator.validate(row, normalize=False):
+                    continue
+                row_num = row.get('row_num')
+                for field_name, errors in validator.errors.items():
+                    # The error tree lists the rules that failed in the same order as the messages
+                    rules = [error.rule for error in validator.document_error_tree[field_name].errors]
+                    for error, rule in zip(errors, rules):
+                        self.error_records.append(ValidationErrorRecord(sheet, row_num, field_name, rule, error))
+                        nb_errors_per_field[field_name] += 1
+                        if max_errors_per_field is None or nb_errors_per_field[field_name] <= max_errors_per_field:
+                            self.error_list.append(f'In Sheet {sheet}, Row {row_num}, field {field_name}: {error}')
+            for field_name, nb_errors in nb_errors_per_field.items():
+                if max_errors_per_field is not None and nb_errors > max_errors_per_field:
+                    self.error_list.append(
+                        f'In Sheet {sheet}, field {field_name}: {nb_errors - max_errors_per_field} more errors '
+                        f'not reported'
+                    )
 
     def complex_validation(self):
         """
         More complex validation steps that cannot be expressed in Cerberus
         This function adds error statements to the errors attribute
         """
-        analysis_aliases = [analysis_row['Analysis Alias'] for analysis_row in self.metadata['Analysis']]
-        self.same_set(analysis_aliases, [sample_row['Analysis Alias'] for sample_row in self.metadata['Sample']], 'Analysis Alias', 'Samples')
-        self.same_set(analysis_aliases, [file_row['Analysis Alias'] for file_row in self.metadata['Files']], 'Analysis Alias', 'Files')
-
-        project_titles = [analysis_row['Project Title'] for analysis_row in self.metadata['Project']]
-        self.same_set(project_titles, [analysis_row['Project Title'] for analysis_row in self.metadata['Analysis']], 'Project Title', 'Analysis')
-
-        for row in self.metadata['Sample']:
-            self.group_of_fields_required(
-                'Sample', row,
-                ['Analysis Alias', 'Sample Accession', 'Sample ID'],
-                ['Analysis Alias', 'Sample Name', 'Title', 'Tax Id', 'Scientific Name']
-            )
+        project = MetadataTable(self.metadata['Project'])
+        analysis = MetadataTable(self.metadata['Analysis'])
+        samples = MetadataTable(self.metadata['Sample'])
+        files = MetadataTable(self.metadata['Files'])
+
+        analysis_aliases = analysis.column('Analysis Alias')
+        self.same_set(analysis_aliases, samples.column('Analysis Alias'), 'Analysis Alias', 'Samples')
+        self.same_set(analysis_aliases, files.column('Analysis Alias'), 'Analysis Alias', 'Files')
+
+        self.same_set(project.column('Project Title'), analysis.column('Project Title'), 'Project Title', 'Analysis')
+
+        self.groups_of_fields_required(
+            'Sample', samples,
+            ['Analysis Alias', 'Sample Accession', 'Sample ID'],
+            ['Analysis Alias', 'Sample Name', 'Title', 'Tax Id', 'Scientific Name']
+        )
 
     def semantic_validation(self):
         """
         Validation of the data that involve checking its meaning
         This function adds error statements to the errors attribute
+        The lookups are run concurrently but the errors are added in the order of the sorted references then of the
+        sorted taxonomy/scientific name pairs. Lookups that do not complete in time are reported as errors but other
+        network failures are raised as the metadata could not be checked.
         """
-        # Check if the references can be retrieved
-        references = set([row['Reference'] for row in self.metadata['Analysis'] if row['Reference']])
-        for reference in references:
-            accessions = retrieve_genbank_assembly_accessions_from_ncbi(reference)
-            if len(accessions) == 0:
-                self.error_list.append(f'In Analysis, Reference {reference} did not resolve to any accession')
-            elif len(accessions) > 1:
-                self.error_list.append(f'In Analysis, Reference {reference} resolve to more than one accession: {accessions}')
-
-        # Check taxonomy scientific name pair
-        taxid_and_species_list = set([(row['Tax Id'], row['Scientific Name']) for row in self.metadata['Sample'] if row['Tax Id']])
-        for taxid, species in taxid_and_species_list:
-            try:
-                scientific_name = get_scientific_name_from_ensembl(int(taxid))
-                if species != scientific_name:
-                    self.error_list.append(
-                        f'In Samples, Taxonomy {taxid} and scientific name {species} are inconsistent')
-            except ValueError as e:
-                self.error(str(e))
-                self.error_list.append(str(e))
-            except HTTPError as e:
-                self.error(str(e))
-                self.error_list.append(str(e))
+        references = sorted(set([row['Reference'] for row in self.metadata['Analysis'] if row['Reference']]))
+        taxid_and_species_list = sorted(
+            set([(row['Tax Id'], row['Scientific Name']) for row in self.metadata['Sample'] if row['Tax Id']]),
+            key=lambda taxid_and_species: (str(taxid_and_species[0]), str(taxid_and_species[1]))
+        )
+        nb_workers = cfg.query('semantic_validation', 'nb_workers', ret_default=DEFAULT_NB_WORKERS)
+        timeout = cfg.query('semantic_validation', 'timeout', ret_default=DEFAULT_LOOKUP_TIMEOUT)
+
+        executor = ThreadPoolExecutor(max_workers=nb_workers)
+        try:
+            reference_futures = [
+                (reference, executor.submit(self._get_assembly_accessions, reference, timeout))
+                for reference in references
+            ]
+            taxonomy_futures = [
+                (taxid, species, executor.submit(self._get_scientific_name, taxid, timeout))
+                for taxid, species in taxid_and_species_list
+            ]
+            futures = [future for _, future in reference_futures] + [future for _, _, future in taxonomy_futures]
+            # A single deadline for all the lookups, measured from their submission. The ones still waiting for a
+            # worker are cancelled and the ones running stop at the timeout of their requests.
+            _, not_done = wait(futures, timeout=timeout)
+            for future in not_done:
+                future.cancel()
+
+            # Check if the references can be retrieved
+            for reference, future in reference_futures:
+                lookup_description = f'In Analysis, Reference {reference}'
+                if future in not_done:
+                    self._add_timeout_error(lookup_description, timeout, 'Analysis', 'Reference')
+                    continue
+                try:
+                    accessions = future.result()
+                except Timeout:
+                    self._add_timeout_error(lookup_description, timeout, 'Analysis', 'Reference')
+                    continue
+                if len(accessions) == 0:
+                    self._add_error(
+                        f'In Analysis, Reference {reference} did not resolve to any accession',
+                        sheet='Analysis', field='Reference', rule='reference_accession'
+                    )
+                elif len(accessions) > 1:
+                    self._add_error(
+                        f'In Analysis, Reference {reference} resolve to more than one accession: {accessions}',
+                        sheet='Analysis', field='Reference', rule='reference_accession'
+                    )
+
+            # Check taxonomy scientific name pair
+            for taxid, species, future in taxonomy_futures:
+                lookup_description = f'In Samples, Taxonomy {taxid}'
+                if future in not_done:
+                    self._add_timeout_error(lookup_description, timeout, 'Sample', 'Tax Id')
+                    continue
+                try:
+                    scientific_name = future.result()
+                    if species != scientific_name:
+                        self._add_error(
+                            f'In Samples, Taxonomy {taxid} and scientific name {species} are inconsistent',
+                            sheet='Sample', field='Scientific Name', rule='scientific_name'
+                        )
+                except Timeout:
+                    self._add_timeout_error(lookup_description, timeout, 'Sample', 'Tax Id')
+                except (ValueError, HTTPError) as e:
+                    self.error(str(e))
+                    self._add_error(str(e), sheet='Sample', field='Tax Id', rule='taxonomy_lookup')
+        finally:
+            # Do not wait for the lookups that timed out
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _get_assembly_accessions(reference, timeout):
+        return offline_assembly_accessions(reference) or cached_lookup(
+            NCBI, partial(retrieve_genbank_assembly_accessions_from_ncbi, timeout=timeout), reference
+        )
+
+    @staticmethod
+    def _get_scientific_name(taxid, timeout):
+        return offline_scientific_name(int(taxid)) or cached_lookup(
+            ENSEMBL, partial(get_scientific_name_from_ensembl, timeout=timeout), int(taxid)
+        )
+
+    def _add_timeout_error(self, lookup_description, timeout, sheet, field):
+        error = f'{lookup_description} could not be checked: the lookup did not complete within {timeout} seconds'
+        self.error(error)
+        self._add_error(error, sheet=sheet, field=field, rule='lookup_timeout')
+
+    def _add_error(self, error, sheet=None, row=None, field=None, rule=None, message=None):
+        """Add the error statement to error_list and its structured record to error_records"""
+        self.error_list.append(error)
+        self.error_records.append(ValidationErrorRecord(sheet, row, field, rule, message or error))
+
+    def groups_of_fields_required(self, sheet_name, table, *args):
+        """Check group_of_fields_required on the rows of a MetadataTable, only formatting the rows that fail"""
+        for index in table.rows_missing_groups(*args):
+            self.group_of_fields_required(sheet_name, table.rows[index], *args)
 
     def group_of_fields_required(self, sheet_name, row, *args):
         if not any(
             [all(row.get(key) for key in group) for group in args]
         ):
-            self.error_list.append(
+            groups = ' or '.join([', '.join(group) for group in args])
+            self._add_error(
                 'In %s, row %s, one of this group of fields must be filled: %s -- %s' % (
-                    sheet_name, row.get('row_num'),
-                    ' or '.join([', '.join(group) for group in args]),
+                    sheet_name, row.get('row_num'), groups,
                     ' -- '.join((', '.join(('%s:%s' % (key, row[key]) for key in group)) for group in args)),
-                )
+                ),
+                sheet=sheet_name, row=row.get('row_num'), rule='group_of_fields_required',
+                message='one of this group of fields must be filled: ' + groups
             )
 
     def same_set(self, list1, list2, list1_desc, list2_desc):
@@ -121,4 +260,4 @@ class EvaXlsxValidator(AppLogger):
                 errors.append('%s present in %s not in %s' % (','.join(list1_list2), list1_desc, list2_desc))
             if list2_list1:
                 errors.append('%s present in %s not in %s' % (','.join(list2_list1), list2_desc, list1_desc))
-            self.error_list.append('Check %s vs %s: %s' % (list1_desc, list2_desc, ' -- '.join(errors)))
+            self._add_error('Check %s vs %s: %s' % (list1_desc, list2_desc, ' -- '.join(errors)), rule='same_set')
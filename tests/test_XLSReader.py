@@ -1,9 +1,19 @@
 import os
+import re
+import shutil
+import zipfile
+from datetime import datetime
 from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from lxml import etree
+from openpyxl import Workbook
 
 from eva_submission import ROOT_DIR
+from eva_submission.xlsx.xlsx_backends import BACKENDS, LxmlBackend, OpenpyxlBackend
 from eva_submission.xlsx.xlsx_parser import XlsxReader
-from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader
+from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader, EvaXlsxWriter, get_eva_xlsx_reader, \
+    release_eva_xlsx_reader
 
 
 class TestEvaXlsxReader(TestCase):
@@ -16,6 +26,16 @@ class TestEvaXlsxReader(TestCase):
         assert len(rows) == 1
         assert rows[0]['Analysis Title'] == 'Greatest analysis ever'
 
+    def test_peek(self):
+        reader = EvaXlsxReader(self.metadata_file)
+        summary = reader.peek()
+        assert summary['project_title'] == 'Greatest project ever'
+        assert summary['references'] == ['GCA_000001405.1']
+        assert summary['row_counts']['Analysis'] == 1
+        assert summary['row_counts']['Sample'] == 100
+        # The samples were counted without being parsed
+        assert 'Sample' not in reader._worksheet_rows
+
 
 class TestXlsxReader(TestCase):
 
@@ -61,3 +81,160 @@ class TestXlsxReader(TestCase):
             'row_num': 2
         }
 
+    def test_iter_worksheet(self):
+        rows = list(self.xls_reader.iter_worksheet('Sample'))
+        assert len(rows) == 100
+        assert [row['row_num'] for row in rows] == list(range(4, 104))
+        assert rows[0]['Sample Name'] == '1'
+
+    def test_iterate_active_worksheet(self):
+        self.xls_reader.active_worksheet = 'Sample'
+        first_row = self.xls_reader.next()
+        remaining_rows = list(self.xls_reader)
+        assert first_row['row_num'] == 4
+        assert len(remaining_rows) == 99
+        assert remaining_rows[0]['row_num'] == 5
+
+    def test_column_plans(self):
+        self.xls_reader.valid_worksheets()
+        column_plan = self.xls_reader.column_plans['Sample']
+        headers = [header for _, header, _ in column_plan]
+        assert headers == ['Analysis Alias', 'Sample ID', 'Sample Accession', 'Sampleset Accession', 'Sample Name', 'Title']
+        for column_index, header, cast in column_plan:
+            assert self.xls_reader.headers['Sample'][column_index] == header
+
+
+class TestSharedEvaXlsxReader(TestCase):
+
+    metadata_file = os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata.xlsx')
+    metadata_copy = os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata_shared.xlsx')
+
+    def setUp(self):
+        shutil.copyfile(self.metadata_file, self.metadata_copy)
+
+    def tearDown(self):
+        release_eva_xlsx_reader(self.metadata_copy)
+        os.remove(self.metadata_copy)
+
+    def test_get_eva_xlsx_reader(self):
+        reader = get_eva_xlsx_reader(self.metadata_copy)
+        assert get_eva_xlsx_reader(self.metadata_copy) is reader
+        assert len(reader.samples) == 100
+
+        writer = EvaXlsxWriter(self.metadata_copy)
+        writer.set_project(dict(reader.project, **{'Project Title': 'Updated project title'}))
+        writer.save()
+
+        new_reader = get_eva_xlsx_reader(self.metadata_copy)
+        assert new_reader is not reader
+        assert new_reader.project_title == 'Updated project title'
+
+
+class TestXlsxBackends(TestCase):
+
+    conf = os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')
+    metadata_file = os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata.xlsx')
+    generated_file = os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata_backends.xlsx')
+
+    def tearDown(self):
+        if os.path.exists(self.generated_file):
+            os.remove(self.generated_file)
+
+    def assert_same_rows(self, xls_filename):
+        openpyxl_reader = XlsxReader(xls_filename, self.conf, backend='openpyxl')
+        lxml_reader = XlsxReader(xls_filename, self.conf, backend='lxml')
+        assert isinstance(lxml_reader.backend, LxmlBackend)
+        assert lxml_reader.valid_worksheets() == openpyxl_reader.valid_worksheets()
+        assert lxml_reader.headers == openpyxl_reader.headers
+        for worksheet in openpyxl_reader.valid_worksheets():
+            assert list(lxml_reader.iter_worksheet(worksheet)) == list(openpyxl_reader.iter_worksheet(worksheet))
+
+    def test_same_rows_as_openpyxl(self):
+        self.assert_same_rows(self.metadata_file)
+
+    def test_same_values_as_openpyxl(self):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.title = 'Sample'
+        worksheet.cell(row=3, column=1, value='Sample Name')
+        worksheet.cell(row=3, column=2, value='Tax Id')
+        worksheet.cell(row=3, column=3, value='collection_date')
+        worksheet.cell(row=3, column=4, value='Unconfigured column')
+        worksheet.cell(row=3, column=5, value='environmental_sample')
+        worksheet.cell(row=4, column=1, value=1)
+        worksheet.cell(row=4, column=2, value=9606)
+        worksheet.cell(row=4, column=3, value=datetime(2020, 11, 1, 10, 37))
+        worksheet.cell(row=4, column=4, value='ignored')
+        worksheet.cell(row=4, column=5, value=True)
+        # Leave some empty rows between the samples
+        worksheet.cell(row=8, column=1, value='S2')
+        worksheet.cell(row=8, column=2, value=9606.5)
+        worksheet.cell(row=8, column=5, value='=A8&"_env"')
+        workbook.save(self.generated_file)
+
+        self.assert_same_rows(self.generated_file)
+        rows = list(XlsxReader(self.generated_file, self.conf).iter_worksheet('Sample'))
+        assert [(row['row_num'], row['Sample Name'], row['collection_date']) for row in rows] == [
+            (4, '1', datetime(2020, 11, 1, 10, 37)),
+            (8, 'S2', None)
+        ]
+
+    def test_fall_back_to_openpyxl(self):
+        with patch.dict(BACKENDS, {'lxml': Mock(side_effect=ValueError)}):
+            reader = XlsxReader(self.metadata_file, self.conf)
+        assert isinstance(reader.backend, OpenpyxlBackend)
+        assert len(list(reader.iter_worksheet('Sample'))) == 100
+
+    def test_fall_back_to_openpyxl_while_parsing(self):
+        iter_rows = LxmlBackend.iter_rows
+
+        def iter_rows_failing_after_10_rows(backend, title, min_row, columns=None):
+            for nb_rows, values in enumerate(iter_rows(backend, title, min_row, columns)):
+                if nb_rows == 10:
+                    raise etree.XMLSyntaxError('Malformed row', None, 0, 0)
+                yield values
+
+        with patch.object(LxmlBackend, 'iter_rows', iter_rows_failing_after_10_rows):
+            reader = XlsxReader(self.metadata_file, self.conf)
+            assert isinstance(reader.backend, LxmlBackend)
+            rows = list(reader.iter_worksheet('Sample'))
+        assert isinstance(reader.backend, OpenpyxlBackend)
+        assert rows == list(XlsxReader(self.metadata_file, self.conf, backend='openpyxl').iter_worksheet('Sample'))
+
+    def test_archive_closed_after_reading(self):
+        zip_file = zipfile.ZipFile
+        archives = []
+
+        def open_archive(*args, **kwargs):
+            archives.append(zip_file(*args, **kwargs))
+            return archives[-1]
+
+        with patch('zipfile.ZipFile', side_effect=open_archive):
+            reader = XlsxReader(self.metadata_file, self.conf, backend='lxml')
+            assert len(list(reader.iter_worksheet('Sample'))) == 100
+        assert archives
+        assert all(archive.fp is None for archive in archives)
+
+    def test_close_backend(self):
+        with patch.object(OpenpyxlBackend, 'close') as mock_close:
+            with XlsxReader(self.metadata_file, self.conf, backend='openpyxl') as reader:
+                assert len(list(reader.iter_worksheet('Sample'))) == 100
+            mock_close.assert_called_once_with()
+
+    def test_empty_worksheet_without_dimension(self):
+        workbook = Workbook()
+        workbook.active.title = 'Sample'
+        workbook.save(self.generated_file)
+        # Remove the dimension of the worksheets like some tools do when writing xlsx files
+        with zipfile.ZipFile(self.generated_file) as archive:
+            parts = [(info, archive.read(info)) for info in archive.infolist()]
+        with zipfile.ZipFile(self.generated_file, 'w') as archive:
+            for info, content in parts:
+                if info.filename.startswith('xl/worksheets/'):
+                    content = re.sub(b'<dimension [^>]*/>', b'', content)
+                archive.writestr(info, content)
+
+        reader = XlsxReader(self.generated_file, self.conf, backend='lxml')
+        assert reader.backend.max_row('Sample') == 0
+        assert reader.valid_worksheets() == []
+        assert isinstance(reader.backend, LxmlBackend)
@@ -1,19 +1,30 @@
+import datetime
 import os
+import shutil
+import zipfile
 from unittest import TestCase
 
 from eva_submission import ROOT_DIR
-from eva_submission.xlsx.xlsx_parser_eva import XlsxWriter, EvaXlsxReader
+from eva_submission.xlsx.xlsx_backends import LxmlBackend
+from eva_submission.xlsx.xlsx_parser import XlsxReader
+from eva_submission.xlsx.xlsx_parser_eva import XlsxWriter, EvaXlsxReader, EvaXlsxWriter
+from eva_submission.xlsx.xlsx_patcher import patch_worksheets, XlsxPatchError
 
 
 class TestXlsxWriter(TestCase):
 
     metadata_file = os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata.xlsx')
+    metadata_copy = os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata_copy.xlsx')
     eva_xls_reader_conf = os.path.join(ROOT_DIR, 'tests', 'resources', 'test_metadata_fields.yaml')
 
     def setUp(self):
         self.xls_writer = XlsxWriter(self.metadata_file, self.eva_xls_reader_conf)
         self.reader = EvaXlsxReader(self.metadata_file)
 
+    def tearDown(self):
+        if os.path.exists(self.metadata_copy):
+            os.remove(self.metadata_copy)
+
     def test_edit_row(self):
         self.xls_writer.active_worksheet = 'Sample'
         for sample_num in range(1, 101):
@@ -38,5 +49,99 @@ class TestXlsxWriter(TestCase):
             } for sample_num in range(1, 101)
         ]
         self.xls_writer.set_rows(rows)
+        # The rows provided are left unchanged
+        assert all('row_num' not in row for row in rows)
         self.xls_writer.save(os.path.join(os.path.dirname(__file__), 'resources', 'metadata_copy.xlsx'))
 
+
+    def test_column_map(self):
+        column_map = self.xls_writer.column_map('Sample')
+        assert column_map['Sample ID'] == self.xls_writer.headers['Sample'].index('Sample ID') + 1
+        assert 'Sample Accession' in column_map
+        with self.assertRaises(ValueError):
+            self.xls_writer.column_map('Files')
+
+    def test_save_only_rewrites_modified_worksheets(self):
+        self.xls_writer.active_worksheet = 'Sample'
+        self.xls_writer.edit_rows([
+            {'Analysis Alias': 'GAE', 'Sample ID': 'S' + str(i), 'Sample Accession': ' SAMEA' + str(i), 'row_num': i + 3}
+            for i in range(1, 201)
+        ])
+        self.xls_writer.save(self.metadata_copy)
+
+        sample_sheet = LxmlBackend(self.metadata_file).sheet_path('Sample')
+        with zipfile.ZipFile(self.metadata_file) as original, zipfile.ZipFile(self.metadata_copy) as modified:
+            assert original.namelist() == modified.namelist()
+            for name in original.namelist():
+                if name != sample_sheet:
+                    assert original.read(name) == modified.read(name)
+            assert b'inlineStr' in modified.read(sample_sheet)
+
+        reader = XlsxReader(self.metadata_copy, self.eva_xls_reader_conf)
+        samples = list(reader.iter_worksheet('Sample'))
+        assert len(samples) == 200
+        assert samples[0]['Sample Accession'] == ' SAMEA1'
+        assert samples[199]['Sample ID'] == 'S200'
+        assert samples[199]['row_num'] == 203
+
+    def test_patch_worksheets_adds_rows_in_order(self):
+        sample_sheet = LxmlBackend(self.metadata_file).sheet_path('Sample')
+        patch_worksheets(self.metadata_file, self.metadata_copy, {'Sample': {
+            (2, 1): 'first', (4, 2): 'S4', (500, 3): 'last', (3, 40): 7, (5, 2): ''
+        }})
+        with zipfile.ZipFile(self.metadata_file) as original, zipfile.ZipFile(self.metadata_copy) as modified:
+            original_xml, modified_xml = original.read(sample_sheet), modified.read(sample_sheet)
+        # The rows are written without repeating the namespace declarations of the worksheet
+        assert modified_xml.count(b'xmlns') == original_xml.count(b'xmlns')
+
+        backend = LxmlBackend(self.metadata_copy)
+        self.addCleanup(backend.close)
+        rows = list(backend.iter_rows('Sample', 1))
+        assert len(rows) == 500
+        assert (rows[1][0], rows[3][1], rows[499][2], rows[2][39]) == ('first', 'S4', 'last', 7)
+        assert rows[4][1] is None
+
+    def test_save_with_openpyxl(self):
+        self.xls_writer.active_worksheet = 'Project'
+        project = {'Project Title': 'Title', 'Project Alias': 'Alias', 'Publication(s)': datetime.datetime(2020, 1, 1),
+                   'row_num': 2}
+        with self.assertRaises(XlsxPatchError):
+            patch_worksheets(self.metadata_file, self.metadata_copy, {'Project': {(2, 1): datetime.datetime(2020, 1, 1)}})
+
+        self.xls_writer.edit_row(project)
+        self.xls_writer.save(self.metadata_copy)
+        reader = XlsxReader(self.metadata_copy, self.eva_xls_reader_conf)
+        project_row = next(reader.iter_worksheet('Project'))
+        assert project_row['Project Title'] == 'Title'
+        assert project_row['Publication(s)'] == datetime.datetime(2020, 1, 1)
+
+    def test_save_only_modified_cells(self):
+        shutil.copyfile(self.metadata_file, self.metadata_copy)
+        mtime = os.stat(self.metadata_copy).st_mtime_ns
+        samples = list(XlsxReader(self.metadata_copy, self.eva_xls_reader_conf).iter_worksheet('Sample'))
+
+        xls_writer = XlsxWriter(self.metadata_copy, self.eva_xls_reader_conf)
+        xls_writer.active_worksheet = 'Sample'
+        # Rewriting the same values, with empty strings in place of the empty cells, does not change anything
+        xls_writer.edit_rows([dict((key, '' if value is None else value) for key, value in sample.items())
+                              for sample in samples])
+        assert xls_writer.modified_cells() == {}
+        assert not xls_writer.save(self.metadata_copy)
+        assert os.stat(self.metadata_copy).st_mtime_ns == mtime
+
+        xls_writer.edit_row(dict(samples[1], **{'Sample Accession': 'SAMEA0001'}))
+        sample_accession_column = xls_writer.column_map('Sample')['Sample Accession']
+        assert xls_writer.modified_cells() == {'Sample': {(samples[1]['row_num'], sample_accession_column): 'SAMEA0001'}}
+        assert xls_writer.save(self.metadata_copy)
+        samples = list(XlsxReader(self.metadata_copy, self.eva_xls_reader_conf).iter_worksheet('Sample'))
+        assert samples[1]['Sample Accession'] == 'SAMEA0001'
+
+    def test_eva_writer_skips_unchanged_save(self):
+        shutil.copyfile(self.metadata_file, self.metadata_copy)
+        mtime = os.stat(self.metadata_copy).st_mtime_ns
+        reader = EvaXlsxReader(self.metadata_copy)
+        eva_xls_writer = EvaXlsxWriter(self.metadata_copy)
+        eva_xls_writer.set_project(reader.project)
+        eva_xls_writer.set_analysis(reader.analysis)
+        eva_xls_writer.save()
+        assert os.stat(self.metadata_copy).st_mtime_ns == mtime
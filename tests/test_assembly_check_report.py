@@ -0,0 +1,51 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from eva_submission import ROOT_DIR
+from eva_submission.assembly_check_report import match_rate_histogram, parse_assembly_check_log, \
+    parse_assembly_check_report
+
+
+class TestAssemblyCheckReport(TestCase):
+    resources_folder = os.path.join(ROOT_DIR, 'tests', 'resources', 'validations')
+
+    def test_parse_assembly_check_report(self):
+        report = os.path.join(self.resources_folder, 'mismatch_text_assembly_report.txt')
+        results = parse_assembly_check_report(report, {'Chr14': 20, 'Chr1': 5}, nb_examples=2)
+        assert results['nb_mismatch'] == 14
+        assert results['mismatch_list'] == [
+            "Line 15: Chromosome Chr14, position 7387, reference allele 'T' does not match the reference sequence, "
+            "expected 'C'",
+            "Line 18: Chromosome Chr14, position 8795, reference allele 'A' does not match the reference sequence, "
+            "expected 'G'"
+        ]
+        assert results['nb_contig_with_mismatch'] == 1
+        assert results['mismatches_per_contig'] == {'Chr14': 14}
+        # Chr14 matches for 6 of its 20 variants and Chr1 for all of them
+        histogram = dict(
+            (bin_range['match_rate'], bin_range['nb_contig']) for bin_range in results['match_rate_histogram']
+        )
+        assert histogram['30-40%'] == 1
+        assert histogram['90-100%'] == 1
+        assert sum(histogram.values()) == 2
+        assert 'match_rate_histogram' not in parse_assembly_check_report(report)
+
+    def test_parse_empty_files(self):
+        with tempfile.NamedTemporaryFile() as empty_file:
+            assert parse_assembly_check_report(empty_file.name)['nb_mismatch'] == 0
+            assert parse_assembly_check_log(empty_file.name) == ([], 0, None, None)
+
+    def test_parse_assembly_check_log(self):
+        with tempfile.NamedTemporaryFile('w') as log_file:
+            log_file.write('[info] Number of matches: 18/20\n[error] first error\n[info] not an [error] line\n'
+                           '[error] second error')
+            log_file.flush()
+            assert parse_assembly_check_log(log_file.name) == ([' first error', ' second error'], 2, 18, 20)
+
+    def test_match_rate_histogram(self):
+        histogram = match_rate_histogram({'1': 10}, {'1': 10, '2': 0, '3': 4}, nb_bins=4)
+        assert histogram == [
+            {'match_rate': '0-25%', 'nb_contig': 1}, {'match_rate': '25-50%', 'nb_contig': 0},
+            {'match_rate': '50-75%', 'nb_contig': 0}, {'match_rate': '75-100%', 'nb_contig': 1}
+        ]
@@ -1,10 +1,18 @@
+import copy
 import os
+import shutil
+import threading
 from unittest import TestCase
 from unittest.mock import patch
 
+import yaml
+from ebi_eva_common_pyutils.config import cfg
+
 from eva_submission import ROOT_DIR
 from eva_submission.eload_validation import EloadValidation
+from eva_submission.validation_cache import ValidationCache
 from eva_submission.submission_config import load_config
+from tests.test_vcf_validator_report import create_vcf_validator_db_report
 
 
 class TestEloadValidation(TestCase):
@@ -55,6 +63,217 @@ class TestEloadValidation(TestCase):
         assert nb_error == 8
         assert nb_warning == 1
 
+    def test_parse_vcf_check_db_report(self):
+        db_report = os.path.join(self.validation._get_dir('scratch'), 'failed_file.vcf.errors.1.db')
+        self.addCleanup(os.remove, db_report)
+        create_vcf_validator_db_report(db_report, [
+            ('ebi::vcf::MetaSectionError', 6, 'Error in ALT metadata.', 1),
+            ('ebi::vcf::HeaderSectionError', 7, "A valid 'reference' entry is not listed in the meta section.", 0)
+        ])
+        valid, error_list, nb_error, nb_warning, error_categories = \
+            self.validation.parse_vcf_check_db_report(db_report)
+        assert valid is False
+        assert error_list == ['Line 6: Error in ALT metadata.']
+        assert (nb_error, nb_warning) == (1, 1)
+        assert [category['category'] for category in error_categories] == ['MetaSectionError', 'HeaderSectionError']
+
+    def test_validate_metadata_format(self):
+        # Restore the config of the ELOAD so that it is not modified when it is written back
+        self.addCleanup(setattr, self.validation.eload_cfg, 'content', copy.deepcopy(self.validation.eload_cfg.content))
+        metadata_file = os.path.join(self.resources_folder, 'brokering', 'metadata_sheet_fail.xlsx')
+        self.validation.eload_cfg.set('submission', 'metadata_spreadsheet', value=metadata_file)
+        with patch('eva_submission.eload_validation.EvaXlsxValidator.semantic_validation'):
+            results = self.validation._validate_metadata_format()
+        self.validation.eload_cfg.set('validation', 'metadata_check', value=results)
+        self.addCleanup(os.remove, results['error_file'])
+
+        assert results['pass'] is False
+        assert results['nb_error'] == 3
+        assert 'errors' not in results
+        assert results['error_summary'][0] == {
+            'sheet': 'Analysis', 'field': 'Analysis Alias', 'rule': 'nullable', 'message': 'null value not allowed',
+            'nb_error': 1, 'rows': '4', 'example_rows': [4]
+        }
+        with open(results['error_file']) as open_file:
+            assert len(open_file.readlines()) == 4
+        assert 'In Sheet Analysis, field Analysis Alias: null value not allowed (1 error(s), rows 4)' in \
+               self.validation._metadata_check_report()
+
+    def _set_submission_files(self, nb_vcf_files):
+        # Restore the config of the ELOAD so that it is not modified when it is written back
+        self.addCleanup(setattr, self.validation.eload_cfg, 'content', copy.deepcopy(self.validation.eload_cfg.content))
+        vcf_files = []
+        for file_name in ['file%s.vcf' % index for index in range(nb_vcf_files)] + ['genome.fa', 'assembly_report.txt']:
+            file_path = os.path.join(self.validation._get_dir('scratch'), file_name)
+            with open(file_path, 'w') as open_file:
+                open_file.write('##fileformat=VCFv4.1\n##source=%s\n' % file_name)
+            self.addCleanup(os.remove, file_path)
+            vcf_files.append(file_path)
+        assembly_fasta, assembly_report = vcf_files[-2:]
+        vcf_files = vcf_files[:-2]
+        self.validation.eload_cfg.set('submission', 'vcf_files', value=vcf_files)
+        self.validation.eload_cfg.set('submission', 'assembly_fasta', value=assembly_fasta)
+        self.validation.eload_cfg.set('submission', 'assembly_report', value=assembly_report)
+        self.validation.eload_cfg.set('submission', 'metadata_spreadsheet',
+                                      value=os.path.join(self.resources_folder, 'metadata.xlsx'))
+        return vcf_files
+
+    def test_incremental_metadata_check(self):
+        self._set_submission_files(1)
+
+        with patch.object(self.validation, '_validate_metadata_format', return_value={'pass': True}) as m_run:
+            self.validation.validate(['metadata_check'], incremental=True)
+            self.validation.validate(['metadata_check'], incremental=True)
+            m_run.assert_called_once_with()
+            assert self.validation.eload_cfg.query('validation', 'metadata_check', 'pass') is True
+            # Without incremental validation the task always runs
+            self.validation.validate(['metadata_check'])
+            assert m_run.call_count == 2
+
+    def test_concurrent_validation(self):
+        self._set_submission_files(1)
+        metadata_check_started = threading.Event()
+
+        def run_workflow_validation_tasks(previous_results, incremental):
+            # The metadata check runs while the validation workflow is running
+            assert metadata_check_started.wait(timeout=10)
+            return [], None, {}
+
+        def validate_metadata_format():
+            metadata_check_started.set()
+            return {'pass': True}
+
+        with patch.object(self.validation, '_run_workflow_validation_tasks', side_effect=run_workflow_validation_tasks), \
+                patch.object(self.validation, '_validate_metadata_format', side_effect=validate_metadata_format), \
+                patch.object(self.validation, '_collect_validation_worklflow_results') as m_collect:
+            self.validation.validate(['metadata_check', 'vcf_check'], concurrent=True)
+        assert m_collect.call_args[0][:2] == (None, [])
+        assert self.validation.eload_cfg.query('validation', 'metadata_check', 'pass') is True
+
+    def test_incremental_workflow_validation(self):
+        vcf_files = self._set_submission_files(3)
+        previous_results = {}
+        for validation_task in ('vcf_check', 'assembly_check'):
+            previous_results[validation_task] = {'files': dict(
+                (os.path.basename(vcf_file), {
+                    'nb_error': 1, 'nb_mismatch': 0,
+                    'fingerprint': self.validation._task_fingerprint(validation_task, vcf_file)
+                })
+                for vcf_file in vcf_files
+            )}
+        assert self.validation._vcf_files_with_changed_inputs(previous_results) == []
+
+        with open(vcf_files[1], 'a') as open_file:
+            open_file.write('##source=test\n')
+        self.validation._file_fingerprints = {}
+        assert self.validation._vcf_files_with_changed_inputs(previous_results) == [vcf_files[1]]
+
+        # The results of the files that were not checked again are kept
+        self.validation._collect_validation_worklflow_results(None, [], previous_results)
+        assert self.validation.eload_cfg.query('validation', 'vcf_check', 'files') == previous_results['vcf_check']['files']
+        assert self.validation.eload_cfg['validation']['assembly_check']['pass'] is False
+
+    def test_failed_process_is_checked_again(self):
+        vcf_files = self._set_submission_files(1)
+        self.validation._incremental = True
+        # The validation workflow did not produce any output
+        self.validation._collect_validation_worklflow_results(self.validation.eload_dir, vcf_files)
+        previous_results = copy.deepcopy(self.validation.eload_cfg.query('validation'))
+        for validation_task in ('vcf_check', 'assembly_check'):
+            file_results = previous_results[validation_task]['files']['file0.vcf']
+            assert file_results['error_list'] == ['Process failed']
+            assert file_results['fingerprint'] is None
+        assert self.validation._vcf_files_with_changed_inputs(previous_results) == vcf_files
+
+        # Failed results recorded with a fingerprint are checked again as well
+        for validation_task in ('vcf_check', 'assembly_check'):
+            previous_results[validation_task]['files']['file0.vcf']['fingerprint'] = \
+                self.validation._task_fingerprint(validation_task, vcf_files[0])
+        assert self.validation._vcf_files_with_changed_inputs(previous_results) == vcf_files
+
+    def test_fingerprints_only_computed_when_used(self):
+        self._set_submission_files(1)
+        with patch.object(self.validation, '_validate_metadata_format', return_value={'pass': True}), \
+                patch.object(self.validation, '_task_fingerprint') as m_fingerprint:
+            self.validation.validate(['metadata_check'])
+            m_fingerprint.assert_not_called()
+            assert self.validation.eload_cfg.query('validation', 'metadata_check', 'fingerprint') is None
+            self.validation.validate(['metadata_check'], incremental=True)
+            m_fingerprint.assert_called_once_with('metadata_check', None)
+
+    def test_validation_cache(self):
+        vcf_files = self._set_submission_files(2)
+        cache_dir = os.path.join(self.resources_folder, 'validation_cache')
+        self.addCleanup(shutil.rmtree, cache_dir)
+        validations_folder = os.path.join(self.resources_folder, 'validations')
+        outputs_content = {
+            'vcf_check': {'log': 'failed_file.vcf.errors.txt', 'text_report': 'failed_file.vcf.errors.txt',
+                          'db_report': 'failed_file.vcf.errors.txt'},
+            'assembly_check': {'log': 'failed_assembly_check.log', 'valid_vcf': 'failed_assembly_check.log',
+                               'text_report': 'mismatch_text_assembly_report.txt'}
+        }
+
+        with patch('eva_submission.eload_validation.get_validation_cache', return_value=ValidationCache(cache_dir)), \
+                patch('eva_submission.eload_validation.tool_version', return_value='1.0'), \
+                patch('eva_submission.eload_validation.command_utils.run_command_with_output') as m_run:
+            # The workflow only produces the outputs of the first file, which are stored in the cache once collected
+            self.addCleanup(os.remove, os.path.join(self.validation.eload_dir, 'validation_confg_file.yaml'))
+            output_dir = self.validation._run_validation_workflow(vcf_files)
+            self.addCleanup(shutil.rmtree, output_dir)
+            assert m_run.call_count == 1
+            for validation_task, outputs in self.validation._workflow_outputs(output_dir, vcf_files[0]).items():
+                for name, output in outputs.items():
+                    os.makedirs(os.path.dirname(output), exist_ok=True)
+                    shutil.copyfile(os.path.join(validations_folder, outputs_content[validation_task][name]), output)
+            self.validation._collect_validation_worklflow_results(output_dir, vcf_files)
+            first_results = self.validation.eload_cfg.query('validation', 'vcf_check', 'files', 'file0.vcf')
+            assert first_results['nb_error'] == 8
+
+            # Only the second file is sent to the workflow, the results of the first are restored from the cache
+            output_dir = self.validation._run_validation_workflow(vcf_files)
+            self.addCleanup(shutil.rmtree, output_dir)
+            assert m_run.call_count == 2
+            with open(os.path.join(self.validation.eload_dir, 'validation_confg_file.yaml')) as open_file:
+                assert yaml.safe_load(open_file)['vcf_files'] == vcf_files[1:]
+            self.validation._collect_validation_worklflow_results(output_dir, vcf_files)
+            assert self.validation.eload_cfg.query('validation', 'vcf_check', 'files', 'file0.vcf') == first_results
+            assert self.validation.eload_cfg.query('validation', 'vcf_check', 'files', 'file1.vcf')['error_list'] == \
+                ['Process failed']
+
+        for validation_task in ('vcf_check', 'assembly_check'):
+            for file_results in self.validation.eload_cfg.query('validation', validation_task, 'files').values():
+                for key, value in file_results.items():
+                    if key.endswith(('_log', '_report', '_vcf')) and value:
+                        os.remove(value)
+
+    def test_precheck_excludes_files_from_workflow(self):
+        vcf_files = self._set_submission_files(2)
+        with open(vcf_files[0], 'w') as open_file:
+            open_file.write('##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+        self.addCleanup(os.remove, os.path.join(self.validation.eload_dir, 'validation_confg_file.yaml'))
+
+        with patch('eva_submission.eload_validation.command_utils.run_command_with_output'):
+            self.validation.validate(['vcf_check', 'assembly_check'])
+        # Only the file passing the pre-check is sent to the validation workflow
+        with open(os.path.join(self.validation.eload_dir, 'validation_confg_file.yaml')) as open_file:
+            assert yaml.safe_load(open_file)['vcf_files'] == vcf_files[:1]
+        file_results = self.validation.eload_cfg.query('validation', 'vcf_check', 'files', 'file1.vcf')
+        assert file_results['error_list'] == ['The header line starting with #CHROM is missing']
+        assert file_results['precheck']['compression'] is None
+        assert file_results['fingerprint'] is None
+        assert self.validation.eload_cfg.query('validation', 'vcf_check', 'files', 'file0.vcf')['precheck'][
+            'nb_variant'] == 0
+        assert self.validation.eload_cfg.query('validation', 'assembly_check', 'files', 'file1.vcf')['error_list'] == \
+            ['Not checked: the VCF file failed the pre-check']
+
+        # Without the pre-check all the files are sent to the validation workflow
+        with patch('eva_submission.eload_validation.command_utils.run_command_with_output'), \
+                patch.object(cfg, 'content', dict(cfg.content, vcf_precheck={'skip': True})):
+            self.validation.validate(['vcf_check', 'assembly_check'])
+        with open(os.path.join(self.validation.eload_dir, 'validation_confg_file.yaml')) as open_file:
+            assert yaml.safe_load(open_file)['vcf_files'] == vcf_files
+        assert 'precheck' not in self.validation.eload_cfg.query('validation', 'vcf_check', 'files', 'file1.vcf')
+
     def test_report(self):
         expected_report = '''Validation performed on 2020-11-01 10:37:54.755607
 Metadata check: PASS
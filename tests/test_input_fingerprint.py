@@ -0,0 +1,34 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from eva_submission import ROOT_DIR
+from eva_submission.input_fingerprint import file_fingerprint, same_inputs, tool_version
+
+
+class TestInputFingerprint(TestCase):
+    vcf_file = os.path.join(ROOT_DIR, 'tests', 'resources', 'test.vcf')
+
+    def test_file_fingerprint(self):
+        fingerprint = file_fingerprint(self.vcf_file)
+        assert fingerprint['size'] == os.path.getsize(self.vcf_file)
+        assert len(fingerprint['md5']) == 32
+        # The md5 is not computed again when the size and modification time are the same
+        with patch('eva_submission.input_fingerprint.md5_of_file') as m_md5:
+            assert file_fingerprint(self.vcf_file, fingerprint) == fingerprint
+            m_md5.assert_not_called()
+        assert file_fingerprint('/path/to/missing.vcf') is None
+
+    def test_same_inputs(self):
+        fingerprint = {'files': {'a.vcf': {'size': 1, 'mtime': 1, 'md5': 'abc'}}, 'tools': {'vcf_validator': '0.9'}}
+        touched = {'files': {'a.vcf': {'size': 1, 'mtime': 2, 'md5': 'abc'}}, 'tools': {'vcf_validator': '0.9'}}
+        changed = {'files': {'a.vcf': {'size': 1, 'mtime': 2, 'md5': 'def'}}, 'tools': {'vcf_validator': '0.9'}}
+        upgraded = {'files': {'a.vcf': {'size': 1, 'mtime': 1, 'md5': 'abc'}}, 'tools': {'vcf_validator': '0.10'}}
+        assert same_inputs(fingerprint, touched)
+        assert not same_inputs(fingerprint, changed)
+        assert not same_inputs(fingerprint, upgraded)
+        assert not same_inputs(None, fingerprint)
+        assert not same_inputs({'files': {'a.vcf': None}, 'tools': {}}, {'files': {'a.vcf': None}, 'tools': {}})
+
+    def test_tool_version(self):
+        assert tool_version('/path/to/missing_executable') is None
@@ -0,0 +1,67 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from requests import HTTPError
+
+from eva_submission import ROOT_DIR
+from eva_submission.eload_utils import resolve_accession_from_text
+from eva_submission.lookup_cache import LookupCache, cached_lookup, ENSEMBL, NCBI
+
+
+class TestLookupCache(TestCase):
+
+    db_path = os.path.join(ROOT_DIR, 'tests', 'resources', 'lookup_cache.sqlite')
+
+    def setUp(self) -> None:
+        self.cache = LookupCache(self.db_path)
+
+    def tearDown(self) -> None:
+        os.remove(self.db_path)
+
+    def test_lookup(self):
+        lookup_function = Mock(return_value='Homo sapiens')
+        assert self.cache.lookup(ENSEMBL, lookup_function, 9606) == 'Homo sapiens'
+        # The same lookup is answered from the cache, even from another LookupCache using the same database
+        assert self.cache.lookup(ENSEMBL, lookup_function, '9606') == 'Homo sapiens'
+        assert LookupCache(self.db_path).lookup(ENSEMBL, lookup_function, 9606) == 'Homo sapiens'
+        lookup_function.assert_called_once_with(9606)
+        assert self.cache.stats() == {ENSEMBL: {'hits': 1, 'misses': 1}}
+
+    def test_expired_entry(self):
+        cache = LookupCache(self.db_path, ttl_days={NCBI: 0})
+        lookup_function = Mock(return_value=['GCA_000001405.15'])
+        cache.lookup(NCBI, lookup_function, 'GRCh38')
+        cache.lookup(NCBI, lookup_function, 'GRCh38')
+        assert lookup_function.call_count == 2
+
+    def test_negative_caching(self):
+        lookup_function = Mock(return_value=[])
+        assert self.cache.lookup(NCBI, lookup_function, 'unknown assembly') == []
+        assert self.cache.lookup(NCBI, lookup_function, 'unknown assembly') == []
+        lookup_function.assert_called_once_with('unknown assembly')
+
+        # Client errors are stored and raised again
+        client_error = Mock(side_effect=HTTPError('400 Client Error', response=Mock(status_code=400)))
+        for _ in range(2):
+            with self.assertRaises(HTTPError):
+                self.cache.lookup(ENSEMBL, client_error, 0)
+        client_error.assert_called_once_with(0)
+
+        # Server errors are not stored
+        server_error = Mock(side_effect=HTTPError('503 Server Error', response=Mock(status_code=503)))
+        for _ in range(2):
+            with self.assertRaises(HTTPError):
+                self.cache.lookup(ENSEMBL, server_error, 1)
+        assert server_error.call_count == 2
+
+    def test_cached_lookup(self):
+        with patch('eva_submission.lookup_cache.get_lookup_cache', return_value=None):
+            assert cached_lookup(ENSEMBL, Mock(return_value='Homo sapiens'), 9606) == 'Homo sapiens'
+
+        with patch('eva_submission.lookup_cache.get_lookup_cache', return_value=self.cache), \
+                patch('eva_submission.eload_utils.retrieve_genbank_assembly_accessions_from_ncbi',
+                      return_value=['GCA_000001405.15']) as m_retrieve:
+            assert resolve_accession_from_text('GRCh38') == ['GCA_000001405.15']
+            assert resolve_accession_from_text('GRCh38') == ['GCA_000001405.15']
+            m_retrieve.assert_called_once_with('GRCh38')
@@ -0,0 +1,92 @@
+import datetime
+import os
+import shutil
+from unittest import TestCase
+
+import yaml
+
+from eva_submission import ROOT_DIR
+from eva_submission.xlsx.metadata_bundle import convert_value, is_metadata_bundle, write_metadata_bundle, \
+    write_metadata_spreadsheet
+from eva_submission.xlsx.xlsx_parser_eva import EvaMetadataBundleReader, EvaXlsxReader, EvaXlsxWriter, \
+    get_eva_xlsx_reader, release_eva_xlsx_reader
+
+
+class TestMetadataBundle(TestCase):
+
+    resources_folder = os.path.join(ROOT_DIR, 'tests', 'resources')
+    metadata_file = os.path.join(resources_folder, 'metadata.xlsx')
+    output_folder = os.path.join(resources_folder, 'metadata_bundle')
+
+    def setUp(self):
+        with open(os.path.join(ROOT_DIR, 'etc', 'eva_project_conf.yaml')) as open_file:
+            self.conf = yaml.full_load(open_file)
+        self.xlsx_reader = EvaXlsxReader(self.metadata_file)
+        os.makedirs(self.output_folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    @staticmethod
+    def _without_row_num(rows):
+        return [dict((key, value) for key, value in row.items() if key != 'row_num') for row in rows]
+
+    def test_bundle_cannot_be_written(self):
+        bundle = os.path.join(self.output_folder, 'metadata.json')
+        write_metadata_bundle(bundle, dict(self.xlsx_reader.metadata), self.conf)
+        with self.assertRaises(ValueError):
+            EvaXlsxWriter(bundle)
+        with self.assertRaises(ValueError):
+            EvaXlsxWriter(self.metadata_file, self.output_folder)
+
+    def test_json_bundle(self):
+        bundle = os.path.join(self.output_folder, 'metadata.json')
+        write_metadata_bundle(bundle, dict(self.xlsx_reader.metadata), self.conf)
+        assert is_metadata_bundle(bundle)
+
+        reader = EvaMetadataBundleReader(bundle)
+        assert reader.valid_worksheets() == self.xlsx_reader.valid_worksheets()
+        # The JSON document keeps the position of the rows in the spreadsheet
+        assert dict(reader.metadata) == dict(self.xlsx_reader.metadata)
+        assert reader.project_title == 'Greatest project ever'
+        assert reader.samples_per_analysis.keys() == self.xlsx_reader.samples_per_analysis.keys()
+
+    def test_tsv_bundle(self):
+        bundle = os.path.join(self.output_folder, 'tsv')
+        write_metadata_bundle(bundle, dict(self.xlsx_reader.metadata), self.conf)
+        assert is_metadata_bundle(bundle)
+        assert os.path.isfile(os.path.join(bundle, 'Submitter Details.tsv'))
+
+        reader = EvaMetadataBundleReader(bundle)
+        for worksheet in self.xlsx_reader.valid_worksheets():
+            assert self._without_row_num(reader.metadata[worksheet]) == \
+                   self._without_row_num(self.xlsx_reader.metadata[worksheet])
+        assert [sample['row_num'] for sample in reader.samples][:2] == [4, 5]
+        assert reader.peek()['row_counts']['Sample'] == 100
+
+    def test_bundle_to_spreadsheet(self):
+        bundle = os.path.join(self.output_folder, 'tsv')
+        spreadsheet = os.path.join(self.output_folder, 'metadata.xlsx')
+        write_metadata_bundle(bundle, dict(self.xlsx_reader.metadata), self.conf)
+        write_metadata_spreadsheet(spreadsheet, dict(EvaMetadataBundleReader(bundle).metadata), self.conf)
+
+        reader = EvaXlsxReader(spreadsheet)
+        for worksheet in self.xlsx_reader.valid_worksheets():
+            assert self._without_row_num(reader.metadata[worksheet]) == \
+                   self._without_row_num(self.xlsx_reader.metadata[worksheet])
+
+    def test_get_eva_xlsx_reader(self):
+        bundle = os.path.join(self.output_folder, 'metadata.json')
+        write_metadata_bundle(bundle, dict(self.xlsx_reader.metadata), self.conf)
+        reader = get_eva_xlsx_reader(bundle)
+        assert isinstance(reader, EvaMetadataBundleReader)
+        assert get_eva_xlsx_reader(bundle) is reader
+        release_eva_xlsx_reader(bundle)
+
+    def test_convert_value(self):
+        assert convert_value('9606', 'integer') == 9606
+        assert convert_value('human', 'integer') == 'human'
+        assert convert_value('2020-01-31', 'date') == datetime.date(2020, 1, 31)
+        assert convert_value('2020-01-31T10:00:00', 'date') == datetime.datetime(2020, 1, 31, 10)
+        assert convert_value('9606', 'string') == '9606'
+        assert convert_value(None, 'integer') is None
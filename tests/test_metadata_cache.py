@@ -0,0 +1,80 @@
+import os
+import shutil
+from unittest import TestCase
+from unittest.mock import patch
+
+from eva_submission import ROOT_DIR
+from eva_submission.xlsx.metadata_cache import MetadataCache, spreadsheet_fingerprint
+from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader, EvaXlsxWriter
+
+
+class TestMetadataCache(TestCase):
+
+    resources_folder = os.path.join(ROOT_DIR, 'tests', 'resources')
+    cache_dir = os.path.join(resources_folder, 'metadata_cache')
+    metadata_file = os.path.join(resources_folder, 'metadata.xlsx')
+    metadata_copy = os.path.join(resources_folder, 'metadata_cached.xlsx')
+
+    def setUp(self) -> None:
+        shutil.copyfile(self.metadata_file, self.metadata_copy)
+        self.cache = MetadataCache(self.cache_dir)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.cache_dir)
+        os.remove(self.metadata_copy)
+
+    def test_save_and_load(self):
+        fingerprint = spreadsheet_fingerprint(self.metadata_copy)
+        assert self.cache.load(self.metadata_copy, fingerprint) is None
+        entry = {'fingerprint': fingerprint, 'worksheets': ['Project']}
+        self.cache.save(self.metadata_copy, entry)
+        assert self.cache.load(self.metadata_copy, fingerprint) == entry
+        assert self.cache.load(self.metadata_copy, fingerprint, 'Project') is None
+        worksheet_entry = {'fingerprint': fingerprint, 'rows': [{'row_num': 2}]}
+        self.cache.save(self.metadata_copy, worksheet_entry, 'Project')
+        assert self.cache.load(self.metadata_copy, fingerprint, 'Project') == worksheet_entry
+        assert self.cache.load(self.metadata_copy, fingerprint) == entry
+
+        # A different fingerprint makes the entry stale
+        stale_fingerprint = fingerprint[:-1] + ('0' * 32,)
+        assert self.cache.load(self.metadata_copy, stale_fingerprint) is None
+        assert self.cache.load(self.metadata_copy, stale_fingerprint, 'Project') is None
+
+        self.cache.invalidate(self.metadata_copy)
+        assert self.cache.load(self.metadata_copy, fingerprint) is None
+        assert self.cache.load(self.metadata_copy, fingerprint, 'Project') is None
+
+    def test_reader_uses_cache(self):
+        with patch('eva_submission.xlsx.xlsx_parser_eva.get_metadata_cache', return_value=self.cache):
+            reader = EvaXlsxReader(self.metadata_copy)
+            samples = reader.samples
+            assert len(samples) == 100
+
+            # The second reader does not open the workbook
+            with patch('eva_submission.xlsx.xlsx_parser_eva.XlsxReader') as m_reader:
+                cached_reader = EvaXlsxReader(self.metadata_copy)
+                assert cached_reader.samples == samples
+                assert cached_reader.valid_worksheets() == reader.valid_worksheets()
+                m_reader.assert_not_called()
+
+    def test_each_worksheet_stored_once(self):
+        with patch('eva_submission.xlsx.xlsx_parser_eva.get_metadata_cache', return_value=self.cache), \
+                patch.object(self.cache, 'save', wraps=self.cache.save) as m_save:
+            reader = EvaXlsxReader(self.metadata_copy)
+            for worksheet in reader.valid_worksheets():
+                assert reader.metadata[worksheet] is not None
+            # The worksheet names once then the rows of each worksheet, each in their own entry
+            assert [call[0][2:] for call in m_save.call_args_list] == \
+                [()] + [(worksheet,) for worksheet in reader.valid_worksheets()]
+
+    def test_writer_invalidates_cache(self):
+        with patch('eva_submission.xlsx.xlsx_parser_eva.get_metadata_cache', return_value=self.cache):
+            reader = EvaXlsxReader(self.metadata_copy)
+            project = reader.project
+            project['Project Title'] = 'Updated project title'
+            writer = EvaXlsxWriter(self.metadata_copy)
+            writer.set_project(project)
+            writer.save()
+
+            assert self.cache.load(self.metadata_copy, spreadsheet_fingerprint(self.metadata_copy)) is None
+            assert EvaXlsxReader(self.metadata_copy).project_title == 'Updated project title'
@@ -0,0 +1,43 @@
+import os
+from unittest import TestCase
+
+from eva_submission import ROOT_DIR
+from eva_submission.xlsx.metadata_table import MetadataTable
+from eva_submission.xlsx.xlsx_parser_eva import EvaXlsxReader
+
+
+class TestMetadataTable(TestCase):
+
+    def setUp(self):
+        self.rows = [
+            {'Analysis Alias': 'A1', 'Sample ID': 'S1', 'Sample Name': None, 'row_num': 4},
+            {'Analysis Alias': 'A2', 'Sample ID': None, 'Sample Name': 'name2', 'row_num': 5},
+            {'Analysis Alias': 'A1', 'Sample ID': None, 'Sample Name': None, 'row_num': 6},
+            {'Analysis Alias': None, 'Sample ID': 'S4', 'row_num': 7},
+        ]
+        self.table = MetadataTable(self.rows)
+
+    def test_column(self):
+        assert len(self.table) == 4
+        assert self.table.column('Analysis Alias') == ['A1', 'A2', 'A1', None]
+        # Rows without the header have no value
+        assert self.table.column('Sample Name') == [None, 'name2', None, None]
+        assert self.table.row_nums == [4, 5, 6, 7]
+        assert self.table.distinct('Analysis Alias') == {'A1', 'A2', None}
+
+    def test_rows_missing_groups(self):
+        assert self.table.all_filled(['Analysis Alias', 'Sample ID']) == [True, False, False, False]
+        assert self.table.rows_missing_groups(['Analysis Alias', 'Sample ID'], ['Analysis Alias', 'Sample Name']) \
+            == [2, 3]
+        assert self.table.rows_missing_groups() == []
+
+    def test_group_by(self):
+        assert self.table.group_by('Analysis Alias') == {'A1': [0, 2], 'A2': [1], None: [3]}
+        assert self.table.group_rows_by('Analysis Alias')['A1'] == [self.rows[0], self.rows[2]]
+
+    def test_reader_grouping(self):
+        reader = EvaXlsxReader(os.path.join(ROOT_DIR, 'tests', 'resources', 'metadata.xlsx'))
+        samples_per_analysis = reader.samples_per_analysis
+        assert sum(len(samples) for samples in samples_per_analysis.values()) == len(reader.samples)
+        assert samples_per_analysis['unknown analysis'] == []
+        assert len(reader.table('Sample')) == len(reader.samples)
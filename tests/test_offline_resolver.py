@@ -0,0 +1,65 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from eva_submission import ROOT_DIR
+from eva_submission.assembly_taxonomy_insertion import get_scientific_name_and_common_name
+from eva_submission.eload_utils import resolve_accession_from_text
+from eva_submission.offline_resolver import build_resolver_database, OfflineResolver
+from eva_submission.xlsx.xlsx_validation import EvaXlsxValidator
+
+
+class TestOfflineResolver(TestCase):
+
+    resources_folder = os.path.join(ROOT_DIR, 'tests', 'resources', 'offline_resolver')
+    db_path = os.path.join(resources_folder, 'offline_resolver.sqlite')
+
+    def setUp(self) -> None:
+        build_resolver_database(
+            self.db_path,
+            names_dmp=os.path.join(self.resources_folder, 'names.dmp'),
+            nodes_dmp=os.path.join(self.resources_folder, 'nodes.dmp'),
+            assembly_summary=os.path.join(self.resources_folder, 'assembly_summary_genbank.txt')
+        )
+        self.resolver = OfflineResolver(self.db_path)
+
+    def tearDown(self) -> None:
+        self.resolver.close()
+        os.remove(self.db_path)
+
+    def test_taxonomy(self):
+        assert self.resolver.scientific_name(9606) == 'Homo sapiens'
+        assert self.resolver.scientific_name('9606') == 'Homo sapiens'
+        # The GenBank common name is preferred to the other common names
+        assert self.resolver.scientific_and_common_name(9606) == ('Homo sapiens', 'human')
+        assert self.resolver.scientific_and_common_name(9605) == ('Homo', None)
+        assert self.resolver.scientific_name(1234567) is None
+
+    def test_assembly_accessions(self):
+        assert self.resolver.assembly_accessions('GRCh38') == ['GCA_000001405.15']
+        assert self.resolver.assembly_accessions('grch38.p13') == ['GCA_000001405.28']
+        assert self.resolver.assembly_accessions('GRCh37') is None
+        # Assemblies provided with their GenBank or RefSeq accession
+        assert self.resolver.assembly_accessions('GCA_000001405.15') == ['GCA_000001405.15']
+        assert self.resolver.assembly_accessions('GCF_000001405.39') == ['GCA_000001405.28']
+        assert self.resolver.assembly_accessions('GCF_000001405.25') is None
+
+    def test_fallback_to_remote_lookups(self):
+        with patch('eva_submission.offline_resolver.get_offline_resolver', return_value=self.resolver), \
+                patch('eva_submission.eload_utils.retrieve_genbank_assembly_accessions_from_ncbi',
+                      return_value=['GCA_000001405.14']) as m_retrieve, \
+                patch('eva_submission.assembly_taxonomy_insertion.download_xml_from_ena') as m_download:
+            assert resolve_accession_from_text('GRCh38') == ['GCA_000001405.15']
+            m_retrieve.assert_not_called()
+            assert resolve_accession_from_text('GRCh37') == ['GCA_000001405.14']
+            m_retrieve.assert_called_once_with('GRCh37')
+
+            assert get_scientific_name_and_common_name(9606) == ('Homo sapiens', 'human')
+            m_download.assert_not_called()
+
+    def test_validation_resolves_accessions_offline(self):
+        with patch('eva_submission.offline_resolver.get_offline_resolver', return_value=self.resolver), \
+                patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+                      return_value=['GCA_000001405.14']) as m_retrieve:
+            assert EvaXlsxValidator._get_assembly_accessions('GCF_000001405.39', 30) == ['GCA_000001405.28']
+            m_retrieve.assert_not_called()
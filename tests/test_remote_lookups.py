@@ -0,0 +1,41 @@
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from requests import ConnectionError
+
+from eva_submission.remote_lookups import get_scientific_name_from_ensembl, \
+    retrieve_genbank_assembly_accessions_from_ncbi
+
+
+class TestRemoteLookups(TestCase):
+
+    @staticmethod
+    def _response(json_content):
+        return Mock(json=Mock(return_value=json_content))
+
+    def test_retrieve_genbank_assembly_accessions_from_ncbi(self):
+        responses = [
+            self._response({'esearchresult': {'idlist': ['1']}}),
+            self._response({'result': {'uids': ['1'], '1': {'synonym': {'genbank': 'GCA_000001405.15'}}}})
+        ]
+        with patch('eva_submission.remote_lookups.requests.get', side_effect=responses) as m_get:
+            assert retrieve_genbank_assembly_accessions_from_ncbi('GRCh38', timeout=5) == ['GCA_000001405.15']
+        assert [call[1]['timeout'] for call in m_get.call_args_list] == [5, 5]
+
+    def test_get_scientific_name_from_ensembl(self):
+        with patch('eva_submission.remote_lookups.requests.get',
+                   return_value=self._response({'scientific_name': 'Homo sapiens'})) as m_get:
+            assert get_scientific_name_from_ensembl(9606, timeout=5) == 'Homo sapiens'
+        assert m_get.call_args[1]['timeout'] == 5
+
+        with patch('eva_submission.remote_lookups.requests.get', return_value=self._response({})):
+            with self.assertRaises(ValueError):
+                get_scientific_name_from_ensembl(9606)
+
+    def test_retry_on_request_error(self):
+        responses = [ConnectionError('Connection reset'), self._response({'scientific_name': 'Homo sapiens'})]
+        with patch('eva_submission.remote_lookups.requests.get', side_effect=responses) as m_get, \
+                patch('retry.api.time.sleep'):
+            assert get_scientific_name_from_ensembl(9606, timeout=5) == 'Homo sapiens'
+        assert m_get.call_count == 2
+        assert all(call[1]['timeout'] == 5 for call in m_get.call_args_list)
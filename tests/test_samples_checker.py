@@ -1,8 +1,11 @@
 import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 from eva_submission import ROOT_DIR
-from eva_submission.samples_checker import get_samples_from_vcf, get_sample_names, compare_names_in_files_and_samples
+from eva_submission.samples_checker import get_samples_from_vcf, get_sample_names, compare_names_in_files_and_samples, \
+    group_vcf_files_by_samples
 
 
 class TestFtpDepositBox(TestCase):
@@ -12,6 +15,27 @@ class TestFtpDepositBox(TestCase):
     def test_get_samples_from_vcf(self):
         assert get_samples_from_vcf(os.path.join(self.resources_folder, 'test.vcf')) == ['S1']
 
+    def test_group_vcf_files_by_samples(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        vcf_files = []
+        for chrom, samples in [('chr1', 'S1\tS2'), ('chr2', 'S1\tS2'), ('chr3', 'S1\tS3')]:
+            vcf_files.append(os.path.join(tmp_dir, chrom + '.vcf'))
+            with open(vcf_files[-1], 'w') as open_file:
+                open_file.write('##fileformat=VCFv4.1\n##contig=<ID=%s>\n' % chrom)
+                open_file.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t%s\n' % samples)
+        assert group_vcf_files_by_samples(vcf_files, nb_readers=2) == [
+            (['S1', 'S2'], vcf_files[:2]),
+            (['S1', 'S3'], vcf_files[2:])
+        ]
+
+        with self.assertLogs('eva_submission.samples_checker', level='WARNING') as logs:
+            assert compare_names_in_files_and_samples(
+                vcf_files, [{'Sample Name': 'S1'}, {'Sample Name': 'S2'}, {'Sample Name': 'S3'}], 'A1'
+            ) == (False, [], [])
+        assert 'For analysis A1 the VCF files have 2 different sets of samples:' in logs.output[0]
+        assert 'chr1.vcf, chr2.vcf' in logs.output[1]
+
     def test_get_sample_names(self):
         assert get_sample_names([{'Sample Name': 'S1'}, {'Sample ID': 'S2'}, {'Analysis': ''}]) == ['S1', 'S2']
 
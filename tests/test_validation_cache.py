@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from eva_submission.validation_cache import ValidationCache, fingerprint_key
+
+
+class TestValidationCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache = ValidationCache(os.path.join(self.tmp_dir, 'cache'))
+
+    def test_fingerprint_key(self):
+        fingerprint = {
+            'files': {'/path/a.vcf': {'size': 1, 'mtime': 1, 'md5': 'abc'}}, 'tools': {'vcf_validator': '0.9'}
+        }
+        moved = {'files': {'/other/a.vcf': {'size': 1, 'mtime': 2, 'md5': 'abc'}}, 'tools': {'vcf_validator': '0.9'}}
+        upgraded = {'files': {'/path/a.vcf': {'size': 1, 'mtime': 1, 'md5': 'abc'}}, 'tools': {'vcf_validator': '1.0'}}
+        assert fingerprint_key('vcf_check', fingerprint) == fingerprint_key('vcf_check', moved)
+        assert fingerprint_key('vcf_check', fingerprint) != fingerprint_key('vcf_check', upgraded)
+        assert fingerprint_key('vcf_check', fingerprint) != fingerprint_key('assembly_check', fingerprint)
+        assert fingerprint_key('vcf_check', {'files': {'a.vcf': None}, 'tools': {}}) is None
+        assert fingerprint_key('vcf_check', {'files': {}, 'tools': {'vcf_validator': None}}) is None
+
+    def test_put_and_restore(self):
+        outputs = {}
+        for name in ['log', 'text_report', 'db_report']:
+            outputs[name] = os.path.join(self.tmp_dir, name + '.txt')
+            with open(outputs[name], 'w') as open_file:
+                open_file.write(name)
+        assert self.cache.get('vcf_check', 'abcdef') is None
+        self.cache.put('vcf_check', 'abcdef', outputs)
+        assert set(self.cache.get('vcf_check', 'abcdef')) == set(outputs)
+
+        destinations = dict((name, os.path.join(self.tmp_dir, 'restored', name)) for name in outputs)
+        assert self.cache.restore('vcf_check', 'abcdef', destinations)
+        with open(destinations['text_report']) as open_file:
+            assert open_file.read() == 'text_report'
+        assert not self.cache.restore('assembly_check', 'abcdef', destinations)
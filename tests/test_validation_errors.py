@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from eva_submission.xlsx.validation_errors import ValidationErrorRecord, format_error_summary, row_ranges, \
+    summarise_errors
+
+
+class TestValidationErrors(TestCase):
+
+    def test_row_ranges(self):
+        assert row_ranges([4, 5, 6, 8, 10, 11]) == '4-6,8,10-11'
+        assert row_ranges([]) == ''
+
+    def test_summarise_errors(self):
+        records = [
+            ValidationErrorRecord('Sample', row, 'Tax Id', 'type', 'must be of integer type') for row in range(4, 30)
+        ] + [
+            ValidationErrorRecord('Sample', 40, 'Tax Id', 'type', 'must be of integer type'),
+            ValidationErrorRecord('Analysis', 2, 'Analysis Alias', 'nullable', 'null value not allowed'),
+            ValidationErrorRecord(rule='same_set', message='Check Analysis Alias vs Files: A1 present in Analysis '
+                                                           'Alias not in Files'),
+        ]
+        summaries = summarise_errors(records, nb_example_rows=3)
+        assert summaries[0] == {
+            'sheet': 'Sample', 'field': 'Tax Id', 'rule': 'type', 'message': 'must be of integer type',
+            'nb_error': 27, 'rows': '4-29,40', 'example_rows': [4, 5, 6]
+        }
+        assert [format_error_summary(summary) for summary in summaries] == [
+            'In Sheet Sample, field Tax Id: must be of integer type (27 error(s), rows 4-29,40)',
+            'In Sheet Analysis, field Analysis Alias: null value not allowed (1 error(s), rows 2)',
+            'Check Analysis Alias vs Files: A1 present in Analysis Alias not in Files'
+        ]
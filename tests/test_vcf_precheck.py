@@ -0,0 +1,116 @@
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pysam
+
+from eva_submission import ROOT_DIR
+from eva_submission.vcf_precheck import contig_names_from_assembly_report, precheck_vcf
+from eva_submission.vcf_utils import compression_type
+
+HEADER = '##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n'
+
+
+class TestVcfPrecheck(TestCase):
+    resources_folder = os.path.join(ROOT_DIR, 'tests', 'resources')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def _write_vcf(self, file_name, records, header=HEADER):
+        vcf_file = os.path.join(self.tmp_dir, file_name)
+        content = header + ''.join('%s\t%s\t.\tA\tT\t.\t.\t.\tGT\t0/1\n' % record for record in records)
+        with open(vcf_file, 'w') as open_file:
+            open_file.write(content)
+        return vcf_file
+
+    def test_precheck_valid_file(self):
+        results = precheck_vcf(os.path.join(self.resources_folder, 'test.vcf'))
+        assert results['pass'] is True
+        assert results['errors'] == []
+        assert results['compression'] is None
+        assert results['nb_sample'] == 1
+
+        vcf_file = self._write_vcf('test.vcf', [('chr1', 1), ('chr1', 5), ('chr2', 3)])
+        results = precheck_vcf(vcf_file, {'chr1', 'chr2'})
+        assert results['pass'] is True
+        assert (results['nb_variant'], results['nb_contig']) == (3, 2)
+        assert results['nb_variant_per_contig'] == {'chr1': 2, 'chr2': 1}
+        assert results['complete'] is True
+
+        # Only the first records are checked
+        results = precheck_vcf(vcf_file, {'chr1', 'chr2'}, max_records=2)
+        assert (results['nb_variant'], results['complete']) == (2, False)
+        results = precheck_vcf(vcf_file, {'chr1', 'chr2'}, max_records=3)
+        assert (results['nb_variant'], results['complete']) == (3, True)
+
+    def test_precheck_compression(self):
+        vcf_file = self._write_vcf('test.vcf', [('chr1', 1), ('chr1', 5)])
+        pysam.tabix_compress(vcf_file, vcf_file + '.gz')
+        assert compression_type(vcf_file + '.gz') == 'bgzip'
+        results = precheck_vcf(vcf_file + '.gz')
+        assert results['pass'] is True
+        assert results['warnings'] == []
+        assert results['nb_variant'] == 2
+
+        gzip_file = os.path.join(self.tmp_dir, 'gzip.vcf.gz')
+        with open(vcf_file, 'rb') as open_file, gzip.open(gzip_file, 'wb') as open_gzip:
+            open_gzip.write(open_file.read())
+        results = precheck_vcf(gzip_file)
+        assert results['pass'] is True
+        assert results['warnings'] == ['The file is compressed with gzip instead of bgzip']
+
+        truncated_file = os.path.join(self.tmp_dir, 'truncated.vcf.gz')
+        with open(gzip_file, 'rb') as open_file, open(truncated_file, 'wb') as open_truncated:
+            open_truncated.write(open_file.read()[:-10])
+        assert precheck_vcf(truncated_file)['errors'] == ['The compressed file is truncated']
+
+        not_compressed = os.path.join(self.tmp_dir, 'plain.vcf.gz')
+        shutil.copyfile(vcf_file, not_compressed)
+        assert precheck_vcf(not_compressed)['errors'] == ['The file has a .gz extension but is not compressed']
+
+    def test_precheck_warnings(self):
+        vcf_file = self._write_vcf('test.vcf', [('chr1', 5), ('chr1', 1), ('chr2', 3), ('chr1', 7), ('chr3', 1)])
+        # The sort order and the contigs are checked again by the validators so the file passes the pre-check
+        results = precheck_vcf(vcf_file, {'chr1', 'chr2'})
+        assert results['pass'] is True
+        assert results['nb_warning'] == 3
+        assert results['warnings'] == [
+            'Line 4: the file is not sorted, position 1 is after position 5',
+            'Line 6: the file is not sorted, contig chr1 is found in more than one block',
+            "Line 7: contig 'chr3' not found in assembly report"
+        ]
+        results = precheck_vcf(vcf_file, {'chr1', 'chr2'}, max_errors=1)
+        assert (results['nb_warning'], len(results['warnings'])) == (3, 1)
+
+    def test_precheck_errors(self):
+        vcf_file = os.path.join(self.tmp_dir, 'test.vcf')
+        with open(vcf_file, 'w') as open_file:
+            open_file.write(HEADER + 'chr1\t1\t.\tA\tT\nchr1\tx\t.\tA\tT\t.\t.\t.\tGT\t0/1\n')
+        results = precheck_vcf(vcf_file)
+        assert results['pass'] is False
+        assert results['errors'] == [
+            'Line 3: 10 columns expected but 5 found',
+            "Line 4: position 'x' is not an integer"
+        ]
+        # Fail fast stops at the first error
+        results = precheck_vcf(vcf_file, fail_fast=True)
+        assert results['nb_error'] == 1
+        assert results['nb_variant'] == 1
+
+        vcf_file = self._write_vcf('no_header.vcf', [('chr1', 1)], header='##fileformat=VCFv4.1\n')
+        assert precheck_vcf(vcf_file)['errors'] == ['Line 2: the header line starting with #CHROM is missing']
+
+    def test_contig_names_from_assembly_report(self):
+        assembly_report = os.path.join(self.tmp_dir, 'assembly_report.txt')
+        with open(assembly_report, 'w') as open_file:
+            open_file.write('# Sequence-Name\tSequence-Role\tAssigned-Molecule\tAssigned-Molecule-Location/Type\t'
+                            'GenBank-Accn\tRelationship\tRefSeq-Accn\tAssembly-Unit\tSequence-Length\tUCSC-style-name\n')
+            open_file.write('1\tassembled-molecule\t1\tChromosome\tCM000001.1\t=\tNC_000001.1\tPrimary\t100\tchr1\n')
+            open_file.write('u1\tunplaced-scaffold\tna\tna\tKN000001.1\t<>\tna\tPrimary\t10\tna\n')
+        assert contig_names_from_assembly_report(assembly_report) == {
+            '1', 'CM000001.1', 'NC_000001.1', 'chr1', 'u1', 'KN000001.1'
+        }
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pysam
+
+from eva_submission import ROOT_DIR
+from eva_submission.vcf_utils import compression_type, get_samples_from_header, read_chrom_line, read_vcf_header
+
+HEADER = '##fileformat=VCFv4.1\n##contig=<ID=chr1,length=1000>\n##contig=<ID=chr2>\n' \
+         '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\n'
+
+
+class TestVcfUtils(TestCase):
+    resources_folder = os.path.join(ROOT_DIR, 'tests', 'resources')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_read_vcf_header(self):
+        header_lines = read_vcf_header(os.path.join(self.resources_folder, 'test.vcf'))
+        assert header_lines == [
+            '##fileformat=VCFv4.2', '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1'
+        ]
+        assert get_samples_from_header(header_lines) == ['S1']
+
+    def test_read_compressed_vcf_header(self):
+        vcf_file = os.path.join(self.tmp_dir, 'test.vcf')
+        with open(vcf_file, 'w') as open_file:
+            open_file.write(HEADER)
+            for position in range(1, 20000):
+                open_file.write('chr1\t%s\t.\tA\tT\t.\t.\t.\tGT\t0/1\t0/0\n' % position)
+        pysam.tabix_compress(vcf_file, vcf_file + '.gz')
+        assert compression_type(vcf_file + '.gz') == 'bgzip'
+
+        # Only the first blocks are decompressed so a corrupted end of file is never read
+        corrupted_file = os.path.join(self.tmp_dir, 'corrupted.vcf.gz')
+        with open(vcf_file + '.gz', 'rb') as open_file, open(corrupted_file, 'wb') as open_corrupted:
+            content = open_file.read()
+            open_corrupted.write(content[:len(content) // 2] + b'\x00' * 1000)
+        for compressed_file in (vcf_file + '.gz', corrupted_file):
+            header_lines = read_vcf_header(compressed_file)
+            assert len(header_lines) == 4
+            assert get_samples_from_header(header_lines) == ['S1', 'S2']
+
+    def test_read_vcf_header_not_utf8(self):
+        vcf_file = os.path.join(self.tmp_dir, 'latin1.vcf')
+        with open(vcf_file, 'wb') as open_file:
+            open_file.write(b'##fileformat=VCFv4.1\n##source=Universit\xe9\n')
+            open_file.write(b'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS\xe92\n')
+        header_lines = read_vcf_header(vcf_file)
+        assert header_lines[1] == '##source=Universit\ufffd'
+        assert get_samples_from_header(header_lines) == ['S1', 'S\ufffd2']
+
+    def test_read_chrom_line(self):
+        assert read_chrom_line(os.path.join(self.resources_folder, 'test.vcf')) == \
+            b'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1'
+        vcf_file = os.path.join(self.tmp_dir, 'no_chrom.vcf')
+        with open(vcf_file, 'w') as open_file:
+            open_file.write('##fileformat=VCFv4.1\nchr1\t1\t.\tA\tT\t.\t.\t.\n')
+        assert read_chrom_line(vcf_file) is None
+
+    def test_get_samples_from_header_without_chrom_line(self):
+        with self.assertRaises(ValueError):
+            get_samples_from_header(['##fileformat=VCFv4.1'])
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from eva_submission.vcf_validator_report import find_error_table, read_vcf_validator_db_report
+
+
+def create_vcf_validator_db_report(db_report, errors):
+    """Create a report with the layout written by vcf_validator: a polymorphic Error table and one table per type"""
+    conn = sqlite3.connect(db_report)
+    with conn:
+        conn.execute('CREATE TABLE "Error" ("id" INTEGER PRIMARY KEY, "typeid" TEXT NOT NULL, "line" INTEGER, '
+                     '"message" TEXT, "severity" INTEGER)')
+        conn.execute('CREATE TABLE "BodySectionError" ("id" INTEGER PRIMARY KEY)')
+        conn.executemany('INSERT INTO "Error" ("typeid", "line", "message", "severity") VALUES (?, ?, ?, ?)', errors)
+    conn.close()
+
+
+class TestVcfValidatorReport(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.db_report = os.path.join(self.tmp_dir, 'test.vcf.errors.1.db')
+
+    def test_read_vcf_validator_db_report(self):
+        create_vcf_validator_db_report(self.db_report, [
+            ('ebi::vcf::MetaSectionError', 6, 'Error in ALT metadata.', 1),
+            ('ebi::vcf::MetaSectionError', 7, "A valid 'reference' entry is not listed in the meta section.", 0)
+        ] + [
+            ('ebi::vcf::BodySectionError', line, 'Format does not start with a letter', 1) for line in range(8, 20)
+        ])
+        results = read_vcf_validator_db_report(self.db_report, nb_examples=3)
+        assert results['nb_error'] == 13
+        assert results['nb_warning'] == 1
+        assert results['error_list'] == [
+            'Line 6: Error in ALT metadata.',
+            'Line 8: Format does not start with a letter',
+            'Line 9: Format does not start with a letter'
+        ]
+        assert [(c['category'], c['severity'], c['count']) for c in results['categories']] == [
+            ('MetaSectionError', 'error', 1), ('MetaSectionError', 'warning', 1), ('BodySectionError', 'error', 12)
+        ]
+        assert len(results['categories'][2]['examples']) == 3
+
+    def test_read_valid_report(self):
+        create_vcf_validator_db_report(self.db_report, [])
+        results = read_vcf_validator_db_report(self.db_report)
+        assert results == {'nb_error': 0, 'nb_warning': 0, 'error_list': [], 'categories': []}
+
+    def test_find_error_table(self):
+        conn = sqlite3.connect(self.db_report)
+        conn.execute('CREATE TABLE "Summary" ("id" INTEGER PRIMARY KEY, "nb_error" INTEGER)')
+        assert find_error_table(conn) == (None, None)
+        conn.execute('CREATE TABLE "ValidationError" ("id" INTEGER PRIMARY KEY, "Line" INTEGER, "Message" TEXT)')
+        assert find_error_table(conn) == ('ValidationError', {'id': 'id', 'line': 'Line', 'message': 'Message'})
+        conn.close()
+
+    def test_read_invalid_database(self):
+        with open(self.db_report, 'w') as open_file:
+            open_file.write('Line 6: Error in ALT metadata.\n')
+        assert read_vcf_validator_db_report(self.db_report) is None
+        assert read_vcf_validator_db_report(os.path.join(self.tmp_dir, 'missing.db')) is None
@@ -1,8 +1,12 @@
 import os
+import time
 from unittest import TestCase
 from unittest.mock import patch
 
+from requests import Timeout
+
 from eva_submission import ROOT_DIR
+from eva_submission.xlsx.validation_errors import ValidationErrorRecord
 from eva_submission.xlsx.xlsx_validation import EvaXlsxValidator
 
 
@@ -24,6 +28,26 @@ class TestEvaXlsValidator(TestCase):
         expected_errors = ['In Sheet Analysis, Row 4, field Analysis Alias: null value not allowed']
         self.assertEqual(self.validator_fail.error_list, expected_errors)
 
+    def test_cerberus_validation_max_errors_per_field(self):
+        # Row 4 is repeated to create more errors on the same field
+        analysis_rows = self.validator_fail.metadata['Analysis']
+        self.validator_fail.metadata = dict(self.validator_fail.metadata, Analysis=analysis_rows + analysis_rows[2:] * 2)
+        self.validator_fail.cerberus_validation(max_errors_per_field=1)
+        expected_errors = [
+            'In Sheet Analysis, Row 4, field Analysis Alias: null value not allowed',
+            'In Sheet Analysis, field Analysis Alias: 2 more errors not reported'
+        ]
+        self.assertEqual(self.validator_fail.error_list, expected_errors)
+
+    def test_error_records(self):
+        self.validator_fail.cerberus_validation()
+        self.validator_fail.complex_validation()
+        assert len(self.validator_fail.error_records) == len(self.validator_fail.error_list) == 3
+        assert self.validator_fail.error_records[0] == ValidationErrorRecord(
+            'Analysis', 4, 'Analysis Alias', 'nullable', 'null value not allowed'
+        )
+        assert [record.rule for record in self.validator_fail.error_records[1:]] == ['same_set', 'same_set']
+
     def test_complex_validation(self):
         self.validator.complex_validation()
         assert self.validator.error_list == []
@@ -41,3 +65,87 @@ class TestEvaXlsValidator(TestCase):
             m_sci_name.return_value = 'Homo sapiens'
             self.validator.validate()
         assert self.validator.error_list == []
+
+    def test_semantic_validation(self):
+        self.validator.metadata = {
+            'Analysis': [{'Reference': 'GCA_2'}, {'Reference': 'GCA_1'}, {'Reference': 'GCA_3'}, {'Reference': None}],
+            'Sample': [
+                {'Tax Id': 9606, 'Scientific Name': 'Homo sapiens'},
+                {'Tax Id': 10090, 'Scientific Name': 'Homo sapiens'},
+                {'Tax Id': 9031, 'Scientific Name': 'Chicken'},
+                {'Tax Id': None, 'Scientific Name': None}
+            ]
+        }
+        accessions = {'GCA_1': [], 'GCA_2': ['GCA_2.1', 'GCA_2.2'], 'GCA_3': ['GCA_3.1']}
+        scientific_names = {9606: 'Homo sapiens', 10090: 'Mus musculus', 9031: 'Gallus gallus'}
+        with patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+                   side_effect=lambda reference, timeout: accessions.get(reference)), \
+                patch('eva_submission.xlsx.xlsx_validation.get_scientific_name_from_ensembl',
+                      side_effect=lambda taxid, timeout: scientific_names.get(taxid)) as m_sci_name:
+            self.validator.semantic_validation()
+        # The timeout is set on the requests sent to Ensembl and NCBI
+        m_sci_name.assert_any_call(9606, timeout=60)
+        assert self.validator.error_list == [
+            'In Analysis, Reference GCA_1 did not resolve to any accession',
+            "In Analysis, Reference GCA_2 resolve to more than one accession: ['GCA_2.1', 'GCA_2.2']",
+            'In Samples, Taxonomy 10090 and scientific name Homo sapiens are inconsistent',
+            'In Samples, Taxonomy 9031 and scientific name Chicken are inconsistent'
+        ]
+
+    def test_semantic_validation_timeout(self):
+        self.validator.metadata = {
+            'Analysis': [{'Reference': 'GCA_1'}],
+            'Sample': [{'Tax Id': 9606, 'Scientific Name': 'Homo sapiens'}]
+        }
+
+        def slow_lookup(reference, timeout):
+            time.sleep(0.5)
+            return [reference]
+
+        with patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+                   side_effect=slow_lookup), \
+                patch('eva_submission.xlsx.xlsx_validation.get_scientific_name_from_ensembl',
+                      return_value='Homo sapiens'), \
+                patch('eva_submission.xlsx.xlsx_validation.DEFAULT_LOOKUP_TIMEOUT', 0.1):
+            self.validator.semantic_validation()
+        assert self.validator.error_list == [
+            'In Analysis, Reference GCA_1 could not be checked: the lookup did not complete within 0.1 seconds'
+        ]
+
+    def test_semantic_validation_single_deadline(self):
+        self.validator.metadata = {
+            'Analysis': [{'Reference': 'GCA_1'}, {'Reference': 'GCA_2'}],
+            'Sample': []
+        }
+
+        def slow_lookup(reference, timeout):
+            time.sleep(0.3)
+            return [reference]
+
+        # The lookups run one after the other: the second one completes after the deadline shared by all the lookups
+        with patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+                   side_effect=slow_lookup), \
+                patch('eva_submission.xlsx.xlsx_validation.DEFAULT_NB_WORKERS', 1), \
+                patch('eva_submission.xlsx.xlsx_validation.DEFAULT_LOOKUP_TIMEOUT', 0.45):
+            self.validator.semantic_validation()
+        assert self.validator.error_list == [
+            'In Analysis, Reference GCA_2 could not be checked: the lookup did not complete within 0.45 seconds'
+        ]
+
+    def test_semantic_validation_request_timeout(self):
+        self.validator.metadata = {'Analysis': [{'Reference': 'GCA_1'}], 'Sample': []}
+        with patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+                   side_effect=Timeout('Read timed out')):
+            self.validator.semantic_validation()
+        assert self.validator.error_list == [
+            'In Analysis, Reference GCA_1 could not be checked: the lookup did not complete within 60 seconds'
+        ]
+
+    def test_semantic_validation_connection_error(self):
+        self.validator.metadata = {'Analysis': [{'Reference': 'GCA_1'}], 'Sample': []}
+        # The metadata cannot be checked so it is not reported as invalid
+        with patch('eva_submission.xlsx.xlsx_validation.retrieve_genbank_assembly_accessions_from_ncbi',
+                   side_effect=ConnectionError('Connection refused')):
+            with self.assertRaises(ConnectionError):
+                self.validator.semantic_validation()
+        assert self.validator.error_list == []